@@ -0,0 +1,115 @@
+"""Frontend asset build.
+
+    cd backend
+    python -m app.assets
+
+Copies ``frontend/static`` into ``frontend/dist/static`` under content-hashed
+names (``js/app.3f2a9c1d04.js``), writes gzip and, when the ``brotli``
+package is installed, brotli variants next to every compressible file, and
+renders ``frontend/dist/index.html`` pointing at the hashed URLs. A hashed
+URL never changes content, so the server can let browsers cache it for a
+year; ``manifest.json`` maps the source URLs to the hashed ones.
+
+The application serves ``frontend/dist`` when it exists and falls back to
+the unbuilt sources otherwise, so rebuild after changing the frontend.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+FRONTEND_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "frontend")
+)
+STATIC_DIR = os.path.join(FRONTEND_DIR, "static")
+TEMPLATES_DIR = os.path.join(FRONTEND_DIR, "templates")
+DIST_DIR = os.path.join(FRONTEND_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+
+STATIC_URL = "/static/"
+COMPRESSIBLE_EXTENSIONS = {".css", ".html", ".js", ".json", ".map", ".svg", ".txt"}
+HASH_LENGTH = 10
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(path: str, digest: str) -> str:
+    """``js/app.js`` -> ``js/app.<digest>.js``."""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+def write_compressed(path: str, data: bytes):
+    """Write ``.gz`` (and ``.br``) variants of ``data`` next to ``path``.
+
+    A variant is skipped when it would not be smaller than the original.
+    """
+    # mtime=0 keeps the output byte-identical across builds
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + ".br", "wb") as f:
+                f.write(br)
+
+
+def build_assets(static_dir: str = STATIC_DIR, templates_dir: str = TEMPLATES_DIR,
+                 dist_dir: str = DIST_DIR) -> dict:
+    """Build ``dist_dir`` from the frontend sources and return the manifest."""
+    if os.path.exists(dist_dir):
+        shutil.rmtree(dist_dir)
+    out_static = os.path.join(dist_dir, "static")
+
+    manifest = {}
+    for root, _, files in os.walk(static_dir):
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            target_name = hashed_name(relative, content_hash(data))
+            target = os.path.join(out_static, *target_name.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            if os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                write_compressed(target, data)
+            manifest[STATIC_URL + relative] = STATIC_URL + target_name
+
+    with open(os.path.join(templates_dir, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    for source_url, hashed_url in manifest.items():
+        html = html.replace(f'"{source_url}"', f'"{hashed_url}"')
+    with open(os.path.join(dist_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def is_built(dist_dir: str = DIST_DIR) -> bool:
+    return os.path.exists(os.path.join(dist_dir, MANIFEST_NAME))
+
+
+def main():
+    manifest = build_assets()
+    for source_url, hashed_url in sorted(manifest.items()):
+        print(f"{source_url} -> {hashed_url}")
+    if brotli is None:
+        print("brotli is not installed; wrote gzip variants only")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,120 @@ load_dotenv()
 # MongoDB Configuration
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "biotech_inventory")
+# Connection pool limits apply to each worker process
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+# Read routing: listings and reports prefer secondaries no more than
+# READ_MAX_STALENESS_SECONDS behind (at least 90, or -1 for no limit)
+SECONDARY_READS_ENABLED = os.getenv("SECONDARY_READS_ENABLED", "true").lower() == "true"
+READ_MAX_STALENESS_SECONDS = int(os.getenv("READ_MAX_STALENESS_SECONDS", "90"))
+CONSISTENCY_TOKEN_HEADER = os.getenv("CONSISTENCY_TOKEN_HEADER", "X-Consistency-Token")
+
+# Multi-tenant Configuration
+# Comma-separated tenant IDs; empty runs a single tenant on DATABASE_NAME
+TENANTS = [t.strip() for t in os.getenv("TENANTS", "").split(",") if t.strip()]
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant-ID")
+# Without the header, "<tenant><suffix>" Host names select the tenant
+TENANT_HOST_SUFFIX = os.getenv("TENANT_HOST_SUFFIX", "")
+# Tenant for API requests that name none; empty rejects them
+TENANT_DEFAULT = os.getenv("TENANT_DEFAULT", "")
+TENANT_DATABASE_PREFIX = os.getenv("TENANT_DATABASE_PREFIX", f"{DATABASE_NAME}_")
+TENANT_EXEMPT_PATHS = [
+    "/api/health",
+    "/api/docs",
+    "/api/redoc",
+    "/api/openapi.json",
+]
 
 # Application Configuration
 APP_TITLE = "生物公司进销存管理系统"
 APP_DESCRIPTION = "蛋白抗原抗体及相关合成服务的进销存管理"
 APP_VERSION = "1.0.0"
+
+# Server Configuration
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+SERVER_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("SERVER_GRACEFUL_TIMEOUT_SECONDS", "30"))
+SERVER_KEEPALIVE_SECONDS = int(os.getenv("SERVER_KEEPALIVE_SECONDS", "5"))
+READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", "2"))
+
+# Static Asset and Compression Configuration
+STATIC_MAX_AGE_SECONDS = int(os.getenv("STATIC_MAX_AGE_SECONDS", "31536000"))
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+GZIP_COMPRESS_LEVEL = int(os.getenv("GZIP_COMPRESS_LEVEL", "6"))
+COMPRESSION_EXCLUDED_PATHS = [
+    "/api/events",
+]
+
+# Batch Fetch Configuration
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "500"))
+
+# Replenishment Configuration
+REPLENISHMENT_LOOKBACK_DAYS = int(os.getenv("REPLENISHMENT_LOOKBACK_DAYS", "90"))
+REPLENISHMENT_RATE_WINDOW_DAYS = int(os.getenv("REPLENISHMENT_RATE_WINDOW_DAYS", "28"))
+REPLENISHMENT_LEAD_TIME_DAYS = int(os.getenv("REPLENISHMENT_LEAD_TIME_DAYS", "14"))
+REPLENISHMENT_REVIEW_DAYS = int(os.getenv("REPLENISHMENT_REVIEW_DAYS", "7"))
+REPLENISHMENT_SERVICE_LEVEL_Z = float(os.getenv("REPLENISHMENT_SERVICE_LEVEL_Z", "1.65"))
+
+# Scheduler Configuration
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "2"))
+SCHEDULER_LEASE_TTL_SECONDS = float(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "30"))
+ROLLUP_REBUILD_CRON = os.getenv("ROLLUP_REBUILD_CRON", "0 3 * * *")
+REPLENISHMENT_CRON = os.getenv("REPLENISHMENT_CRON", "30 3 * * *")
+VALUATION_WARM_INTERVAL_SECONDS = float(os.getenv("VALUATION_WARM_INTERVAL_SECONDS", "300"))
+
+# Receivables/Payables Aging Configuration
+AGING_BUCKET_DAYS = [int(d) for d in os.getenv("AGING_BUCKET_DAYS", "30,60,90").split(",")]
+AGING_CACHE_SIZE = int(os.getenv("AGING_CACHE_SIZE", "1024"))
+
+# Supplier Performance Configuration
+# Lead times beyond this many days share the last histogram bucket
+LEAD_TIME_MAX_DAYS = int(os.getenv("LEAD_TIME_MAX_DAYS", "365"))
+
+# Archive Configuration
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+ARCHIVE_CRON = os.getenv("ARCHIVE_CRON", "0 4 * * 0")
+
+# Denormalized Name Propagation Configuration
+PROPAGATION_CHUNK_SIZE = int(os.getenv("PROPAGATION_CHUNK_SIZE", "500"))
+PROPAGATION_INTERVAL_SECONDS = float(os.getenv("PROPAGATION_INTERVAL_SECONDS", "60"))
+
+# Referential Integrity Configuration
+INTEGRITY_SCAN_CRON = os.getenv("INTEGRITY_SCAN_CRON", "0 5 * * *")
+INTEGRITY_SAMPLE_SIZE = int(os.getenv("INTEGRITY_SAMPLE_SIZE", "20"))
+
+# Development Query Tracing (N+1 detection and per-route query budgets)
+QUERY_TRACE_ENABLED = os.getenv("QUERY_TRACE_ENABLED", "false").lower() == "true"
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# Answer over-budget requests with 500 instead of logging them (for test runs)
+QUERY_BUDGET_ENFORCE = os.getenv("QUERY_BUDGET_ENFORCE", "false").lower() == "true"
+QUERY_BUDGETS = {
+    "GET /api/products/": 2,
+    "GET /api/partners/": 2,
+    "GET /api/partners/suppliers": 2,
+    "GET /api/partners/customers": 2,
+    "GET /api/inventory/": 3,
+    "GET /api/inventory/expiring": 2,
+    "GET /api/inventory/records/": 4,
+    "GET /api/sales/": 2,
+    "GET /api/purchases/": 2,
+    "GET /api/stocktakes/": 1,
+    "GET /api/replenishment/suggestions": 1,
+}
+
+# Idempotency Configuration
+IDEMPOTENCY_PATHS = [
+    "/api/inventory/in",
+    "/api/inventory/out",
+    "/api/sales/",
+    "/api/purchases/",
+]
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "60"))
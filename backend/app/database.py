@@ -1,23 +1,69 @@
 """MongoDB database connection and utilities."""
+from contextvars import ContextVar
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import SecondaryPreferred
 from typing import Optional
 
-from .config import MONGODB_URL, DATABASE_NAME
+from .config import (
+    MONGODB_URL,
+    DATABASE_NAME,
+    MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE,
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    QUERY_TRACE_ENABLED,
+    IDEMPOTENCY_TTL_SECONDS,
+    READ_MAX_STALENESS_SECONDS,
+    SECONDARY_READS_ENABLED,
+    TENANTS,
+    TENANT_DATABASE_PREFIX,
+)
+from .services.health import pool_monitor
+from .services.order_history import ensure_history_indexes
+from .services.query_trace import query_tracer
+from .services.rollups import ensure_rollup_indexes
 
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     db = None
+    transactions: bool = False
+    # Tenant ID -> database handle on the shared client
+    tenants: dict = {}
+    # Database name -> secondary-preferred handle for listings and reports
+    readers: dict = {}
 
 
 db = Database()
 
+# Tenant of the running request or job; None outside any tenant
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+# Causally consistent session of a request that must see an earlier write
+current_read_session: ContextVar = ContextVar("current_read_session", default=None)
+
+SECONDARY_READ_PREFERENCE = SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS)
+
 
 async def connect_to_mongo():
-    """Create database connection."""
-    db.client = AsyncIOMotorClient(MONGODB_URL)
+    """Create this process's database connection and verify it is reachable."""
+    db.client = AsyncIOMotorClient(
+        MONGODB_URL,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[pool_monitor, query_tracer] if QUERY_TRACE_ENABLED else [pool_monitor]
+    )
     db.db = db.client[DATABASE_NAME]
-    print(f"Connected to MongoDB: {DATABASE_NAME}")
+    db.tenants = {}
+    db.readers = {}
+    await db.client.admin.command("ping")
+    db.transactions = await supports_transactions(db.client)
+    if TENANTS:
+        # Tenant databases are indexed on first use; DATABASE_NAME only
+        # keeps deployment-wide state such as the scheduler lease
+        print(f"Connected to MongoDB: {len(TENANTS)} tenants (pool size {MONGODB_MAX_POOL_SIZE})")
+    else:
+        await create_indexes(db.db)
+        print(f"Connected to MongoDB: {DATABASE_NAME} (pool size {MONGODB_MAX_POOL_SIZE})")
 
 
 async def close_mongo_connection():
@@ -27,6 +73,99 @@ async def close_mongo_connection():
         print("Disconnected from MongoDB")
 
 
+async def supports_transactions(client) -> bool:
+    """Multi-document transactions need a replica set or a sharded cluster."""
+    try:
+        hello = await client.admin.command("hello")
+    except Exception:
+        return False
+    return bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+
+
+async def create_indexes(database):
+    """Create the indexes used by the API query paths."""
+    # Per-product lookups; transfers find destination rows by warehouse and batch
+    await database.inventory.create_index([("product_id", 1), ("warehouse", 1), ("batch_number", 1)])
+    # Near-expiry report: range scan on expires_at, grouped by warehouse
+    await database.inventory.create_index([("expires_at", 1), ("warehouse", 1)])
+    # Ledger lookups per inventory row (as-of valuation rolls back later movements)
+    await database.inventory_records.create_index([("inventory_id", 1), ("created_at", -1)])
+    # Replenishment: OUT ledger window scan
+    await database.inventory_records.create_index([("operation_type", 1), ("created_at", 1)])
+    # Reference checks before deleting a product or partner; orders use the history indexes
+    await database.inventory_records.create_index("product_id")
+    await ensure_history_indexes(database)
+    await database.integrity_reports.create_index("started_at")
+    # Receivables/payables aging: covered scans of open orders
+    await database.sales_orders.create_index(
+        [("status", 1), ("customer_id", 1), ("order_date", 1), ("total_amount", 1)]
+    )
+    await database.purchase_orders.create_index(
+        [("status", 1), ("supplier_id", 1), ("order_date", 1), ("total_amount", 1)]
+    )
+    # Supplier performance: receipt log per supplier, stats per product across suppliers
+    await database.purchase_receipts.create_index([("supplier_id", 1), ("received_at", -1)])
+    await database.purchase_receipts.create_index("order_id")
+    await database.supplier_performance.create_index([("product_id", 1), ("receipts", -1)])
+    # Paired ledger records of one transfer
+    await database.inventory_records.create_index("transfer_id", sparse=True)
+    # Stocktakes: snapshot lines per session, frozen inventory rows
+    await database.stocktake_lines.create_index([("stocktake_id", 1), ("inventory_id", 1)], unique=True)
+    await database.stocktakes.create_index("created_at")
+    await database.inventory.create_index("stocktake_id", sparse=True)
+    await database.replenishment_suggestions.create_index("cover_rank")
+    # Ledger archive tier
+    await database.inventory_record_summaries.create_index([("product_id", 1), ("month", 1)], unique=True)
+    await database.archive_partitions.create_index([("collection", 1), ("start", -1)])
+    # Stored Idempotency-Key responses expire after the TTL
+    await database.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+    await ensure_rollup_indexes(database.sales_rollups)
+    await ensure_rollup_indexes(database.purchase_rollups)
+
+
+def tenant_database_name(tenant: str) -> str:
+    return f"{TENANT_DATABASE_PREFIX}{tenant}"
+
+
 def get_database():
-    """Get database instance."""
-    return db.db
+    """Get the database of the current tenant.
+
+    Outside a tenant (single-tenant deployments, startup, the scheduler's
+    own bookkeeping) this is the ``DATABASE_NAME`` database.
+    """
+    tenant = current_tenant.get()
+    if tenant is None:
+        return db.db
+    database = db.tenants.get(tenant)
+    if database is None:
+        database = db.tenants[tenant] = db.client[tenant_database_name(tenant)]
+    return database
+
+
+def get_read_database():
+    """Get the current tenant's database for listings, exports and reports.
+
+    Reads through this handle prefer a secondary that is at most
+    ``READ_MAX_STALENESS_SECONDS`` behind the primary. Pass
+    ``session=read_session()`` to them so a client that sends the
+    consistency token of its last write reads that write back.
+    """
+    database = get_database()
+    if not SECONDARY_READS_ENABLED:
+        return database
+    reader = db.readers.get(database.name)
+    if reader is None:
+        reader = db.readers[database.name] = database.with_options(
+            read_preference=SECONDARY_READ_PREFERENCE
+        )
+    return reader
+
+
+def read_session():
+    """The request's causally consistent read session, if it has one."""
+    return current_read_session.get()
+
+
+def transactions_enabled() -> bool:
+    """Whether the connected deployment supports multi-document transactions."""
+    return db.transactions
@@ -6,18 +6,61 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 import os
 
-from .config import APP_TITLE, APP_DESCRIPTION, APP_VERSION
-from .database import connect_to_mongo, close_mongo_connection
-from .routers import products, inventory, purchases, sales, partners
+from .assets import DIST_DIR, is_built
+from .config import (
+    APP_TITLE, APP_DESCRIPTION, APP_VERSION, SCHEDULER_ENABLED, TENANTS, CONSISTENCY_TOKEN_HEADER,
+    QUERY_TRACE_ENABLED,
+    COMPRESSION_EXCLUDED_PATHS, GZIP_COMPRESS_LEVEL, GZIP_MINIMUM_SIZE, STATIC_MAX_AGE_SECONDS,
+)
+from .database import db, connect_to_mongo, close_mongo_connection, get_database, tenant_database_name
+from .services.expiry import backfill_expiry_dates
+from .services.events import event_bus
+from .services.health import health_state
+from .services.idempotency import IdempotencyMiddleware
+from .services.jobs import register_jobs, scheduler, warm_caches
+from .services.order_lines import backfill_line_ids
+from .services.propagation import name_propagator
+from .services.query_trace import QueryTraceMiddleware
+from .services.read_routing import ReadConsistencyMiddleware
+from .services.tenancy import TenantMiddleware, prepare_tenants
+from .utils.compression import CompressionMiddleware, PrecompressedStaticFiles
+from .routers import (
+    products, inventory, purchases, sales, partners, reports, replenishment, jobs, events, health,
+    stocktakes, integrity
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Application lifespan context manager for startup and shutdown events."""
+    """Application lifespan context manager for startup and shutdown events.
+
+    Runs once in every worker process; the worker accepts requests only
+    after startup has finished.
+    """
     # Startup: Connect to MongoDB
     await connect_to_mongo()
+    if TENANTS:
+        await prepare_tenants()
+    else:
+        await backfill_expiry_dates(get_database())
+        await backfill_line_ids(get_database())
+    await event_bus.start(db.client, get_database(), [tenant_database_name(t) for t in TENANTS])
+    # Startup: Start background job scheduler
+    if SCHEDULER_ENABLED:
+        register_jobs()
+        await scheduler.start(get_database())
+    # Startup: Warm per-process caches before taking traffic
+    await warm_caches()
+    health_state.mark_ready()
     yield
-    # Shutdown: Close MongoDB connection
+    # Shutdown: Report not ready and end live streams, then stop scheduler
+    # and close MongoDB connection
+    health_state.begin_draining()
+    event_bus.close_subscribers()
+    if SCHEDULER_ENABLED:
+        await scheduler.stop()
+    await name_propagator.stop()
+    await event_bus.stop()
     await close_mongo_connection()
 
 
@@ -32,21 +75,52 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS middleware configuration
+# Idempotency-Key support for retried stock movements and order creation
+app.add_middleware(IdempotencyMiddleware)
+
+# Route each API request to its tenant's database (outside idempotency,
+# whose stored keys live in the tenant database)
+app.add_middleware(TenantMiddleware)
+
+# Consistency tokens on writes, so secondary reads can wait for them
+# (outside idempotency, so replayed responses carry one too)
+app.add_middleware(ReadConsistencyMiddleware)
+
+# Gzip large responses (JSON lists, the index page); event streams are left alone
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=GZIP_MINIMUM_SIZE,
+    compresslevel=GZIP_COMPRESS_LEVEL,
+    excluded_paths=COMPRESSION_EXCLUDED_PATHS,
+)
+
+# Development: per-request query tracing, N+1 detection and query budgets
+if QUERY_TRACE_ENABLED:
+    app.add_middleware(QueryTraceMiddleware)
+
+# CORS middleware configuration (added last so it also wraps replayed responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", CONSISTENCY_TOKEN_HEADER, "X-Query-Count"],
 )
 
 # Register routers
 app.include_router(products.router, prefix="/api")
 app.include_router(inventory.router, prefix="/api")
+app.include_router(stocktakes.router, prefix="/api")
 app.include_router(purchases.router, prefix="/api")
 app.include_router(sales.router, prefix="/api")
 app.include_router(partners.router, prefix="/api")
+app.include_router(reports.router, prefix="/api")
+app.include_router(replenishment.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(integrity.router, prefix="/api")
+app.include_router(events.router, prefix="/api")
+app.include_router(health.router, prefix="/api")
 
 
 # Root endpoint
@@ -60,16 +134,22 @@ async def root():
     }
 
 
-# Health check endpoint
-@app.get("/api/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
-
-
-# Mount static files for frontend
+# Mount static files for frontend: the hashed, precompressed build from
+# `python -m app.assets` when present, otherwise the sources as they are
 frontend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "..", "frontend")
-if os.path.exists(frontend_path):
+if is_built():
+    app.mount(
+        "/static",
+        PrecompressedStaticFiles(directory=os.path.join(DIST_DIR, "static"), max_age=STATIC_MAX_AGE_SECONDS),
+        name="static"
+    )
+
+    @app.get("/")
+    async def serve_frontend():
+        """Serve frontend index.html."""
+        # The page names the current asset hashes, so it must be revalidated
+        return FileResponse(os.path.join(DIST_DIR, "index.html"), headers={"Cache-Control": "no-cache"})
+elif os.path.exists(frontend_path):
     app.mount("/static", StaticFiles(directory=os.path.join(frontend_path, "static")), name="static")
     
     @app.get("/")
@@ -0,0 +1,18 @@
+"""Batch fetch models for biotech inventory system."""
+from pydantic import BaseModel, Field
+from typing import Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BatchRequest(BaseModel):
+    """按ID批量查询请求"""
+    ids: List[str] = Field(..., description="ID列表，结果按此顺序返回")
+
+
+class BatchItem(BaseModel, Generic[T]):
+    """批量查询结果项"""
+    id: str = Field(..., description="请求的ID")
+    found: bool = Field(..., description="是否找到")
+    data: Optional[T] = Field(None, description="查询结果")
+    detail: Optional[str] = Field(None, description="未找到或ID无效时的说明")
@@ -0,0 +1,32 @@
+"""Referential integrity report models for biotech inventory system."""
+from pydantic import BaseModel, Field
+from typing import List
+from datetime import datetime
+from enum import Enum
+
+
+class IntegrityRepair(str, Enum):
+    """悬空引用修复方式"""
+    NONE = "none"
+    DELETE = "delete"
+
+
+class IntegrityCheck(BaseModel):
+    """单个引用字段的检查结果"""
+    collection: str = Field(..., description="引用方集合")
+    field: str = Field(..., description="引用字段")
+    parent: str = Field(..., description="被引用集合")
+    distinct_ids: int = Field(..., description="引用的不同ID数")
+    orphan_count: int = Field(..., description="悬空ID数")
+    orphan_references: int = Field(..., description="悬空引用数")
+    orphan_ids: List[str] = Field(default=[], description="悬空ID示例")
+    repaired: int = Field(default=0, description="已修复的文档数")
+
+
+class IntegrityReport(BaseModel):
+    """数据完整性检查报告"""
+    started_at: datetime
+    duration_ms: float
+    repair: IntegrityRepair
+    orphan_count: int = Field(..., description="悬空ID总数")
+    checks: List[IntegrityCheck]
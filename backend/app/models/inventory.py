@@ -11,6 +11,12 @@ class InventoryOperationType(str, Enum):
     OUT = "出库"
     ADJUST = "调整"
     RETURN = "退货"
+    TRANSFER_OUT = "调拨出库"
+    TRANSFER_IN = "调拨入库"
+
+
+# Ledger records that take stock out of their inventory row
+OUTBOUND_OPERATION_TYPES = (InventoryOperationType.OUT.value, InventoryOperationType.TRANSFER_OUT.value)
 
 
 class InventoryBase(BaseModel):
@@ -25,7 +31,7 @@ class InventoryBase(BaseModel):
 
 class InventoryCreate(InventoryBase):
     """创建库存记录请求"""
-    pass
+    received_at: Optional[datetime] = Field(None, description="入库日期，用于计算失效日期")
 
 
 class InventoryUpdate(BaseModel):
@@ -52,10 +58,20 @@ class InventoryResponse(InventoryBase):
     id: str
     product_name: Optional[str] = None
     product_code: Optional[str] = None
+    received_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    stocktake_id: Optional[str] = Field(None, description="进行中的盘点ID（盘点期间暂停出入库）")
     created_at: datetime
     updated_at: datetime
 
 
+class ExpiringInventoryGroup(BaseModel):
+    """按仓库分组的临期库存"""
+    warehouse: str
+    total_quantity: int
+    items: List[InventoryResponse]
+
+
 class InventoryRecordBase(BaseModel):
     """库存流水记录基础模型"""
     product_id: str = Field(..., description="产品ID")
@@ -86,4 +102,39 @@ class InventoryRecordResponse(InventoryRecordBase):
     """库存流水记录响应模型"""
     id: str
     product_name: Optional[str] = None
+    transfer_id: Optional[str] = None
+    stocktake_id: Optional[str] = None
+    created_at: datetime
+
+
+class InventoryTransferItem(BaseModel):
+    """调拨明细"""
+    inventory_id: str = Field(..., description="调出库存ID")
+    quantity: int = Field(..., gt=0, description="调拨数量")
+    location: Optional[str] = Field(None, description="调入货位（新建调入库存行时使用）")
+
+
+class InventoryTransferCreate(BaseModel):
+    """库存调拨请求"""
+    to_warehouse: str = Field(..., description="调入仓库")
+    items: List[InventoryTransferItem] = Field(..., min_length=1, description="调拨明细")
+    operator: Optional[str] = Field(None, description="操作人")
+    remark: Optional[str] = Field(None, description="备注")
+
+
+class InventoryTransferLine(BaseModel):
+    """调拨结果明细"""
+    product_id: str
+    batch_number: Optional[str] = None
+    quantity: int
+    from_inventory_id: str = Field(..., description="调出库存ID")
+    from_warehouse: str = Field(..., description="调出仓库")
+    to_inventory_id: str = Field(..., description="调入库存ID")
+
+
+class InventoryTransferResponse(BaseModel):
+    """库存调拨响应"""
+    transfer_id: str
+    to_warehouse: str
+    items: List[InventoryTransferLine]
     created_at: datetime
@@ -0,0 +1,28 @@
+"""Background job models for biotech inventory system."""
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+
+class JobStatus(BaseModel):
+    """后台任务状态"""
+    name: str = Field(..., description="任务名称")
+    schedule: str = Field(..., description="调度计划")
+    leader_only: bool = Field(..., description="是否仅在主节点运行")
+    running: bool = Field(..., description="是否运行中")
+    next_run: Optional[datetime] = Field(None, description="下次运行时间")
+    runs: int = Field(default=0, description="运行次数")
+    failures: int = Field(default=0, description="失败次数")
+    skipped: int = Field(default=0, description="跳过次数")
+    last_started_at: Optional[datetime] = Field(None, description="上次开始时间")
+    last_duration_ms: Optional[float] = Field(None, description="上次耗时(毫秒)")
+    avg_duration_ms: Optional[float] = Field(None, description="平均耗时(毫秒)")
+    max_duration_ms: Optional[float] = Field(None, description="最长耗时(毫秒)")
+    last_error: Optional[str] = Field(None, description="最近错误")
+
+
+class SchedulerStatus(BaseModel):
+    """调度器状态"""
+    worker_id: str
+    is_leader: bool
+    jobs: List[JobStatus]
@@ -44,6 +44,7 @@ class PartnerUpdate(BaseModel):
     tax_number: Optional[str] = None
     remark: Optional[str] = None
     is_active: Optional[bool] = None
+    version: Optional[int] = None
 
 
 class PartnerInDB(PartnerBase):
@@ -51,6 +52,7 @@ class PartnerInDB(PartnerBase):
     id: str = Field(..., alias="_id")
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
+    version: int = Field(default=1, description="版本号")
 
     class Config:
         populate_by_name = True
@@ -61,3 +63,4 @@ class PartnerResponse(PartnerBase):
     id: str
     created_at: datetime
     updated_at: datetime
+    version: int = 0
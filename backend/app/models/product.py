@@ -43,6 +43,7 @@ class ProductUpdate(BaseModel):
     storage_conditions: Optional[str] = None
     shelf_life: Optional[int] = None
     category: Optional[str] = None
+    version: Optional[int] = None
 
 
 class ProductInDB(ProductBase):
@@ -50,6 +51,7 @@ class ProductInDB(ProductBase):
     id: str = Field(..., alias="_id")
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
+    version: int = Field(default=1, description="版本号")
 
     class Config:
         populate_by_name = True
@@ -60,3 +62,4 @@ class ProductResponse(ProductBase):
     id: str
     created_at: datetime
     updated_at: datetime
+    version: int = 0
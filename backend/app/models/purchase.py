@@ -18,6 +18,7 @@ class PurchaseOrderStatus(str, Enum):
 
 class PurchaseOrderItem(BaseModel):
     """采购订单明细"""
+    line_id: Optional[str] = Field(None, description="明细ID")
     product_id: str = Field(..., description="产品ID")
     product_name: Optional[str] = Field(None, description="产品名称")
     quantity: int = Field(..., description="数量")
@@ -47,6 +48,35 @@ class PurchaseOrderCreate(BaseModel):
     remark: Optional[str] = None
 
 
+class PurchaseOrderLineUpdate(BaseModel):
+    """更新采购订单明细请求"""
+    product_id: Optional[str] = None
+    quantity: Optional[int] = None
+    unit_price: Optional[float] = None
+    received_quantity: Optional[int] = None
+    remark: Optional[str] = None
+    version: Optional[int] = None
+
+
+class PurchaseOrderLinePage(BaseModel):
+    """采购订单明细分页"""
+    total: int = Field(..., description="明细总数")
+    items: List[PurchaseOrderItem] = Field(default=[], description="订单明细")
+
+
+class PurchaseOrderHistoryEntry(BaseModel):
+    """采购订单历史记录"""
+    id: str
+    order_number: str
+    supplier_id: str
+    supplier_name: Optional[str] = None
+    order_date: Optional[datetime] = None
+    status: Optional[PurchaseOrderStatus] = None
+    total_amount: float = Field(default=0.0, description="订单总金额")
+    quantity: Optional[int] = Field(None, description="该产品数量（按产品查询时）")
+    amount: Optional[float] = Field(None, description="该产品金额（按产品查询时）")
+
+
 class PurchaseOrderUpdate(BaseModel):
     """更新采购订单请求"""
     supplier_id: Optional[str] = None
@@ -54,6 +84,7 @@ class PurchaseOrderUpdate(BaseModel):
     status: Optional[PurchaseOrderStatus] = None
     expected_date: Optional[datetime] = None
     remark: Optional[str] = None
+    version: Optional[int] = None
 
 
 class PurchaseOrderInDB(PurchaseOrderBase):
@@ -62,6 +93,7 @@ class PurchaseOrderInDB(PurchaseOrderBase):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     created_by: Optional[str] = Field(None, description="创建人")
+    version: int = Field(default=1, description="版本号")
 
     class Config:
         populate_by_name = True
@@ -73,3 +105,4 @@ class PurchaseOrderResponse(PurchaseOrderBase):
     created_at: datetime
     updated_at: datetime
     created_by: Optional[str] = None
+    version: int = 0
@@ -0,0 +1,26 @@
+"""Replenishment suggestion models for biotech inventory system."""
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class ReplenishmentSuggestion(BaseModel):
+    """补货建议"""
+    product_id: str = Field(..., description="产品ID")
+    product_name: Optional[str] = Field(None, description="产品名称")
+    product_code: Optional[str] = Field(None, description="产品编号")
+    on_hand: int = Field(default=0, description="现有库存")
+    on_order: int = Field(default=0, description="在途数量")
+    daily_rate: float = Field(default=0.0, description="日均消耗")
+    demand_std: float = Field(default=0.0, description="日消耗标准差")
+    safety_stock: int = Field(default=0, description="安全库存")
+    reorder_point: int = Field(default=0, description="再订货点")
+    suggested_quantity: int = Field(default=0, description="建议采购数量")
+    days_of_cover: Optional[float] = Field(None, description="可用天数")
+    lead_time_days: int = Field(..., description="采购提前期(天)")
+    computed_at: datetime
+
+
+class ReplenishmentRunResult(BaseModel):
+    """补货计算任务"""
+    status: str
@@ -0,0 +1,126 @@
+"""Report models for biotech inventory system."""
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+from enum import Enum
+
+
+class RollupKind(str, Enum):
+    """汇总类型"""
+    SALES = "sales"
+    PURCHASES = "purchases"
+
+
+class RollupDimension(str, Enum):
+    """汇总维度"""
+    DAY = "day"
+    MONTH = "month"
+    PRODUCT = "product"
+    PARTNER = "partner"
+
+
+class RollupEntry(BaseModel):
+    """汇总数据"""
+    key: str = Field(..., description="维度键（日期/月份/产品ID/合作伙伴ID）")
+    label: Optional[str] = Field(None, description="名称")
+    amount: float = Field(default=0.0, description="金额")
+    quantity: int = Field(default=0, description="数量")
+    order_count: int = Field(default=0, description="订单数")
+
+
+class RollupRebuildResult(BaseModel):
+    """汇总重建结果"""
+    kind: RollupKind
+    entries: int
+
+
+class ValuationGroup(BaseModel):
+    """库存估值分组"""
+    key: Optional[str] = Field(None, description="分组键（仓库/产品类型/分类）")
+    quantity: int = Field(default=0, description="数量")
+    value: float = Field(default=0.0, description="金额")
+
+
+class ProductValuation(BaseModel):
+    """产品库存估值"""
+    product_id: str
+    product_name: Optional[str] = None
+    product_code: Optional[str] = None
+    quantity: int = Field(default=0, description="数量")
+    value: float = Field(default=0.0, description="金额")
+    weighted_average_cost: float = Field(default=0.0, description="加权平均成本")
+
+
+class InventoryValuation(BaseModel):
+    """库存估值报表"""
+    as_of: Optional[datetime] = Field(None, description="估值时点，为空表示当前")
+    stock_version: int = Field(..., description="库存变更版本")
+    total_quantity: int = Field(default=0, description="总数量")
+    total_value: float = Field(default=0.0, description="总金额")
+    by_warehouse: List[ValuationGroup] = Field(default=[], description="按仓库")
+    by_product_type: List[ValuationGroup] = Field(default=[], description="按产品类型")
+    by_category: List[ValuationGroup] = Field(default=[], description="按产品分类")
+    by_product: List[ProductValuation] = Field(default=[], description="按产品")
+
+
+class AgingKind(str, Enum):
+    """账龄类型"""
+    RECEIVABLES = "receivables"
+    PAYABLES = "payables"
+
+
+class AgingBucket(BaseModel):
+    """账龄区间"""
+    label: str = Field(..., description="区间名称")
+    min_days: int = Field(..., description="最小账龄（天）")
+    max_days: Optional[int] = Field(None, description="最大账龄（天），为空表示以上")
+    amount: float = Field(default=0.0, description="金额")
+    order_count: int = Field(default=0, description="订单数")
+
+
+class PartnerAging(BaseModel):
+    """客户应收/供应商应付账龄"""
+    partner_id: str
+    partner_name: Optional[str] = None
+    outstanding: float = Field(default=0.0, description="未结金额")
+    order_count: int = Field(default=0, description="未结订单数")
+    oldest_order_date: Optional[datetime] = Field(None, description="最早未结订单日期")
+    buckets: List[AgingBucket] = Field(default=[], description="账龄分布")
+
+
+class AgingReport(BaseModel):
+    """应收/应付账龄报表"""
+    kind: AgingKind
+    as_of: datetime = Field(..., description="账龄计算日期")
+    total_outstanding: float = Field(default=0.0, description="未结金额合计")
+    order_count: int = Field(default=0, description="未结订单数")
+    buckets: List[AgingBucket] = Field(default=[], description="账龄分布")
+    partners: List[PartnerAging] = Field(default=[], description="按客户/供应商（按未结金额降序）")
+
+
+class LeadTimeStats(BaseModel):
+    """交货周期统计（天）"""
+    count: int = Field(default=0, description="统计的入库次数")
+    mean_days: Optional[float] = Field(None, description="平均交货周期")
+    stddev_days: Optional[float] = Field(None, description="标准差")
+    min_days: Optional[float] = Field(None, description="最短交货周期")
+    max_days: Optional[float] = Field(None, description="最长交货周期")
+    p50_days: Optional[int] = Field(None, description="中位数（整天）")
+    p90_days: Optional[int] = Field(None, description="90 分位（整天）")
+    p95_days: Optional[int] = Field(None, description="95 分位（整天）")
+
+
+class SupplierPerformance(BaseModel):
+    """供应商绩效（交货周期、准时率、满足率）"""
+    supplier_id: str
+    supplier_name: Optional[str] = None
+    product_id: Optional[str] = Field(None, description="产品ID，为空表示该供应商全部产品")
+    product_name: Optional[str] = None
+    receipts: int = Field(default=0, description="入库次数")
+    received_quantity: int = Field(default=0, description="入库数量合计")
+    last_received_at: Optional[datetime] = Field(None, description="最近入库时间")
+    lead_time: LeadTimeStats = Field(default_factory=LeadTimeStats, description="交货周期")
+    on_time_rate: Optional[float] = Field(None, description="准时率（不晚于预计到货日期的入库占比）")
+    fill_rate: Optional[float] = Field(None, description="数量满足率（已完成订单入库数量 / 订购数量）")
+    line_fill_rate: Optional[float] = Field(None, description="明细满足率（已完成订单中足量入库的明细占比）")
+    closed_lines: int = Field(default=0, description="已完成订单明细数")
@@ -19,6 +19,7 @@ class SalesOrderStatus(str, Enum):
 
 class SalesOrderItem(BaseModel):
     """销售订单明细"""
+    line_id: Optional[str] = Field(None, description="明细ID")
     product_id: str = Field(..., description="产品ID")
     product_name: Optional[str] = Field(None, description="产品名称")
     quantity: int = Field(..., description="数量")
@@ -50,6 +51,35 @@ class SalesOrderCreate(BaseModel):
     remark: Optional[str] = None
 
 
+class SalesOrderLineUpdate(BaseModel):
+    """更新销售订单明细请求"""
+    product_id: Optional[str] = None
+    quantity: Optional[int] = None
+    unit_price: Optional[float] = None
+    shipped_quantity: Optional[int] = None
+    remark: Optional[str] = None
+    version: Optional[int] = None
+
+
+class SalesOrderLinePage(BaseModel):
+    """销售订单明细分页"""
+    total: int = Field(..., description="明细总数")
+    items: List[SalesOrderItem] = Field(default=[], description="订单明细")
+
+
+class SalesOrderHistoryEntry(BaseModel):
+    """销售订单历史记录"""
+    id: str
+    order_number: str
+    customer_id: str
+    customer_name: Optional[str] = None
+    order_date: Optional[datetime] = None
+    status: Optional[SalesOrderStatus] = None
+    total_amount: float = Field(default=0.0, description="订单总金额")
+    quantity: Optional[int] = Field(None, description="该产品数量（按产品查询时）")
+    amount: Optional[float] = Field(None, description="该产品金额（按产品查询时）")
+
+
 class SalesOrderUpdate(BaseModel):
     """更新销售订单请求"""
     customer_id: Optional[str] = None
@@ -58,6 +88,7 @@ class SalesOrderUpdate(BaseModel):
     expected_date: Optional[datetime] = None
     shipping_address: Optional[str] = None
     remark: Optional[str] = None
+    version: Optional[int] = None
 
 
 class SalesOrderInDB(SalesOrderBase):
@@ -66,6 +97,7 @@ class SalesOrderInDB(SalesOrderBase):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     created_by: Optional[str] = Field(None, description="创建人")
+    version: int = Field(default=1, description="版本号")
 
     class Config:
         populate_by_name = True
@@ -77,3 +109,4 @@ class SalesOrderResponse(SalesOrderBase):
     created_at: datetime
     updated_at: datetime
     created_by: Optional[str] = None
+    version: int = 0
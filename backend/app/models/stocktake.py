@@ -0,0 +1,72 @@
+"""Stocktake (cycle count) models for biotech inventory system."""
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+from enum import Enum
+
+
+class StocktakeStatus(str, Enum):
+    """盘点状态"""
+    OPEN = "盘点中"
+    POSTED = "已过账"
+    CANCELLED = "已取消"
+
+
+class StocktakeCreate(BaseModel):
+    """创建盘点请求"""
+    warehouse: Optional[str] = Field(None, description="盘点仓库，为空时盘点全部仓库")
+    location: Optional[str] = Field(None, description="货位前缀")
+    product_id: Optional[str] = Field(None, description="产品ID")
+    operator: Optional[str] = Field(None, description="操作人")
+    remark: Optional[str] = Field(None, description="备注")
+
+
+class StocktakeResponse(BaseModel):
+    """盘点响应模型"""
+    id: str
+    stocktake_number: str
+    warehouse: Optional[str] = None
+    location: Optional[str] = None
+    product_id: Optional[str] = None
+    status: StocktakeStatus
+    line_count: int = Field(default=0, description="盘点库存行数")
+    counted_count: int = Field(default=0, description="已录入盘点数量的行数")
+    operator: Optional[str] = None
+    remark: Optional[str] = None
+    created_at: datetime
+    posted_at: Optional[datetime] = None
+
+
+class StocktakeCount(BaseModel):
+    """盘点数量"""
+    inventory_id: str = Field(..., description="库存ID")
+    counted_quantity: int = Field(..., ge=0, description="实盘数量")
+
+
+class StocktakeCountResult(BaseModel):
+    """盘点数量录入结果"""
+    accepted: int = Field(..., description="已录入行数")
+    unknown_inventory_ids: List[str] = Field(default=[], description="不在本次盘点范围内的库存ID")
+
+
+class StocktakeVariance(BaseModel):
+    """盘点差异明细"""
+    inventory_id: str
+    product_id: str
+    warehouse: Optional[str] = None
+    batch_number: Optional[str] = None
+    location: Optional[str] = None
+    system_quantity: int = Field(..., description="账面数量（开始盘点时冻结）")
+    counted_quantity: int = Field(..., description="实盘数量")
+    variance: int = Field(..., description="差异（实盘 - 账面）")
+
+
+class StocktakeVarianceReport(BaseModel):
+    """盘点差异报告"""
+    line_count: int = Field(..., description="盘点库存行数")
+    counted_count: int = Field(..., description="已盘点行数")
+    uncounted_count: int = Field(..., description="未盘点行数（过账时保持账面数量）")
+    variance_count: int = Field(..., description="有差异的行数")
+    total_gain: int = Field(..., description="盘盈数量合计")
+    total_loss: int = Field(..., description="盘亏数量合计")
+    variances: List[StocktakeVariance] = Field(default=[], description="差异明细")
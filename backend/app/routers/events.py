@@ -0,0 +1,40 @@
+"""Live change event API routes."""
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from ..database import get_database
+from ..services.events import TOPIC_COLLECTIONS, event_bus, format_sse
+
+router = APIRouter(prefix="/events", tags=["实时推送"])
+
+HEARTBEAT_SECONDS = 15
+COALESCE_WINDOW_SECONDS = 0.25
+
+
+@router.get("")
+async def stream_events(request: Request, topics: Optional[str] = None):
+    """订阅库存变动与订单状态变更（Server-Sent Events）
+
+    topics 为逗号分隔的 inventory、sales、purchases，默认全部。
+    """
+    wanted = {t for t in (topics or "").split(",") if t in TOPIC_COLLECTIONS} or None
+    subscriber = event_bus.subscribe(wanted, database=get_database().name)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not subscriber.closed and not await request.is_disconnected():
+                batch = await subscriber.next_batch(HEARTBEAT_SECONDS, COALESCE_WINDOW_SECONDS)
+                if not batch:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield "".join(format_sse(event) for event in batch)
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,26 @@
+"""Liveness and readiness API routes."""
+from fastapi import APIRouter, Response, status
+
+from ..database import db
+from ..services.health import check_readiness
+
+router = APIRouter(prefix="/health", tags=["健康检查"])
+
+
+@router.get("")
+@router.get("/ready")
+async def readiness(response: Response):
+    """就绪检查：检测 MongoDB 连接并报告连接池状态
+
+    启动预热完成前、关闭排空期间或 MongoDB 不可用时返回 503。
+    """
+    result = await check_readiness(db.client)
+    if not result["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return result
+
+
+@router.get("/live")
+async def liveness():
+    """存活检查：进程能够响应请求即返回 200"""
+    return {"status": "alive"}
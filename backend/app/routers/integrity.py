@@ -0,0 +1,35 @@
+"""Referential integrity API routes."""
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+
+from ..database import get_database
+from ..models.integrity import IntegrityRepair, IntegrityReport
+from ..services.integrity import run_integrity_scan
+
+router = APIRouter(prefix="/integrity", tags=["数据完整性"])
+
+
+@router.get("/report", response_model=IntegrityReport)
+async def get_integrity_report():
+    """获取最近一次数据完整性检查报告"""
+    db = get_database()
+    report = await db.integrity_reports.find_one({}, {"_id": 0}, sort=[("started_at", -1)])
+    if not report:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="尚未运行数据完整性检查"
+        )
+    return report
+
+
+@router.post("/scan", status_code=status.HTTP_202_ACCEPTED)
+async def trigger_integrity_scan(
+    background_tasks: BackgroundTasks,
+    repair: IntegrityRepair = IntegrityRepair.NONE
+):
+    """后台检查悬空引用
+
+    repair=delete 删除引用了不存在的产品或库存记录的库存和库存流水；订单只报告不删除。
+    """
+    db = get_database()
+    background_tasks.add_task(run_integrity_scan, db, repair)
+    return {"status": "scheduled"}
@@ -1,21 +1,37 @@
 """Inventory management API routes."""
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Response, status
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+import re
 
-from ..database import get_database
+from ..database import get_database, get_read_database, read_session
+from ..services.expiry import compute_expires_at
+from ..services.archive import archive_cutoff, read_archived_records
+from ..services.events import event_bus, inventory_event
+from ..services.stock_version import bump_stock_version
+from ..services.stocktake import NOT_FROZEN, ensure_not_frozen, frozen_conflict
+from ..services.transfers import transfer_stock
+from ..utils.fields import parse_fields, projection, sparse_response
+from ..utils.pagination import total_count_headers
 from ..models.inventory import (
+    ExpiringInventoryGroup,
     InventoryCreate,
     InventoryUpdate,
     InventoryResponse,
     InventoryRecordCreate,
     InventoryRecordResponse,
-    InventoryOperationType
+    InventoryOperationType,
+    InventoryTransferCreate,
+    InventoryTransferResponse
 )
 
 router = APIRouter(prefix="/inventory", tags=["库存管理"])
 
+# Response fields filled from the product document
+PRODUCT_FIELDS = {"product_name": ("product_id",), "product_code": ("product_id",)}
+RECORD_PRODUCT_FIELDS = {"product_name": ("product_id",)}
+
 
 def inventory_helper(inventory, product=None) -> dict:
     """Convert MongoDB document to response format."""
@@ -29,11 +45,24 @@ def inventory_helper(inventory, product=None) -> dict:
         "quantity": inventory.get("quantity"),
         "unit_price": inventory.get("unit_price"),
         "location": inventory.get("location"),
+        "received_at": inventory.get("received_at"),
+        "expires_at": inventory.get("expires_at"),
+        "stocktake_id": inventory.get("stocktake_id"),
         "created_at": inventory.get("created_at"),
         "updated_at": inventory.get("updated_at"),
     }
 
 
+async def products_by_id(db, product_ids, fields: dict, session=None) -> dict:
+    """Look up the products of a page of rows with one ``$in`` query."""
+    object_ids = {ObjectId(pid) for pid in product_ids if pid and ObjectId.is_valid(pid)}
+    products = {}
+    if object_ids:
+        async for product in db.products.find({"_id": {"$in": list(object_ids)}}, fields, session=session):
+            products[str(product["_id"])] = product
+    return products
+
+
 def record_helper(record, product=None) -> dict:
     """Convert MongoDB document to response format."""
     return {
@@ -47,39 +76,100 @@ def record_helper(record, product=None) -> dict:
         "related_order_id": record.get("related_order_id"),
         "operator": record.get("operator"),
         "remark": record.get("remark"),
+        "transfer_id": record.get("transfer_id"),
+        "stocktake_id": record.get("stocktake_id"),
         "created_at": record.get("created_at"),
     }
 
 
 @router.get("/", response_model=List[InventoryResponse])
 async def get_inventory_list(
+    response: Response,
     product_id: Optional[str] = None,
     warehouse: Optional[str] = None,
+    search: Optional[str] = None,
+    fields: Optional[str] = None,
+    with_total: bool = False,
     skip: int = 0,
     limit: int = 100
 ):
-    """获取库存列表"""
-    db = get_database()
+    """获取库存列表
+
+    search 按批次号、仓库或货位搜索；fields 指定返回字段（逗号分隔）；
+    with_total=true 时在响应头 X-Total-Count 中返回总数。
+    """
+    db = get_read_database()
+    session = read_session()
+    selected = parse_fields(fields, InventoryResponse)
+    needs_product = selected is None or any(f in PRODUCT_FIELDS for f in selected)
     query = {}
     
     if product_id:
         query["product_id"] = product_id
     if warehouse:
         query["warehouse"] = warehouse
-    
-    inventories = []
-    cursor = db.inventory.find(query).skip(skip).limit(limit)
-    async for inv in cursor:
-        product = None
-        if inv.get("product_id"):
-            try:
-                product = await db.products.find_one({"_id": ObjectId(inv["product_id"])})
-            except Exception:
-                pass
-        inventories.append(inventory_helper(inv, product))
+    if search:
+        # Escaped: the search box sends every keystroke, "(" included
+        pattern = re.escape(search)
+        query["$or"] = [
+            {"batch_number": {"$regex": pattern, "$options": "i"}},
+            {"warehouse": {"$regex": pattern, "$options": "i"}},
+            {"location": {"$regex": pattern, "$options": "i"}},
+        ]
+    
+    headers = await total_count_headers(db.inventory, query, with_total, session)
+    rows = await db.inventory.find(
+        query, projection(selected, PRODUCT_FIELDS), session=session
+    ).sort("_id", 1).skip(skip).limit(limit).to_list(length=None)
+    products = {}
+    if needs_product:
+        products = await products_by_id(
+            db, [row.get("product_id") for row in rows], {"name": 1, "product_code": 1}, session
+        )
+    inventories = [inventory_helper(row, products.get(row.get("product_id"))) for row in rows]
+    if selected:
+        return sparse_response(InventoryResponse, selected, inventories, headers)
+    response.headers.update(headers)
     return inventories
 
 
+@router.get("/expiring", response_model=List[ExpiringInventoryGroup])
+async def get_expiring_inventory(
+    within_days: int = 30,
+    warehouse: Optional[str] = None,
+    include_expired: bool = True
+):
+    """获取临期库存（按仓库分组）"""
+    db = get_read_database()
+    session = read_session()
+    now = datetime.now()
+    
+    expires_range = {"$lte": now + timedelta(days=within_days)}
+    if not include_expired:
+        expires_range["$gte"] = now
+    query = {"expires_at": expires_range, "quantity": {"$gt": 0}}
+    if warehouse:
+        query["warehouse"] = warehouse
+    
+    # Range scan on the expires_at index, earliest expiry first
+    rows = await db.inventory.find(query, session=session).sort("expires_at", 1).to_list(length=None)
+    
+    products = await products_by_id(
+        db, [row.get("product_id") for row in rows], {"name": 1, "product_code": 1}, session
+    )
+    
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(row.get("warehouse"), {
+            "warehouse": row.get("warehouse"),
+            "total_quantity": 0,
+            "items": [],
+        })
+        group["total_quantity"] += row.get("quantity", 0)
+        group["items"].append(inventory_helper(row, products.get(row.get("product_id"))))
+    return list(groups.values())
+
+
 @router.get("/{inventory_id}", response_model=InventoryResponse)
 async def get_inventory(inventory_id: str):
     """获取库存详情"""
@@ -129,11 +219,17 @@ async def create_inventory(inventory: InventoryCreate):
     
     now = datetime.now()
     inventory_dict = inventory.model_dump()
+    inventory_dict["received_at"] = inventory.received_at or now
+    expires_at = compute_expires_at(inventory_dict["received_at"], product.get("shelf_life"))
+    if expires_at:
+        inventory_dict["expires_at"] = expires_at
     inventory_dict["created_at"] = now
     inventory_dict["updated_at"] = now
     
     result = await db.inventory.insert_one(inventory_dict)
+    await bump_stock_version(db)
     created = await db.inventory.find_one({"_id": result.inserted_id})
+    event_bus.publish("inventory", inventory_event(created))
     return inventory_helper(created, product)
 
 
@@ -151,10 +247,16 @@ async def update_inventory(inventory_id: str, inventory: InventoryUpdate):
     update_data = {k: v for k, v in inventory.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now()
     
-    result = await db.inventory.update_one(
-        {"_id": ObjectId(inventory_id)},
-        {"$set": update_data}
-    )
+    query = {"_id": ObjectId(inventory_id)}
+    if "quantity" in update_data:
+        # Counted rows keep their quantity until the stocktake is posted
+        query["stocktake_id"] = {"$exists": False}
+    result = await db.inventory.update_one(query, {"$set": update_data})
+    
+    if result.matched_count == 0 and "quantity" in update_data:
+        existing = await db.inventory.find_one({"_id": ObjectId(inventory_id)}, {"stocktake_id": 1})
+        if existing:
+            ensure_not_frozen(existing)
     
     if result.matched_count == 0:
         raise HTTPException(
@@ -162,7 +264,9 @@ async def update_inventory(inventory_id: str, inventory: InventoryUpdate):
             detail="库存记录不存在"
         )
     
+    await bump_stock_version(db)
     updated = await db.inventory.find_one({"_id": ObjectId(inventory_id)})
+    event_bus.publish("inventory", inventory_event(updated))
     product = None
     if updated.get("product_id"):
         try:
@@ -190,29 +294,44 @@ async def inventory_in(record: InventoryRecordCreate):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="库存记录不存在"
         )
+    ensure_not_frozen(inventory)
+    
+    product = None
+    if record.product_id:
+        try:
+            product = await db.products.find_one({"_id": ObjectId(record.product_id)})
+        except Exception:
+            pass
     
     # Update inventory quantity
-    new_quantity = inventory.get("quantity", 0) + record.quantity
-    await db.inventory.update_one(
-        {"_id": ObjectId(record.inventory_id)},
-        {"$set": {"quantity": new_quantity, "updated_at": datetime.now()}}
+    now = datetime.now()
+    current_quantity = inventory.get("quantity", 0)
+    update_fields = {"quantity": current_quantity + record.quantity, "updated_at": now}
+    
+    # A restocked empty row starts a fresh batch; stock on hand keeps its age and expiry
+    if current_quantity <= 0:
+        update_fields["received_at"] = now
+        expires_at = compute_expires_at(now, product.get("shelf_life") if product else None)
+        if expires_at:
+            update_fields["expires_at"] = expires_at
+    
+    result = await db.inventory.update_one(
+        {"_id": ObjectId(record.inventory_id), **NOT_FROZEN},
+        {"$set": update_fields}
     )
+    if result.matched_count == 0:
+        # A stocktake claimed the row after it was read
+        raise frozen_conflict()
     
     # Create inventory record
-    now = datetime.now()
     record_dict = record.model_dump()
     record_dict["operation_type"] = InventoryOperationType.IN.value
     record_dict["created_at"] = now
     
     result = await db.inventory_records.insert_one(record_dict)
+    await bump_stock_version(db)
     created = await db.inventory_records.find_one({"_id": result.inserted_id})
-    
-    product = None
-    if record.product_id:
-        try:
-            product = await db.products.find_one({"_id": ObjectId(record.product_id)})
-        except Exception:
-            pass
+    event_bus.publish("inventory", inventory_event({**inventory, **update_fields}))
     
     return record_helper(created, product)
 
@@ -235,6 +354,7 @@ async def inventory_out(record: InventoryRecordCreate):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="库存记录不存在"
         )
+    ensure_not_frozen(inventory)
     
     # Check if there's enough quantity
     current_quantity = inventory.get("quantity", 0)
@@ -245,11 +365,13 @@ async def inventory_out(record: InventoryRecordCreate):
         )
     
     # Update inventory quantity
-    new_quantity = current_quantity - record.quantity
-    await db.inventory.update_one(
-        {"_id": ObjectId(record.inventory_id)},
-        {"$set": {"quantity": new_quantity, "updated_at": datetime.now()}}
+    update_fields = {"quantity": current_quantity - record.quantity, "updated_at": datetime.now()}
+    result = await db.inventory.update_one(
+        {"_id": ObjectId(record.inventory_id), **NOT_FROZEN},
+        {"$set": update_fields}
     )
+    if result.matched_count == 0:
+        raise frozen_conflict()
     
     # Create inventory record
     now = datetime.now()
@@ -258,7 +380,9 @@ async def inventory_out(record: InventoryRecordCreate):
     record_dict["created_at"] = now
     
     result = await db.inventory_records.insert_one(record_dict)
+    await bump_stock_version(db)
     created = await db.inventory_records.find_one({"_id": result.inserted_id})
+    event_bus.publish("inventory", inventory_event({**inventory, **update_fields}))
     
     product = None
     if record.product_id:
@@ -270,30 +394,76 @@ async def inventory_out(record: InventoryRecordCreate):
     return record_helper(created, product)
 
 
+@router.post("/transfers", response_model=InventoryTransferResponse, status_code=status.HTTP_201_CREATED)
+async def create_transfer(transfer: InventoryTransferCreate):
+    """仓库间调拨
+
+    从调出库存行扣减并增加到调入仓库中相同产品、批次的库存行（不存在时自动创建），
+    每条明细生成一对共享调拨单号的调拨出库/调拨入库流水；MongoDB 为副本集时在同一事务中完成。
+    """
+    db = get_database()
+    result = await transfer_stock(db, transfer)
+    await bump_stock_version(db)
+    changed_ids = {ObjectId(line[key]) for line in result["items"] for key in ("from_inventory_id", "to_inventory_id")}
+    async for row in db.inventory.find({"_id": {"$in": list(changed_ids)}}):
+        event_bus.publish("inventory", inventory_event(row))
+    return result
+
+
 @router.get("/records/", response_model=List[InventoryRecordResponse])
 async def get_inventory_records(
     product_id: Optional[str] = None,
     operation_type: Optional[InventoryOperationType] = None,
+    transfer_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    fields: Optional[str] = None,
     skip: int = 0,
     limit: int = 100
 ):
-    """获取库存流水记录"""
-    db = get_database()
+    """获取库存流水记录
+
+    指定 start_date 且早于归档期限时，自动从归档文件读取历史记录。
+    fields 指定返回字段（逗号分隔）。
+    """
+    db = get_read_database()
+    session = read_session()
+    selected = parse_fields(fields, InventoryRecordResponse)
+    needs_product = selected is None or "product_name" in selected
     query = {}
     
     if product_id:
         query["product_id"] = product_id
     if operation_type:
         query["operation_type"] = operation_type.value
+    if transfer_id:
+        query["transfer_id"] = transfer_id
+    
+    live_query = dict(query)
+    if start_date or end_date:
+        live_query["created_at"] = {}
+        if start_date:
+            live_query["created_at"]["$gte"] = start_date
+        if end_date:
+            live_query["created_at"]["$lt"] = end_date
+    
+    rows = await db.inventory_records.find(
+        live_query, projection(selected, RECORD_PRODUCT_FIELDS), session=session
+    ).sort("created_at", -1).skip(skip).limit(limit).to_list(length=None)
+    
+    # Archived records are all older than live ones, so they follow in order
+    if start_date and start_date < archive_cutoff() and len(rows) < limit:
+        live_total = await db.inventory_records.count_documents(live_query, session=session)
+        rows += await read_archived_records(
+            db, query, start_date, end_date,
+            skip=max(0, skip - live_total),
+            limit=limit - len(rows)
+        )
     
-    records = []
-    cursor = db.inventory_records.find(query).sort("created_at", -1).skip(skip).limit(limit)
-    async for record in cursor:
-        product = None
-        if record.get("product_id"):
-            try:
-                product = await db.products.find_one({"_id": ObjectId(record["product_id"])})
-            except Exception:
-                pass
-        records.append(record_helper(record, product))
+    products = {}
+    if needs_product:
+        products = await products_by_id(db, [row.get("product_id") for row in rows], {"name": 1}, session)
+    records = [record_helper(record, products.get(record.get("product_id"))) for record in rows]
+    if selected:
+        return sparse_response(InventoryRecordResponse, selected, records)
     return records
@@ -0,0 +1,29 @@
+"""Background job API routes."""
+from fastapi import APIRouter, HTTPException, status
+
+from ..models.job import SchedulerStatus
+from ..services.jobs import scheduler
+
+router = APIRouter(prefix="/jobs", tags=["后台任务"])
+
+
+@router.get("/", response_model=SchedulerStatus)
+async def get_jobs():
+    """获取后台任务状态与运行指标"""
+    return {
+        "worker_id": scheduler.worker_id,
+        "is_leader": scheduler.is_leader,
+        "jobs": scheduler.status(),
+    }
+
+
+@router.post("/{name}/run", status_code=status.HTTP_202_ACCEPTED)
+async def run_job(name: str):
+    """立即运行后台任务"""
+    if name not in scheduler.jobs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    scheduler.trigger(name)
+    return {"status": "scheduled"}
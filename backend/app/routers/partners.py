@@ -1,10 +1,19 @@
 """Partner (Supplier/Customer) management API routes."""
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Response, status
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+import re
 
-from ..database import get_database
+from ..database import get_database, get_read_database, read_session
+from ..services.integrity import find_references
+from ..services.propagation import PARTNER, name_propagator
+from ..utils.batch import fetch_by_ids
+from ..utils.concurrency import expected_version, version_conflict, version_filter
+from ..utils.fields import parse_fields, projection, sparse_response
+from ..utils.pagination import total_count_headers
+from ..models.batch import BatchItem, BatchRequest
 from ..models.partner import (
     PartnerCreate,
     PartnerUpdate,
@@ -32,19 +41,28 @@ def partner_helper(partner) -> dict:
         "is_active": partner.get("is_active", True),
         "created_at": partner.get("created_at"),
         "updated_at": partner.get("updated_at"),
+        "version": partner.get("version", 0),
     }
 
 
 @router.get("/", response_model=List[PartnerResponse])
 async def get_partners(
+    response: Response,
     partner_type: Optional[PartnerType] = None,
     is_active: Optional[bool] = None,
     search: Optional[str] = None,
+    fields: Optional[str] = None,
+    with_total: bool = False,
     skip: int = 0,
     limit: int = 100
 ):
-    """获取合作伙伴列表"""
-    db = get_database()
+    """获取合作伙伴列表
+
+    fields 指定返回字段（逗号分隔）；with_total=true 时在响应头 X-Total-Count 中返回总数。
+    """
+    db = get_read_database()
+    session = read_session()
+    selected = parse_fields(fields, PartnerResponse)
     query = {}
     
     if partner_type:
@@ -52,26 +70,39 @@ async def get_partners(
     if is_active is not None:
         query["is_active"] = is_active
     if search:
+        pattern = re.escape(search)
         query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"partner_code": {"$regex": search, "$options": "i"}},
+            {"name": {"$regex": pattern, "$options": "i"}},
+            {"partner_code": {"$regex": pattern, "$options": "i"}},
         ]
     
+    headers = await total_count_headers(db.partners, query, with_total, session)
     partners = []
-    cursor = db.partners.find(query).skip(skip).limit(limit)
+    cursor = db.partners.find(query, projection(selected), session=session).sort("_id", 1).skip(skip).limit(limit)
     async for partner in cursor:
         partners.append(partner_helper(partner))
+    if selected:
+        return sparse_response(PartnerResponse, selected, partners, headers)
+    response.headers.update(headers)
     return partners
 
 
 @router.get("/suppliers", response_model=List[PartnerResponse])
 async def get_suppliers(
+    response: Response,
     is_active: Optional[bool] = True,
+    fields: Optional[str] = None,
+    with_total: bool = False,
     skip: int = 0,
     limit: int = 100
 ):
-    """获取供应商列表"""
-    db = get_database()
+    """获取供应商列表
+
+    fields 指定返回字段（逗号分隔）；with_total=true 时在响应头 X-Total-Count 中返回总数。
+    """
+    db = get_read_database()
+    session = read_session()
+    selected = parse_fields(fields, PartnerResponse)
     query = {
         "$or": [
             {"partner_type": PartnerType.SUPPLIER.value},
@@ -82,21 +113,33 @@ async def get_suppliers(
     if is_active is not None:
         query["is_active"] = is_active
     
+    headers = await total_count_headers(db.partners, query, with_total, session)
     suppliers = []
-    cursor = db.partners.find(query).skip(skip).limit(limit)
+    cursor = db.partners.find(query, projection(selected), session=session).sort("_id", 1).skip(skip).limit(limit)
     async for supplier in cursor:
         suppliers.append(partner_helper(supplier))
+    if selected:
+        return sparse_response(PartnerResponse, selected, suppliers, headers)
+    response.headers.update(headers)
     return suppliers
 
 
 @router.get("/customers", response_model=List[PartnerResponse])
 async def get_customers(
+    response: Response,
     is_active: Optional[bool] = True,
+    fields: Optional[str] = None,
+    with_total: bool = False,
     skip: int = 0,
     limit: int = 100
 ):
-    """获取客户列表"""
-    db = get_database()
+    """获取客户列表
+
+    fields 指定返回字段（逗号分隔）；with_total=true 时在响应头 X-Total-Count 中返回总数。
+    """
+    db = get_read_database()
+    session = read_session()
+    selected = parse_fields(fields, PartnerResponse)
     query = {
         "$or": [
             {"partner_type": PartnerType.CUSTOMER.value},
@@ -107,13 +150,27 @@ async def get_customers(
     if is_active is not None:
         query["is_active"] = is_active
     
+    headers = await total_count_headers(db.partners, query, with_total, session)
     customers = []
-    cursor = db.partners.find(query).skip(skip).limit(limit)
+    cursor = db.partners.find(query, projection(selected), session=session).sort("_id", 1).skip(skip).limit(limit)
     async for customer in cursor:
         customers.append(partner_helper(customer))
+    if selected:
+        return sparse_response(PartnerResponse, selected, customers, headers)
+    response.headers.update(headers)
     return customers
 
 
+@router.post("/batch", response_model=List[BatchItem[PartnerResponse]])
+async def batch_get_partners(request: BatchRequest):
+    """批量获取合作伙伴详情
+
+    按请求顺序返回结果，ID 无效或不存在时该项 found 为 false 并给出原因。
+    """
+    db = get_database()
+    return await fetch_by_ids(db.partners, request.ids, partner_helper, "无效的合作伙伴ID", "合作伙伴不存在")
+
+
 @router.get("/{partner_id}", response_model=PartnerResponse)
 async def get_partner(partner_id: str):
     """获取合作伙伴详情"""
@@ -152,6 +209,7 @@ async def create_partner(partner: PartnerCreate):
     partner_dict["partner_type"] = partner.partner_type.value
     partner_dict["created_at"] = now
     partner_dict["updated_at"] = now
+    partner_dict["version"] = 1
     
     result = await db.partners.insert_one(partner_dict)
     created = await db.partners.find_one({"_id": result.inserted_id})
@@ -159,7 +217,11 @@ async def create_partner(partner: PartnerCreate):
 
 
 @router.put("/{partner_id}", response_model=PartnerResponse)
-async def update_partner(partner_id: str, partner: PartnerUpdate):
+async def update_partner(
+    partner_id: str,
+    partner: PartnerUpdate,
+    if_match: Optional[str] = Header(None)
+):
     """更新合作伙伴信息"""
     db = get_database()
     
@@ -170,22 +232,30 @@ async def update_partner(partner_id: str, partner: PartnerUpdate):
         )
     
     update_data = {k: v for k, v in partner.model_dump().items() if v is not None}
+    expected = expected_version(if_match, update_data.pop("version", None))
     if "partner_type" in update_data:
         update_data["partner_type"] = update_data["partner_type"].value
     update_data["updated_at"] = datetime.now()
     
-    result = await db.partners.update_one(
-        {"_id": ObjectId(partner_id)},
-        {"$set": update_data}
+    # Version check and write in one round trip
+    updated = await db.partners.find_one_and_update(
+        {"_id": ObjectId(partner_id), **version_filter(expected)},
+        {"$set": update_data, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if not updated:
+        if expected is not None and await db.partners.count_documents({"_id": ObjectId(partner_id)}, limit=1):
+            raise version_conflict()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="合作伙伴不存在"
         )
     
-    updated = await db.partners.find_one({"_id": ObjectId(partner_id)})
+    if "name" in update_data:
+        # Orders keep a copy of the customer/supplier name; rewritten in the background
+        await name_propagator.request(db, PARTNER, partner_id, updated["name"])
+    
     return partner_helper(updated)
 
 
@@ -200,6 +270,13 @@ async def delete_partner(partner_id: str):
             detail="无效的合作伙伴ID"
         )
     
+    references = await find_references(db, "partners", partner_id)
+    if references:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"合作伙伴仍被{'、'.join(references)}引用，无法删除"
+        )
+    
     result = await db.partners.delete_one({"_id": ObjectId(partner_id)})
     if result.deleted_count == 0:
         raise HTTPException(
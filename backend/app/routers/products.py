@@ -1,10 +1,21 @@
 """Product management API routes."""
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Response, status
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+import re
 
-from ..database import get_database
+from ..database import get_database, get_read_database, read_session
+from ..services.expiry import refresh_product_expiry
+from ..services.stock_version import bump_stock_version
+from ..services.integrity import find_references
+from ..services.propagation import PRODUCT, name_propagator
+from ..utils.batch import fetch_by_ids
+from ..utils.concurrency import expected_version, version_conflict, version_filter
+from ..utils.fields import parse_fields, projection, sparse_response
+from ..utils.pagination import total_count_headers
+from ..models.batch import BatchItem, BatchRequest
 from ..models.product import (
     ProductCreate,
     ProductUpdate,
@@ -30,19 +41,29 @@ def product_helper(product) -> dict:
         "category": product.get("category"),
         "created_at": product.get("created_at"),
         "updated_at": product.get("updated_at"),
+        "version": product.get("version", 0),
     }
 
 
 @router.get("/", response_model=List[ProductResponse])
 async def get_products(
+    response: Response,
     product_type: Optional[ProductType] = None,
     category: Optional[str] = None,
     search: Optional[str] = None,
+    fields: Optional[str] = None,
+    with_total: bool = False,
     skip: int = 0,
     limit: int = 100
 ):
-    """获取产品列表"""
-    db = get_database()
+    """获取产品列表
+
+    fields 指定返回字段（逗号分隔），例如 fields=product_code,name,unit；
+    with_total=true 时在响应头 X-Total-Count 中返回符合条件的总数。
+    """
+    db = get_read_database()
+    session = read_session()
+    selected = parse_fields(fields, ProductResponse)
     query = {}
     
     if product_type:
@@ -50,18 +71,33 @@ async def get_products(
     if category:
         query["category"] = category
     if search:
+        pattern = re.escape(search)
         query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"product_code": {"$regex": search, "$options": "i"}},
+            {"name": {"$regex": pattern, "$options": "i"}},
+            {"product_code": {"$regex": pattern, "$options": "i"}},
         ]
     
+    headers = await total_count_headers(db.products, query, with_total, session)
     products = []
-    cursor = db.products.find(query).skip(skip).limit(limit)
+    cursor = db.products.find(query, projection(selected), session=session).sort("_id", 1).skip(skip).limit(limit)
     async for product in cursor:
         products.append(product_helper(product))
+    if selected:
+        return sparse_response(ProductResponse, selected, products, headers)
+    response.headers.update(headers)
     return products
 
 
+@router.post("/batch", response_model=List[BatchItem[ProductResponse]])
+async def batch_get_products(request: BatchRequest):
+    """批量获取产品详情
+
+    按请求顺序返回结果，ID 无效或不存在时该项 found 为 false 并给出原因。
+    """
+    db = get_database()
+    return await fetch_by_ids(db.products, request.ids, product_helper, "无效的产品ID", "产品不存在")
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(product_id: str):
     """获取单个产品详情"""
@@ -100,6 +136,7 @@ async def create_product(product: ProductCreate):
     product_dict["product_type"] = product.product_type.value
     product_dict["created_at"] = now
     product_dict["updated_at"] = now
+    product_dict["version"] = 1
     
     result = await db.products.insert_one(product_dict)
     created = await db.products.find_one({"_id": result.inserted_id})
@@ -107,7 +144,11 @@ async def create_product(product: ProductCreate):
 
 
 @router.put("/{product_id}", response_model=ProductResponse)
-async def update_product(product_id: str, product: ProductUpdate):
+async def update_product(
+    product_id: str,
+    product: ProductUpdate,
+    if_match: Optional[str] = Header(None)
+):
     """更新产品信息"""
     db = get_database()
     
@@ -118,22 +159,35 @@ async def update_product(product_id: str, product: ProductUpdate):
         )
     
     update_data = {k: v for k, v in product.model_dump().items() if v is not None}
+    expected = expected_version(if_match, update_data.pop("version", None))
     if "product_type" in update_data:
         update_data["product_type"] = update_data["product_type"].value
     update_data["updated_at"] = datetime.now()
     
-    result = await db.products.update_one(
-        {"_id": ObjectId(product_id)},
-        {"$set": update_data}
+    # Version check and write in one round trip
+    updated = await db.products.find_one_and_update(
+        {"_id": ObjectId(product_id), **version_filter(expected)},
+        {"$set": update_data, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if not updated:
+        if expected is not None and await db.products.count_documents({"_id": ObjectId(product_id)}, limit=1):
+            raise version_conflict()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="产品不存在"
         )
     
-    updated = await db.products.find_one({"_id": ObjectId(product_id)})
+    if "shelf_life" in update_data:
+        await refresh_product_expiry(db, product_id, update_data["shelf_life"])
+    if update_data.keys() & {"name", "product_type", "category"}:
+        # Valuations group and label stock by product metadata
+        await bump_stock_version(db)
+    if "name" in update_data:
+        # Order lines keep a copy of the name; rewritten in the background
+        await name_propagator.request(db, PRODUCT, product_id, updated["name"])
+    
     return product_helper(updated)
 
 
@@ -148,6 +202,13 @@ async def delete_product(product_id: str):
             detail="无效的产品ID"
         )
     
+    references = await find_references(db, "products", product_id)
+    if references:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"产品仍被{'、'.join(references)}引用，无法删除"
+        )
+    
     result = await db.products.delete_one({"_id": ObjectId(product_id)})
     if result.deleted_count == 0:
         raise HTTPException(
@@ -1,13 +1,34 @@
 """Purchase order management API routes."""
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Response, status
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+import re
 import uuid
 
-from ..database import get_database
+from ..database import get_database, get_read_database, read_session
+from ..models.batch import BatchItem, BatchRequest
+from ..models.report import RollupKind
+from ..services.events import event_bus, order_event
+from ..services.order_history import (
+    history_query,
+    partner_history_cursor,
+    product_history_cursor,
+    product_totals
+)
+from ..services.order_lines import add_line, assign_line_ids, get_lines, remove_line, update_line
+from ..services.rollups import apply_order_change
+from ..utils.batch import fetch_by_ids
+from ..utils.concurrency import expected_version, version_conflict, version_filter
+from ..utils.fields import parse_fields, projection, sparse_response
+from ..utils.pagination import total_count_headers
 from ..models.purchase import (
     PurchaseOrderCreate,
+    PurchaseOrderHistoryEntry,
+    PurchaseOrderItem,
+    PurchaseOrderLinePage,
+    PurchaseOrderLineUpdate,
     PurchaseOrderUpdate,
     PurchaseOrderResponse,
     PurchaseOrderStatus
@@ -15,6 +36,9 @@ from ..models.purchase import (
 
 router = APIRouter(prefix="/purchases", tags=["采购管理"])
 
+# Columns shown in order tables; the items array is left out
+SUMMARY_FIELDS = "order_number,supplier_name,total_amount,status,order_date,expected_date"
+
 
 def generate_order_number():
     """Generate unique order number."""
@@ -37,29 +61,139 @@ def order_helper(order) -> dict:
         "created_at": order.get("created_at"),
         "updated_at": order.get("updated_at"),
         "created_by": order.get("created_by"),
+        "version": order.get("version", 0),
+    }
+
+
+def history_helper(order, totals: Optional[dict] = None) -> dict:
+    """Convert an order-history row to response format."""
+    return {
+        "id": str(order["_id"]),
+        "order_number": order.get("order_number"),
+        "supplier_id": order.get("supplier_id"),
+        "supplier_name": order.get("supplier_name"),
+        "order_date": order.get("order_date"),
+        "status": order.get("status"),
+        "total_amount": order.get("total_amount") or 0.0,
+        **(totals or {}),
     }
 
 
+def _order_object_id(order_id: str) -> ObjectId:
+    if not ObjectId.is_valid(order_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的订单ID"
+        )
+    return ObjectId(order_id)
+
+
 @router.get("/", response_model=List[PurchaseOrderResponse])
 async def get_purchase_orders(
+    response: Response,
     status: Optional[PurchaseOrderStatus] = None,
     supplier_id: Optional[str] = None,
+    search: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False,
+    with_total: bool = False,
     skip: int = 0,
     limit: int = 100
 ):
-    """获取采购订单列表"""
-    db = get_database()
+    """获取采购订单列表
+
+    search 按订单编号或供应商名称搜索；
+    fields 指定返回字段（逗号分隔）；summary=true 只返回列表摘要字段，不含订单明细；
+    with_total=true 时在响应头 X-Total-Count 中返回总数。
+    """
+    db = get_read_database()
+    session = read_session()
+    selected = parse_fields(fields or (SUMMARY_FIELDS if summary else None), PurchaseOrderResponse)
     query = {}
     
     if status:
         query["status"] = status.value
     if supplier_id:
         query["supplier_id"] = supplier_id
+    if search:
+        pattern = re.escape(search)
+        query["$or"] = [
+            {"order_number": {"$regex": pattern, "$options": "i"}},
+            {"supplier_name": {"$regex": pattern, "$options": "i"}},
+        ]
     
+    headers = await total_count_headers(db.purchase_orders, query, with_total, session)
     orders = []
-    cursor = db.purchase_orders.find(query).sort("created_at", -1).skip(skip).limit(limit)
+    cursor = db.purchase_orders.find(query, projection(selected), session=session).sort([("created_at", -1), ("_id", -1)]).skip(skip).limit(limit)
     async for order in cursor:
         orders.append(order_helper(order))
+    if selected:
+        return sparse_response(PurchaseOrderResponse, selected, orders, headers)
+    response.headers.update(headers)
+    return orders
+
+
+@router.post("/batch", response_model=List[BatchItem[PurchaseOrderResponse]])
+async def batch_get_purchase_orders(request: BatchRequest):
+    """批量获取采购订单详情
+
+    按请求顺序返回结果，ID 无效或不存在时该项 found 为 false 并给出原因。
+    """
+    db = get_database()
+    return await fetch_by_ids(db.purchase_orders, request.ids, order_helper, "无效的订单ID", "采购订单不存在")
+
+
+@router.get("/history/product/{product_id}", response_model=List[PurchaseOrderHistoryEntry])
+async def get_product_purchases_history(
+    product_id: str,
+    response: Response,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    status: Optional[PurchaseOrderStatus] = None,
+    with_total: bool = False,
+    skip: int = 0,
+    limit: int = 100
+):
+    """按产品查询采购订单历史（按下单日期倒序）
+
+    start/end 为下单日期范围（含 end 当天）；quantity/amount 为该产品在订单中的数量和金额。
+    """
+    db = get_read_database()
+    session = read_session()
+    query = history_query("items.product_id", product_id, start, end, status.value if status else None)
+
+    headers = await total_count_headers(db.purchase_orders, query, with_total, session)
+    orders = []
+    async for order in product_history_cursor(db, RollupKind.PURCHASES, product_id, query, skip, limit, session):
+        orders.append(history_helper(order, product_totals(order)))
+    response.headers.update(headers)
+    return orders
+
+
+@router.get("/history/supplier/{supplier_id}", response_model=List[PurchaseOrderHistoryEntry])
+async def get_supplier_purchases_history(
+    supplier_id: str,
+    response: Response,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    status: Optional[PurchaseOrderStatus] = None,
+    with_total: bool = False,
+    skip: int = 0,
+    limit: int = 100
+):
+    """按供应商查询采购订单历史（按下单日期倒序）
+
+    start/end 为下单日期范围（含 end 当天）。
+    """
+    db = get_read_database()
+    session = read_session()
+    query = history_query("supplier_id", supplier_id, start, end, status.value if status else None)
+
+    headers = await total_count_headers(db.purchase_orders, query, with_total, session)
+    orders = []
+    async for order in partner_history_cursor(db, RollupKind.PURCHASES, query, skip, limit, session):
+        orders.append(history_helper(order))
+    response.headers.update(headers)
     return orders
 
 
@@ -114,6 +248,7 @@ async def create_purchase_order(order: PurchaseOrderCreate):
             if product:
                 item_dict["product_name"] = product.get("name")
         items_list.append(item_dict)
+    assign_line_ids(items_list)
     
     now = datetime.now()
     order_dict = {
@@ -128,15 +263,22 @@ async def create_purchase_order(order: PurchaseOrderCreate):
         "remark": order.remark,
         "created_at": now,
         "updated_at": now,
+        "version": 1,
     }
     
     result = await db.purchase_orders.insert_one(order_dict)
     created = await db.purchase_orders.find_one({"_id": result.inserted_id})
+    await apply_order_change(db, RollupKind.PURCHASES, None, created)
+    event_bus.publish("purchases", order_event(created))
     return order_helper(created)
 
 
 @router.put("/{order_id}", response_model=PurchaseOrderResponse)
-async def update_purchase_order(order_id: str, order: PurchaseOrderUpdate):
+async def update_purchase_order(
+    order_id: str,
+    order: PurchaseOrderUpdate,
+    if_match: Optional[str] = Header(None)
+):
     """更新采购订单"""
     db = get_database()
     
@@ -146,14 +288,8 @@ async def update_purchase_order(order_id: str, order: PurchaseOrderUpdate):
             detail="无效的订单ID"
         )
     
-    existing = await db.purchase_orders.find_one({"_id": ObjectId(order_id)})
-    if not existing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="采购订单不存在"
-        )
-    
     update_data = {k: v for k, v in order.model_dump().items() if v is not None}
+    expected = expected_version(if_match, update_data.pop("version", None))
     
     if "supplier_id" in update_data:
         supplier = await db.partners.find_one({"_id": ObjectId(update_data["supplier_id"])})
@@ -161,6 +297,7 @@ async def update_purchase_order(order_id: str, order: PurchaseOrderUpdate):
             update_data["supplier_name"] = supplier.get("name")
     
     if "items" in update_data:
+        assign_line_ids(update_data["items"])
         total_amount = sum(item["quantity"] * item["unit_price"] for item in update_data["items"])
         update_data["total_amount"] = total_amount
     
@@ -169,12 +306,24 @@ async def update_purchase_order(order_id: str, order: PurchaseOrderUpdate):
     
     update_data["updated_at"] = datetime.now()
     
-    await db.purchase_orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {"$set": update_data}
+    # The rollups diff against the document this write replaced, so take the
+    # before-image from the write itself rather than from an earlier read
+    existing = await db.purchase_orders.find_one_and_update(
+        {"_id": ObjectId(order_id), **version_filter(expected)},
+        {"$set": update_data, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE
     )
+    if not existing:
+        if expected is not None and await db.purchase_orders.count_documents({"_id": ObjectId(order_id)}, limit=1):
+            raise version_conflict()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="采购订单不存在"
+        )
+    updated = {**existing, **update_data, "version": existing.get("version", 0) + 1}
     
-    updated = await db.purchase_orders.find_one({"_id": ObjectId(order_id)})
+    await apply_order_change(db, RollupKind.PURCHASES, existing, updated)
+    event_bus.publish("purchases", order_event(updated))
     return order_helper(updated)
 
 
@@ -189,16 +338,21 @@ async def delete_purchase_order(order_id: str):
             detail="无效的订单ID"
         )
     
-    result = await db.purchase_orders.delete_one({"_id": ObjectId(order_id)})
-    if result.deleted_count == 0:
+    deleted = await db.purchase_orders.find_one_and_delete({"_id": ObjectId(order_id)})
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="采购订单不存在"
         )
+    await apply_order_change(db, RollupKind.PURCHASES, deleted, None)
+    event_bus.publish("purchases", order_event(deleted, deleted=True))
 
 
 @router.post("/{order_id}/approve", response_model=PurchaseOrderResponse)
-async def approve_purchase_order(order_id: str):
+async def approve_purchase_order(
+    order_id: str,
+    if_match: Optional[str] = Header(None)
+):
     """审核采购订单"""
     db = get_database()
     
@@ -221,10 +375,96 @@ async def approve_purchase_order(order_id: str):
             detail="只有待审核状态的订单可以审核"
         )
     
-    await db.purchase_orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {"$set": {"status": PurchaseOrderStatus.APPROVED.value, "updated_at": datetime.now()}}
+    # Status guard in the filter so two concurrent approvals cannot both apply
+    changes = {"status": PurchaseOrderStatus.APPROVED.value, "updated_at": datetime.now()}
+    before = await db.purchase_orders.find_one_and_update(
+        {
+            "_id": ObjectId(order_id),
+            "status": PurchaseOrderStatus.PENDING.value,
+            **version_filter(expected_version(if_match, None)),
+        },
+        {"$set": changes, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE
     )
-    
-    updated = await db.purchase_orders.find_one({"_id": ObjectId(order_id)})
+    if not before:
+        raise version_conflict()
+    updated = {**before, **changes, "version": before.get("version", 0) + 1}
+    await apply_order_change(db, RollupKind.PURCHASES, before, updated)
+    event_bus.publish("purchases", order_event(updated))
     return order_helper(updated)
+
+
+@router.get("/{order_id}/lines", response_model=PurchaseOrderLinePage)
+async def get_purchase_order_lines(order_id: str, skip: int = 0, limit: int = 100):
+    """分页获取采购订单明细"""
+    db = get_database()
+    page = await get_lines(db, RollupKind.PURCHASES, _order_object_id(order_id), skip, limit)
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="采购订单不存在"
+        )
+    return page
+
+
+@router.post("/{order_id}/lines", response_model=PurchaseOrderItem, status_code=status.HTTP_201_CREATED)
+async def add_purchase_order_line(
+    order_id: str,
+    line: PurchaseOrderItem,
+    if_match: Optional[str] = Header(None)
+):
+    """添加采购订单明细"""
+    db = get_database()
+    result = await add_line(
+        db, RollupKind.PURCHASES, _order_object_id(order_id),
+        line.model_dump(exclude={"line_id"}), expected_version(if_match)
+    )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="采购订单不存在"
+        )
+    order, created = result
+    event_bus.publish("purchases", order_event(order))
+    return created
+
+
+@router.put("/{order_id}/lines/{line_id}", response_model=PurchaseOrderItem)
+async def update_purchase_order_line(
+    order_id: str,
+    line_id: str,
+    line: PurchaseOrderLineUpdate,
+    if_match: Optional[str] = Header(None)
+):
+    """更新采购订单明细"""
+    db = get_database()
+    changes = {k: v for k, v in line.model_dump().items() if v is not None}
+    expected = expected_version(if_match, changes.pop("version", None))
+    result = await update_line(db, RollupKind.PURCHASES, _order_object_id(order_id), line_id, changes, expected)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="订单明细不存在"
+        )
+    order, updated = result
+    event_bus.publish("purchases", order_event(order))
+    return updated
+
+
+@router.delete("/{order_id}/lines/{line_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_purchase_order_line(
+    order_id: str,
+    line_id: str,
+    if_match: Optional[str] = Header(None)
+):
+    """删除采购订单明细"""
+    db = get_database()
+    order = await remove_line(
+        db, RollupKind.PURCHASES, _order_object_id(order_id), line_id, expected_version(if_match)
+    )
+    if order is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="订单明细不存在"
+        )
+    event_bus.publish("purchases", order_event(order))
@@ -0,0 +1,48 @@
+"""Replenishment suggestion API routes."""
+from fastapi import APIRouter, BackgroundTasks, status
+from typing import List
+
+from ..database import get_database, get_read_database, read_session
+from ..models.replenishment import ReplenishmentSuggestion, ReplenishmentRunResult
+from ..services.replenishment import run_replenishment
+
+router = APIRouter(prefix="/replenishment", tags=["补货建议"])
+
+
+def suggestion_helper(suggestion) -> dict:
+    """Convert MongoDB document to response format."""
+    return {
+        "product_id": suggestion.get("product_id"),
+        "product_name": suggestion.get("product_name"),
+        "product_code": suggestion.get("product_code"),
+        "on_hand": suggestion.get("on_hand", 0),
+        "on_order": suggestion.get("on_order", 0),
+        "daily_rate": suggestion.get("daily_rate", 0.0),
+        "demand_std": suggestion.get("demand_std", 0.0),
+        "safety_stock": suggestion.get("safety_stock", 0),
+        "reorder_point": suggestion.get("reorder_point", 0),
+        "suggested_quantity": suggestion.get("suggested_quantity", 0),
+        "days_of_cover": suggestion.get("days_of_cover"),
+        "lead_time_days": suggestion.get("lead_time_days"),
+        "computed_at": suggestion.get("computed_at"),
+    }
+
+
+@router.get("/suggestions", response_model=List[ReplenishmentSuggestion])
+async def get_replenishment_suggestions(skip: int = 0, limit: int = 100):
+    """获取补货建议（按可用天数升序）"""
+    db = get_read_database()
+    session = read_session()
+    suggestions = []
+    cursor = db.replenishment_suggestions.find({}, session=session).sort("cover_rank", 1).skip(skip).limit(limit)
+    async for suggestion in cursor:
+        suggestions.append(suggestion_helper(suggestion))
+    return suggestions
+
+
+@router.post("/run", response_model=ReplenishmentRunResult, status_code=status.HTTP_202_ACCEPTED)
+async def trigger_replenishment(background_tasks: BackgroundTasks):
+    """后台重新计算补货建议"""
+    db = get_database()
+    background_tasks.add_task(run_replenishment, db)
+    return {"status": "scheduled"}
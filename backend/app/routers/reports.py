@@ -0,0 +1,173 @@
+"""Analytics report API routes."""
+from fastapi import APIRouter, HTTPException, status
+from typing import List, Optional
+from datetime import date, datetime
+from bson import ObjectId
+
+from ..database import get_database, get_read_database, read_session
+from ..models.report import (
+    AgingKind,
+    AgingReport,
+    InventoryValuation,
+    PartnerAging,
+    RollupDimension,
+    RollupEntry,
+    RollupKind,
+    RollupRebuildResult,
+    SupplierPerformance
+)
+from ..services.aging import compute_aging_report, compute_partner_aging
+from ..services.rollups import rebuild_rollups, rollup_collection
+from ..services.supplier_performance import STATS, get_supplier_performance, performance_helper
+from ..services.valuation import compute_valuation
+
+router = APIRouter(prefix="/reports", tags=["统计报表"])
+
+
+def rollup_helper(entry) -> dict:
+    """Convert MongoDB document to response format."""
+    return {
+        "key": entry.get("key"),
+        "label": entry.get("label"),
+        "amount": round(entry.get("amount", 0.0), 2),
+        "quantity": entry.get("quantity", 0),
+        "order_count": entry.get("order_count", 0),
+    }
+
+
+@router.get("/valuation", response_model=InventoryValuation)
+async def get_inventory_valuation(
+    warehouse: Optional[str] = None,
+    as_of: Optional[datetime] = None,
+    product_limit: int = 100
+):
+    """获取库存估值（数量 × 成本，加权平均成本）"""
+    db = get_database()
+    return await compute_valuation(db, warehouse, as_of, product_limit)
+
+
+@router.get("/aging/{kind}", response_model=AgingReport)
+async def get_aging_report(
+    kind: AgingKind,
+    as_of: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    """获取应收（receivables）/应付（payables）账龄报表
+
+    已审核未完成的销售/采购订单计为未结金额，按下单日期至 as_of（默认今天）的天数分段；
+    客户/供应商按未结金额降序分页。
+    """
+    # Cached against aging versions read from the primary, so computed there too
+    db = get_database()
+    return await compute_aging_report(db, kind, as_of, skip, limit)
+
+
+@router.get("/aging/{kind}/{partner_id}", response_model=PartnerAging)
+async def get_partner_aging(kind: AgingKind, partner_id: str, as_of: Optional[date] = None):
+    """获取单个客户的应收账龄或单个供应商的应付账龄"""
+    db = get_database()
+
+    if not ObjectId.is_valid(partner_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的合作伙伴ID"
+        )
+
+    partner = await db.partners.find_one({"_id": ObjectId(partner_id)}, {"name": 1})
+    if not partner:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="合作伙伴不存在"
+        )
+    return await compute_partner_aging(db, kind, partner, as_of)
+
+
+@router.get("/suppliers/performance", response_model=List[SupplierPerformance])
+async def get_product_supplier_performance(product_id: str, skip: int = 0, limit: int = 100):
+    """按产品比较各供应商的交货周期、准时率和满足率（按入库次数降序）"""
+    db = get_read_database()
+    session = read_session()
+
+    stats = []
+    cursor = db[STATS].find({"product_id": product_id}, session=session).sort("receipts", -1).skip(skip).limit(limit)
+    async for entry in cursor:
+        stats.append(entry)
+
+    supplier_ids = [ObjectId(entry["supplier_id"]) for entry in stats if ObjectId.is_valid(entry["supplier_id"])]
+    names = {}
+    if supplier_ids:
+        async for partner in db.partners.find({"_id": {"$in": supplier_ids}}, {"name": 1}, session=session):
+            names[str(partner["_id"])] = partner.get("name")
+    return [
+        performance_helper(entry, entry["supplier_id"], names.get(entry["supplier_id"]), product_id)
+        for entry in stats
+    ]
+
+
+@router.get("/suppliers/{supplier_id}/performance", response_model=SupplierPerformance)
+async def get_supplier_performance_report(supplier_id: str, product_id: Optional[str] = None):
+    """获取供应商绩效：交货周期（均值、分位数）、准时率和满足率
+
+    指定 product_id 时返回该供应商该产品的绩效。
+    """
+    db = get_read_database()
+    session = read_session()
+
+    if not ObjectId.is_valid(supplier_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的合作伙伴ID"
+        )
+
+    supplier = await db.partners.find_one({"_id": ObjectId(supplier_id)}, {"name": 1}, session=session)
+    if not supplier:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="合作伙伴不存在"
+        )
+    return await get_supplier_performance(db, supplier, product_id, session)
+
+
+@router.get("/{kind}/{dimension}", response_model=List[RollupEntry])
+async def get_rollup_report(
+    kind: RollupKind,
+    dimension: RollupDimension,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    order_by_amount: bool = False,
+    skip: int = 0,
+    limit: int = 100
+):
+    """获取销售/采购汇总报表
+
+    日期维度的 start/end 使用 YYYY-MM-DD 或 YYYY-MM 格式；
+    产品、合作伙伴维度可按金额排序。
+    """
+    db = get_read_database()
+    session = read_session()
+    query = {"dimension": dimension.value, "order_count": {"$gt": 0}}
+
+    key_range = {}
+    if start:
+        key_range["$gte"] = start
+    if end:
+        key_range["$lte"] = end
+    if key_range:
+        query["key"] = key_range
+
+    sort = ("amount", -1) if order_by_amount else ("key", 1)
+
+    entries = []
+    cursor = rollup_collection(db, kind).find(query, session=session).sort(*sort).skip(skip).limit(limit)
+    async for entry in cursor:
+        entries.append(rollup_helper(entry))
+    return entries
+
+
+@router.post("/{kind}/rebuild", response_model=RollupRebuildResult)
+async def rebuild_rollup_report(kind: RollupKind):
+    """从订单全量重建汇总数据"""
+    db = get_database()
+    entries = await rebuild_rollups(db, kind)
+    return {"kind": kind, "entries": entries}
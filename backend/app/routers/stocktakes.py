@@ -0,0 +1,160 @@
+"""Stocktake (cycle count) API routes."""
+from fastapi import APIRouter, File, HTTPException, UploadFile, status
+from typing import List, Optional
+from bson import ObjectId
+
+from ..database import get_database, get_read_database, read_session
+from ..services.events import event_bus, inventory_event
+from ..services.stock_version import bump_stock_version
+from ..services.stocktake import (
+    cancel_stocktake,
+    compute_variances,
+    get_open_stocktake,
+    load_lines,
+    open_stocktake,
+    parse_counts_csv,
+    post_stocktake,
+    record_counts,
+)
+from ..models.stocktake import (
+    StocktakeCount,
+    StocktakeCountResult,
+    StocktakeCreate,
+    StocktakeResponse,
+    StocktakeStatus,
+    StocktakeVarianceReport
+)
+
+router = APIRouter(prefix="/stocktakes", tags=["库存盘点"])
+
+
+def stocktake_helper(stocktake) -> dict:
+    """Convert MongoDB document to response format."""
+    return {
+        "id": str(stocktake["_id"]),
+        "stocktake_number": stocktake.get("stocktake_number"),
+        "warehouse": stocktake.get("warehouse"),
+        "location": stocktake.get("location"),
+        "product_id": stocktake.get("product_id"),
+        "status": stocktake.get("status"),
+        "line_count": stocktake.get("line_count", 0),
+        "counted_count": stocktake.get("counted_count", 0),
+        "operator": stocktake.get("operator"),
+        "remark": stocktake.get("remark"),
+        "created_at": stocktake.get("created_at"),
+        "posted_at": stocktake.get("posted_at"),
+    }
+
+
+@router.get("/", response_model=List[StocktakeResponse])
+async def get_stocktakes(
+    status: Optional[StocktakeStatus] = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    """获取盘点列表"""
+    db = get_read_database()
+    session = read_session()
+    query = {}
+    if status:
+        query["status"] = status.value
+    stocktakes = []
+    cursor = db.stocktakes.find(query, session=session).sort("created_at", -1).skip(skip).limit(limit)
+    async for stocktake in cursor:
+        stocktakes.append(stocktake_helper(stocktake))
+    return stocktakes
+
+
+@router.post("/", response_model=StocktakeResponse, status_code=status.HTTP_201_CREATED)
+async def create_stocktake(request: StocktakeCreate):
+    """开始盘点
+
+    冻结范围内（仓库、货位前缀、产品）的库存行并记录账面数量，盘点结束前这些库存暂停出入库。
+    """
+    db = get_database()
+    stocktake = await open_stocktake(db, request)
+    return stocktake_helper(stocktake)
+
+
+@router.get("/{stocktake_id}", response_model=StocktakeResponse)
+async def get_stocktake(stocktake_id: str):
+    """获取盘点详情"""
+    db = get_database()
+
+    if not ObjectId.is_valid(stocktake_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的盘点ID"
+        )
+
+    stocktake = await db.stocktakes.find_one({"_id": ObjectId(stocktake_id)})
+    if not stocktake:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="盘点不存在"
+        )
+    return stocktake_helper(stocktake)
+
+
+@router.post("/{stocktake_id}/counts", response_model=StocktakeCountResult)
+async def submit_counts(stocktake_id: str, counts: List[StocktakeCount]):
+    """批量录入盘点数量（JSON）
+
+    同一库存行重复录入时以最后一次为准；不在盘点范围内的库存ID在结果中列出。
+    """
+    db = get_database()
+    stocktake = await get_open_stocktake(db, stocktake_id)
+    return await record_counts(db, stocktake, [count.model_dump() for count in counts])
+
+
+@router.post("/{stocktake_id}/counts/upload", response_model=StocktakeCountResult)
+async def upload_counts(stocktake_id: str, file: UploadFile = File(...)):
+    """上传盘点数量（CSV，包含 inventory_id、counted_quantity 列）"""
+    db = get_database()
+    stocktake = await get_open_stocktake(db, stocktake_id)
+    counts = parse_counts_csv(await file.read())
+    return await record_counts(db, stocktake, counts)
+
+
+@router.get("/{stocktake_id}/variances", response_model=StocktakeVarianceReport)
+async def get_stocktake_variances(stocktake_id: str):
+    """查看盘点差异（实盘数量与冻结的账面数量对比）"""
+    db = get_database()
+
+    if not ObjectId.is_valid(stocktake_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的盘点ID"
+        )
+
+    if not await db.stocktakes.find_one({"_id": ObjectId(stocktake_id)}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="盘点不存在"
+        )
+    return compute_variances(await load_lines(db, stocktake_id))
+
+
+@router.post("/{stocktake_id}/post", response_model=StocktakeVarianceReport)
+async def post_stocktake_variances(stocktake_id: str):
+    """盘点过账
+
+    所有差异以“调整”流水一次性写入并更新库存，未录入盘点数量的库存行保持账面数量，随后解除冻结。
+    """
+    db = get_database()
+    stocktake = await get_open_stocktake(db, stocktake_id)
+    report = await post_stocktake(db, stocktake)
+    if report["variances"]:
+        await bump_stock_version(db)
+        changed_ids = [ObjectId(line["inventory_id"]) for line in report["variances"]]
+        async for row in db.inventory.find({"_id": {"$in": changed_ids}}):
+            event_bus.publish("inventory", inventory_event(row))
+    return report
+
+
+@router.post("/{stocktake_id}/cancel", response_model=StocktakeResponse)
+async def cancel_stocktake_session(stocktake_id: str):
+    """取消盘点，丢弃已录入的数量并解除冻结"""
+    db = get_database()
+    stocktake = await get_open_stocktake(db, stocktake_id)
+    return stocktake_helper(await cancel_stocktake(db, stocktake))
@@ -0,0 +1,58 @@
+"""Production server entrypoint.
+
+    cd backend
+    python -m app.server
+
+Runs uvicorn with ``SERVER_WORKERS`` worker processes sharing one listening
+socket. Every worker runs the application lifespan on its own: it opens its
+own MongoDB client and warms its caches before it accepts requests. On
+SIGTERM or SIGINT a worker reports not ready, closes live event streams and
+lets in-flight requests finish for up to ``SERVER_GRACEFUL_TIMEOUT_SECONDS``.
+"""
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from .config import (
+    SERVER_GRACEFUL_TIMEOUT_SECONDS,
+    SERVER_HOST,
+    SERVER_KEEPALIVE_SECONDS,
+    SERVER_PORT,
+    SERVER_WORKERS,
+)
+from .services.events import event_bus
+from .services.health import health_state
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that starts draining as soon as it is asked to exit."""
+
+    def handle_exit(self, sig, frame):
+        if not self.should_exit:
+            # Fail readiness probes first, then let open SSE streams end so
+            # they do not hold the worker until the graceful timeout
+            health_state.begin_draining()
+            event_bus.close_subscribers()
+        super().handle_exit(sig, frame)
+
+
+def main():
+    config = uvicorn.Config(
+        "app.main:app",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=SERVER_WORKERS,
+        lifespan="on",
+        proxy_headers=True,
+        timeout_keep_alive=SERVER_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT_SECONDS,
+    )
+    server = DrainingServer(config)
+    if config.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
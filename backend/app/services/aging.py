@@ -0,0 +1,267 @@
+"""Receivables and payables aging.
+
+Sales orders that are approved but not yet completed are receivables from
+their customer, and purchase orders in the same state are payables to their
+supplier. There is no payment ledger, so an open order's whole
+``total_amount`` is outstanding. Orders are aged by order date in whole days
+up to the report date and sorted into the ``AGING_BUCKET_DAYS`` buckets.
+
+A report is one aggregation. After the status ``$match`` the pipeline keeps
+only fields of the ``(status, partner, order_date, total_amount)`` index, so
+MongoDB answers it from the index without fetching orders. A ``$facet``
+then computes the overall ``$bucket`` distribution and the per-partner
+``$group`` in the same pass.
+
+Results are cached in-process against aging versions, without partner
+names: those are joined on every call, so a rename shows at once. Every order change
+bumps those versions through :func:`~app.services.rollups.apply_order_change`,
+one per kind and one per partner. A customer's aging is therefore recomputed
+only after one of its own open orders changed, and always when the date
+moves on.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from ..config import AGING_BUCKET_DAYS, AGING_CACHE_SIZE
+from ..models.purchase import PurchaseOrderStatus
+from ..models.report import AgingKind, RollupKind
+from ..models.sales import SalesOrderStatus
+
+AGING_SPECS = {
+    AgingKind.RECEIVABLES: {
+        "kind": RollupKind.SALES,
+        "orders": "sales_orders",
+        "partner_id": "customer_id",
+        "open": [
+            SalesOrderStatus.APPROVED.value,
+            SalesOrderStatus.PROCESSING.value,
+            SalesOrderStatus.PARTIAL_SHIPPED.value,
+            SalesOrderStatus.SHIPPED.value,
+        ],
+    },
+    AgingKind.PAYABLES: {
+        "kind": RollupKind.PURCHASES,
+        "orders": "purchase_orders",
+        "partner_id": "supplier_id",
+        "open": [
+            PurchaseOrderStatus.APPROVED.value,
+            PurchaseOrderStatus.ORDERED.value,
+            PurchaseOrderStatus.PARTIAL_RECEIVED.value,
+        ],
+    },
+}
+KIND_AGING = {spec["kind"]: aging for aging, spec in AGING_SPECS.items()}
+
+VERSIONS = "aging_versions"
+EPOCH = datetime(1970, 1, 1)
+
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+
+
+def open_balance(kind: RollupKind, order: Optional[dict]) -> Optional[tuple]:
+    """What an order adds to its partner's open balance, if anything."""
+    spec = AGING_SPECS[KIND_AGING[kind]]
+    if not order or order.get("status") not in spec["open"]:
+        return None
+    return order.get(spec["partner_id"]), order.get("total_amount") or 0.0, order.get("order_date")
+
+
+async def bump_aging_versions(db, kind: RollupKind, before: Optional[dict], after: Optional[dict]):
+    """Invalidate the cached aging an order change affects."""
+    old, new = open_balance(kind, before), open_balance(kind, after)
+    if old == new:
+        return
+    aging = KIND_AGING[kind].value
+    keys = {aging} | {f"{aging}:{balance[0]}" for balance in (old, new) if balance and balance[0]}
+    await db[VERSIONS].bulk_write([
+        UpdateOne({"_id": key}, {"$inc": {"value": 1}}, upsert=True) for key in keys
+    ], ordered=False)
+
+
+async def _version(db, key: str) -> int:
+    counter = await db[VERSIONS].find_one({"_id": key})
+    return counter.get("value", 0) if counter else 0
+
+
+def aging_buckets(as_of: date) -> List[dict]:
+    """The buckets as order-date ranges ``[start, end)``, newest first."""
+    day_end = datetime.combine(as_of, datetime.min.time()) + timedelta(days=1)
+    buckets = []
+    low = 0
+    for high in AGING_BUCKET_DAYS + [None]:
+        buckets.append({
+            "label": f"{low}-{high}天" if high is not None else f"{low - 1}天以上",
+            "min_days": low,
+            "max_days": high,
+            # An order aged n days was placed on the day n days before as_of
+            "start": day_end - timedelta(days=high + 1) if high is not None else EPOCH,
+            "end": day_end - timedelta(days=low),
+        })
+        if high is not None:
+            low = high + 1
+    return buckets
+
+
+def aging_pipeline(aging: AgingKind, as_of: date, partner_id: Optional[str] = None,
+                   skip: int = 0, limit: int = 100) -> list:
+    """Single pass over the open orders: overall buckets and per-partner rows."""
+    spec = AGING_SPECS[aging]
+    partner = spec["partner_id"]
+    buckets = aging_buckets(as_of)
+    match = {"status": {"$in": spec["open"]}, "order_date": {"$lt": buckets[0]["end"]}}
+    if partner_id:
+        match[partner] = partner_id
+
+    def in_bucket(bucket):
+        return {"$and": [
+            {"$gte": ["$order_date", bucket["start"]]},
+            {"$lt": ["$order_date", bucket["end"]]},
+        ]}
+
+    per_partner = {
+        "_id": f"${partner}",
+        "outstanding": {"$sum": "$total_amount"},
+        "order_count": {"$sum": 1},
+        "oldest_order_date": {"$min": "$order_date"},
+    }
+    for i, bucket in enumerate(buckets):
+        per_partner[f"amount_{i}"] = {"$sum": {"$cond": [in_bucket(bucket), "$total_amount", 0]}}
+        per_partner[f"count_{i}"] = {"$sum": {"$cond": [in_bucket(bucket), 1, 0]}}
+
+    return [
+        {"$match": match},
+        # Index fields only, so the scan is covered by the aging index
+        {"$project": {"_id": 0, partner: 1, "order_date": 1, "total_amount": 1}},
+        {"$facet": {
+            "buckets": [{"$bucket": {
+                "groupBy": "$order_date",
+                "boundaries": sorted(bucket["start"] for bucket in buckets) + [buckets[0]["end"]],
+                "default": "other",
+                "output": {"amount": {"$sum": "$total_amount"}, "order_count": {"$sum": 1}},
+            }}],
+            "partners": [
+                {"$group": per_partner},
+                {"$sort": {"outstanding": -1, "_id": 1}},
+                {"$skip": skip},
+                {"$limit": limit},
+            ],
+        }},
+    ]
+
+
+def _bucket_rows(buckets: List[dict], amounts: dict) -> List[dict]:
+    return [
+        {
+            "label": bucket["label"],
+            "min_days": bucket["min_days"],
+            "max_days": bucket["max_days"],
+            "amount": round(amounts.get(i, (0.0, 0))[0], 2),
+            "order_count": amounts.get(i, (0.0, 0))[1],
+        }
+        for i, bucket in enumerate(buckets)
+    ]
+
+
+def _partner_row(group: dict, buckets: List[dict]) -> dict:
+    amounts = {i: (group[f"amount_{i}"], group[f"count_{i}"]) for i in range(len(buckets))}
+    return {
+        "partner_id": group["_id"],
+        "outstanding": round(group["outstanding"], 2),
+        "order_count": group["order_count"],
+        "oldest_order_date": group.get("oldest_order_date"),
+        "buckets": _bucket_rows(buckets, amounts),
+    }
+
+
+async def _partner_names(db, partner_ids) -> dict:
+    object_ids = [ObjectId(pid) for pid in partner_ids if pid and ObjectId.is_valid(pid)]
+    names = {}
+    if object_ids:
+        async for partner in db.partners.find({"_id": {"$in": object_ids}}, {"name": 1}):
+            names[str(partner["_id"])] = partner.get("name")
+    return names
+
+
+async def _aggregate(db, aging: AgingKind, as_of: date, partner_id: Optional[str], skip: int, limit: int) -> dict:
+    pipeline = aging_pipeline(aging, as_of, partner_id, skip, limit)
+    result = None
+    async for result in db[AGING_SPECS[aging]["orders"]].aggregate(pipeline):
+        pass
+    return result or {"buckets": [], "partners": []}
+
+
+async def _with_names(db, report: dict) -> dict:
+    """A copy of a cached report with the partners' current names."""
+    names = await _partner_names(db, [row["partner_id"] for row in report["partners"]])
+    return {
+        **report,
+        "partners": [{**row, "partner_name": names.get(row["partner_id"])} for row in report["partners"]],
+    }
+
+
+def _remember(key: tuple, value: dict) -> dict:
+    _cache[key] = value
+    while len(_cache) > AGING_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return value
+
+
+async def compute_aging_report(db, aging: AgingKind, as_of: Optional[date] = None,
+                               skip: int = 0, limit: int = 100) -> dict:
+    """Aging of all open orders of ``aging``'s kind, largest balances first."""
+    as_of = as_of or date.today()
+    version = await _version(db, aging.value)
+    key = (db.name, aging, None, version, as_of, skip, limit)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return await _with_names(db, _cache[key])
+
+    buckets = aging_buckets(as_of)
+    result = await _aggregate(db, aging, as_of, None, skip, limit)
+    starts = {bucket["start"]: i for i, bucket in enumerate(buckets)}
+    amounts = {
+        starts[row["_id"]]: (row["amount"], row["order_count"])
+        for row in result["buckets"] if row["_id"] in starts
+    }
+    return await _with_names(db, _remember(key, {
+        "kind": aging,
+        "as_of": datetime.combine(as_of, datetime.min.time()),
+        "total_outstanding": round(sum(amount for amount, _ in amounts.values()), 2),
+        "order_count": sum(count for _, count in amounts.values()),
+        "buckets": _bucket_rows(buckets, amounts),
+        "partners": [_partner_row(group, buckets) for group in result["partners"]],
+    }))
+
+
+async def _partner_aging_row(db, aging: AgingKind, partner_id: str, as_of: date) -> dict:
+    buckets = aging_buckets(as_of)
+    result = await _aggregate(db, aging, as_of, partner_id, 0, 1)
+    if result["partners"]:
+        row = _partner_row(result["partners"][0], buckets)
+    else:
+        row = {
+            "partner_id": partner_id,
+            "outstanding": 0.0,
+            "order_count": 0,
+            "oldest_order_date": None,
+            "buckets": _bucket_rows(buckets, {}),
+        }
+    return row
+
+
+async def compute_partner_aging(db, aging: AgingKind, partner: dict, as_of: Optional[date] = None) -> dict:
+    """Aging of one customer's or supplier's open orders, cached per partner."""
+    as_of = as_of or date.today()
+    partner_id = str(partner["_id"])
+    version = await _version(db, f"{aging.value}:{partner_id}")
+    key = (db.name, aging, partner_id, version, as_of)
+    row = _cache.get(key)
+    if row is None:
+        row = _remember(key, await _partner_aging_row(db, aging, partner_id, as_of))
+    else:
+        _cache.move_to_end(key)
+    return {**row, "partner_name": partner.get("name")}
@@ -0,0 +1,232 @@
+"""Tiered archival of old inventory ledger records.
+
+Records older than the archive horizon are moved, one calendar month at a
+time, into gzip-compressed NDJSON files on local disk::
+
+    ARCHIVE_DIR/inventory_records/2025/inventory_records-2025-03.<n>.ndjson.gz
+
+(under ``ARCHIVE_DIR/<database>/`` for tenant databases).
+Each archived month leaves per-product totals behind in
+``inventory_record_summaries`` and a manifest entry in ``archive_partitions``
+that :func:`read_archived_records` uses to serve historical ranges. Records
+are only deleted from Mongo after their file is written and renamed into
+place, so an interrupted run never loses data.
+
+Reruns are safe. A part file is named after the number of parts already in
+the manifest, so one that was written but never recorded is overwritten
+rather than duplicated. Recording a part also stores its per-product totals
+and marks it ``pending`` in the same manifest update; the month's summaries
+are then ``$set`` from the totals of all its parts, and the part's records
+are deleted. A run that finds a pending part finishes those steps from the
+file before it archives anything else, so records are never archived twice
+and totals never counted twice.
+
+As-of valuations that reach back past the horizon do not see archived
+movements.
+"""
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from ..config import ARCHIVE_DIR, ARCHIVE_HORIZON_DAYS, DATABASE_NAME
+from ..models.inventory import OUTBOUND_OPERATION_TYPES
+
+COLLECTION = "inventory_records"
+DELETE_CHUNK_SIZE = 1000
+WRITE_CHUNK_SIZE = 5000
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(moment: datetime) -> datetime:
+    return (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _encode(record: dict) -> str:
+    doc = dict(record)
+    doc["_id"] = str(doc["_id"])
+    doc["created_at"] = doc["created_at"].isoformat()
+    return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+def _decode(line: str) -> dict:
+    doc = json.loads(line)
+    doc["created_at"] = datetime.fromisoformat(doc["created_at"])
+    return doc
+
+
+def _read_partition(path: str) -> list:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [_decode(line) for line in f if line.strip()]
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Records before this moment belong to the archive tier."""
+    now = now or datetime.now()
+    return month_start(now - timedelta(days=ARCHIVE_HORIZON_DAYS))
+
+
+def _month_totals(manifest: dict) -> dict:
+    totals = {}
+    for part in manifest.get("parts", []):
+        for entry in part["summaries"]:
+            summary = totals.setdefault(entry["product_id"], {"record_count": 0, "net_quantity": 0})
+            summary["record_count"] += entry["record_count"]
+            summary["net_quantity"] += entry["net_quantity"]
+    return totals
+
+
+async def _finish_part(db, manifest: dict, ids: list):
+    """Set the month's summaries, delete the part's records, clear ``pending``."""
+    # Per-product totals for the month stay queryable in Mongo
+    totals = _month_totals(manifest)
+    if totals:
+        await db.inventory_record_summaries.bulk_write([
+            UpdateOne(
+                {"product_id": product_id, "month": manifest["month"]},
+                {"$set": summary},
+                upsert=True
+            )
+            for product_id, summary in totals.items()
+        ], ordered=False)
+
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        await db[COLLECTION].delete_many({"_id": {"$in": ids[i:i + DELETE_CHUNK_SIZE]}})
+    await db.archive_partitions.update_one({"_id": manifest["_id"]}, {"$unset": {"pending": ""}})
+
+
+async def _resume_pending(db, manifest: dict):
+    """Finish a part an earlier run recorded but did not complete."""
+    loop = asyncio.get_running_loop()
+    records = await loop.run_in_executor(None, _read_partition, manifest["pending"])
+    ids = [ObjectId(r["_id"]) if ObjectId.is_valid(r["_id"]) else r["_id"] for r in records]
+    await _finish_part(db, manifest, ids)
+
+
+async def archive_month(db, start: datetime) -> int:
+    """Move one month of ledger records to a partition file."""
+    end = next_month(start)
+    month = start.strftime("%Y-%m")
+    manifest_id = f"{COLLECTION}:{month}"
+    query = {"created_at": {"$gte": start, "$lt": end}}
+
+    manifest = await db.archive_partitions.find_one({"_id": manifest_id})
+    if manifest and manifest.get("pending"):
+        await _resume_pending(db, manifest)
+
+    if not await db[COLLECTION].find_one(query, {"_id": 1}):
+        return 0
+
+    part = len(manifest.get("files", [])) if manifest else 0
+    # Tenant databases archive under their own directory
+    base = ARCHIVE_DIR if db.name == DATABASE_NAME else os.path.join(ARCHIVE_DIR, db.name)
+    path = os.path.join(
+        base, COLLECTION, start.strftime("%Y"), f"{COLLECTION}-{month}.{part}.ndjson.gz"
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    # Stream the month into the file; compression runs off the event loop
+    loop = asyncio.get_running_loop()
+    ids = []
+    summaries = {}
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        chunk = []
+        async for record in db[COLLECTION].find(query).sort("created_at", 1):
+            ids.append(record["_id"])
+            summary = summaries.setdefault(record.get("product_id"), {"record_count": 0, "net_quantity": 0})
+            summary["record_count"] += 1
+            quantity = record.get("quantity", 0)
+            if record.get("operation_type") in OUTBOUND_OPERATION_TYPES:
+                quantity = -quantity
+            summary["net_quantity"] += quantity
+            chunk.append(_encode(record) + "\n")
+            if len(chunk) >= WRITE_CHUNK_SIZE:
+                await loop.run_in_executor(None, f.writelines, chunk)
+                chunk = []
+        if chunk:
+            await loop.run_in_executor(None, f.writelines, chunk)
+    os.replace(tmp_path, path)
+
+    recorded = {
+        "file": path,
+        "summaries": [{"product_id": product_id, **totals} for product_id, totals in summaries.items()],
+    }
+    manifest = await db.archive_partitions.find_one_and_update(
+        {"_id": manifest_id},
+        {
+            "$set": {"collection": COLLECTION, "month": month, "start": start, "end": end, "pending": path},
+            "$push": {"files": path, "parts": recorded},
+            "$inc": {"record_count": len(ids)},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    await _finish_part(db, manifest, ids)
+    return len(ids)
+
+
+async def archive_ledger(db) -> int:
+    """Archive every complete month older than the horizon."""
+    cutoff = archive_cutoff()
+    oldest = await db[COLLECTION].find_one(
+        {"created_at": {"$lt": cutoff}},
+        sort=[("created_at", 1)]
+    )
+    if not oldest:
+        return 0
+
+    archived = 0
+    start = month_start(oldest["created_at"])
+    while start < cutoff:
+        archived += await archive_month(db, start)
+        start = next_month(start)
+    print(f"Archived {archived} inventory records before {cutoff:%Y-%m}")
+    return archived
+
+
+async def read_archived_records(
+    db,
+    query: dict,
+    start: datetime,
+    end: Optional[datetime],
+    skip: int,
+    limit: int
+) -> list:
+    """Read archived records in ``[start, end)``, newest first.
+
+    ``query`` holds plain equality filters applied to each record.
+    """
+    partition_query = {"collection": COLLECTION, "end": {"$gt": start}}
+    if end:
+        partition_query["start"] = {"$lt": end}
+    partitions = await db.archive_partitions.find(partition_query).sort("start", -1).to_list(length=None)
+
+    loop = asyncio.get_running_loop()
+    results = []
+    for partition in partitions:
+        month_records = []
+        for path in partition.get("files", []):
+            if os.path.exists(path):
+                month_records += await loop.run_in_executor(None, _read_partition, path)
+        month_records.sort(key=lambda r: r["created_at"], reverse=True)
+        for record in month_records:
+            if record["created_at"] < start or (end and record["created_at"] >= end):
+                continue
+            if any(record.get(k) != v for k, v in query.items()):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            results.append(record)
+            if len(results) >= limit:
+                return results
+    return results
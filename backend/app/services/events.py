@@ -0,0 +1,213 @@
+"""Live change events for connected clients.
+
+Inventory movements and order status changes are published to an in-process
+bus that fans out to Server-Sent Events subscribers. When MongoDB runs as a
+replica set the bus is fed by a change stream, so every worker sees every
+write; otherwise the write paths publish directly and clients receive the
+changes made through their own worker.
+
+Events are tagged with the database they come from, and subscribers only
+receive those of their own tenant's database.
+
+Each subscriber keeps at most one pending event per document: rapid updates
+to the same row coalesce into the latest one. A subscriber that falls too
+far behind is reset and told to resync instead of buffering without bound.
+"""
+import asyncio
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from ..database import get_database
+
+TOPIC_COLLECTIONS = {
+    "inventory": "inventory",
+    "sales": "sales_orders",
+    "purchases": "purchase_orders",
+}
+COLLECTION_TOPICS = {v: k for k, v in TOPIC_COLLECTIONS.items()}
+
+RESYNC_EVENT = {"topic": "resync", "key": "resync", "data": {}}
+
+
+def inventory_event(inventory: dict) -> dict:
+    """Build the event payload for an inventory row."""
+    return {
+        "id": str(inventory["_id"]),
+        "product_id": inventory.get("product_id"),
+        "warehouse": inventory.get("warehouse"),
+        "quantity": inventory.get("quantity"),
+        "updated_at": inventory.get("updated_at"),
+    }
+
+
+def order_event(order: dict, deleted: bool = False) -> dict:
+    """Build the event payload for a sales or purchase order."""
+    payload = {"id": str(order["_id"]), "deleted": deleted}
+    if not deleted:
+        payload.update({
+            "order_number": order.get("order_number"),
+            "status": order.get("status"),
+            "total_amount": order.get("total_amount"),
+            "updated_at": order.get("updated_at"),
+        })
+    return payload
+
+
+class Subscriber:
+    """One connected client's coalescing event buffer."""
+
+    def __init__(self, topics: Optional[set] = None, max_pending: int = 500, database: Optional[str] = None):
+        self.topics = topics
+        self.database = database
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[str, dict]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def close(self):
+        """End the subscription; the stream finishes after its current batch."""
+        self.closed = True
+        self.ready.set()
+
+    def offer(self, event: dict):
+        if self.topics and event["topic"] not in self.topics:
+            return
+        if self.database and event.get("database") != self.database:
+            return
+        # Keep only the latest event per document, in order of last change
+        self.pending.pop(event["key"], None)
+        self.pending[event["key"]] = event
+        if len(self.pending) > self.max_pending:
+            self.pending.clear()
+            self.pending[RESYNC_EVENT["key"]] = RESYNC_EVENT
+        self.ready.set()
+
+    async def next_batch(self, timeout: float, coalesce_window: float) -> list:
+        """Wait for events, then linger briefly so bursts arrive as one batch."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        if coalesce_window:
+            await asyncio.sleep(coalesce_window)
+        batch = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        return batch
+
+
+class EventBus:
+    """Fans out change events to subscribers."""
+
+    def __init__(self):
+        self.subscribers: set = set()
+        self.change_stream_active = False
+        self._watch_task: Optional[asyncio.Task] = None
+
+    def subscribe(
+        self, topics: Optional[set] = None, max_pending: int = 500, database: Optional[str] = None
+    ) -> Subscriber:
+        subscriber = Subscriber(topics, max_pending, database)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def close_subscribers(self):
+        """Close every open stream, e.g. so a shutting-down worker can drain."""
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+
+    def dispatch(self, topic: str, data: dict, database: Optional[str] = None):
+        """Deliver an event from ``database`` to every subscriber of it."""
+        event = {"topic": topic, "key": f"{topic}:{data['id']}", "data": data, "database": database}
+        for subscriber in self.subscribers:
+            subscriber.offer(event)
+
+    def publish(self, topic: str, data: dict):
+        """Publish from a write path.
+
+        Ignored while a change stream is feeding the bus, which delivers the
+        same change to all workers.
+        """
+        if not self.change_stream_active:
+            self.dispatch(topic, data, get_database().name)
+
+    async def start(self, client, db, database_names: Optional[List[str]] = None):
+        """Use a change stream when MongoDB is a replica set.
+
+        With ``database_names`` (the tenant databases) a single client-wide
+        stream watches all of them instead of ``db``.
+        """
+        try:
+            hello = await client.admin.command("hello")
+        except Exception:
+            hello = {}
+        if hello.get("setName") or hello.get("msg") == "isdbgrid":
+            self.change_stream_active = True
+            source = client if database_names else db
+            self._watch_task = asyncio.create_task(self._watch(source, database_names))
+            print("Event bus: MongoDB change stream")
+        else:
+            print("Event bus: in-process publish")
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        self.change_stream_active = False
+
+    async def _watch(self, source, database_names: Optional[List[str]] = None):
+        match = {
+            "ns.coll": {"$in": list(COLLECTION_TOPICS)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }
+        if database_names:
+            match["ns.db"] = {"$in": database_names}
+        pipeline = [{"$match": match}]
+        resume_token = None
+        while True:
+            try:
+                async with source.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self._dispatch_change(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event bus change stream error, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    def _dispatch_change(self, change: dict):
+        topic = COLLECTION_TOPICS[change["ns"]["coll"]]
+        database = change["ns"]["db"]
+        if change["operationType"] == "delete":
+            self.dispatch(topic, {"id": str(change["documentKey"]["_id"]), "deleted": True}, database)
+            return
+        document = change.get("fullDocument")
+        if not document:
+            return
+        if topic == "inventory":
+            self.dispatch(topic, inventory_event(document), database)
+        else:
+            self.dispatch(topic, order_event(document), database)
+
+
+def format_sse(event: dict) -> str:
+    """Serialise an event in Server-Sent Events wire format."""
+    data = json.dumps(event["data"], default=_json_default, ensure_ascii=False)
+    return f"event: {event['topic']}\ndata: {data}\n\n"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+event_bus = EventBus()
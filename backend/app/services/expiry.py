@@ -0,0 +1,69 @@
+"""Expiry date computation for inventory batches."""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+
+def compute_expires_at(received_at: datetime, shelf_life: Optional[int]) -> Optional[datetime]:
+    """Return the expiry date for a batch received at ``received_at``.
+
+    Products without a shelf life never expire and yield ``None``.
+    """
+    if not shelf_life:
+        return None
+    return received_at + timedelta(days=shelf_life)
+
+
+def expires_at_pipeline(shelf_life: Optional[int]) -> list:
+    """Update pipeline recomputing ``expires_at`` from each row's receipt date."""
+    if not shelf_life:
+        return [{"$unset": "expires_at"}]
+    return [{
+        "$set": {
+            "expires_at": {
+                "$add": [
+                    {"$ifNull": ["$received_at", "$created_at"]},
+                    shelf_life * MS_PER_DAY,
+                ]
+            }
+        }
+    }]
+
+
+async def refresh_product_expiry(db, product_id: str, shelf_life: Optional[int]):
+    """Recompute ``expires_at`` on every inventory row of a product."""
+    await db.inventory.update_many(
+        {"product_id": product_id},
+        expires_at_pipeline(shelf_life)
+    )
+
+
+async def backfill_expiry_dates(db) -> int:
+    """Fill in ``expires_at`` for inventory rows created before it existed.
+
+    Only products that still have rows missing the field are looked at: one
+    ``distinct`` over those rows (answered from the expiry index) and one
+    product query, so running this on every startup is cheap once the
+    back-fill has completed. Rows of products without a shelf life never get
+    the field and are skipped each time.
+    """
+    missing = await db.inventory.distinct("product_id", {"expires_at": {"$exists": False}})
+    product_ids = [ObjectId(pid) for pid in missing if pid and ObjectId.is_valid(pid)]
+    if not product_ids:
+        return 0
+
+    updated = 0
+    cursor = db.products.find(
+        {"_id": {"$in": product_ids}, "shelf_life": {"$gt": 0}},
+        {"shelf_life": 1}
+    )
+    async for product in cursor:
+        result = await db.inventory.update_many(
+            {"product_id": str(product["_id"]), "expires_at": {"$exists": False}},
+            expires_at_pipeline(product["shelf_life"])
+        )
+        updated += result.modified_count
+    return updated
@@ -0,0 +1,123 @@
+"""Worker health: MongoDB pool monitoring, readiness and draining.
+
+A worker becomes ready once its lifespan startup has connected to MongoDB and
+warmed its caches. It stops being ready as soon as shutdown begins, so load
+balancers stop routing new requests to it while in-flight ones drain.
+"""
+import asyncio
+import threading
+import time
+
+from pymongo import monitoring
+
+from ..config import MONGODB_MAX_POOL_SIZE, READINESS_TIMEOUT_SECONDS
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts the connections of this process's MongoDB pools.
+
+    The driver calls these hooks from its own threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.check_out_failures = 0
+        self.clears = 0
+
+    def _add(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add("clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add("open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add("open", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add("check_out_failures")
+
+    def connection_checked_out(self, event):
+        self._add("in_use")
+
+    def connection_checked_in(self, event):
+        self._add("in_use", -1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_size": MONGODB_MAX_POOL_SIZE,
+                "open": self.open,
+                "in_use": self.in_use,
+                "available": self.open - self.in_use,
+                "check_out_failures": self.check_out_failures,
+                "clears": self.clears,
+            }
+
+
+class HealthState:
+    """Lifecycle of this worker as seen by readiness probes."""
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+
+    def mark_ready(self):
+        self.ready = True
+        self.draining = False
+
+    def begin_draining(self):
+        self.ready = False
+        self.draining = True
+
+
+pool_monitor = PoolMonitor()
+health_state = HealthState()
+
+
+async def check_readiness(client, timeout: float = READINESS_TIMEOUT_SECONDS) -> dict:
+    """Ping MongoDB and report whether this worker should receive traffic."""
+    mongo = {"ok": False, "latency_ms": None, "error": None}
+    if client is not None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(client.admin.command("ping"), timeout=timeout)
+            mongo["ok"] = True
+            mongo["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        except Exception as e:
+            mongo["error"] = f"{type(e).__name__}: {e}"
+
+    if health_state.draining:
+        state = "draining"
+    elif not health_state.ready:
+        state = "starting"
+    elif not mongo["ok"]:
+        state = "unavailable"
+    else:
+        state = "ready"
+    return {
+        "status": state,
+        "ready": state == "ready",
+        "mongo": mongo,
+        "pool": pool_monitor.snapshot(),
+    }
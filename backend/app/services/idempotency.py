@@ -0,0 +1,226 @@
+"""Idempotency-Key support for retried write requests.
+
+Clients send an ``Idempotency-Key`` header on retryable POSTs. The first
+request with a key runs the handler and its response is stored, in an
+in-process LRU and in the TTL-indexed ``idempotency_keys`` collection; every
+retry replays the stored response without running the handler again.
+
+While the first request is running, concurrent duplicates in the same
+process wait on a per-key lock and then replay. Duplicates arriving at other
+workers find the pending marker in Mongo and get ``409`` with
+``Retry-After``. Reusing a key with a different request body is rejected
+with ``422``. Server errors are not stored, so those requests can be retried.
+"""
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import Binary
+from pymongo.errors import DuplicateKeyError
+
+from ..config import (
+    IDEMPOTENCY_CACHE_SIZE,
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS,
+    IDEMPOTENCY_PATHS,
+    IDEMPOTENCY_TTL_SECONDS,
+)
+from ..database import get_database
+
+HEADER = b"idempotency-key"
+PENDING = "pending"
+COMPLETED = "completed"
+
+
+class IdempotencyStore:
+    """Stored responses: an in-process LRU in front of Mongo."""
+
+    def __init__(self, cache_size: int = IDEMPOTENCY_CACHE_SIZE):
+        self.cache_size = cache_size
+        # Keyed by (database name, key): each tenant has its own keys
+        self._cache: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._locks: dict = {}
+
+    def _remember(self, key: tuple, entry: dict):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def lock(self, key) -> asyncio.Lock:
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        await entry[0].acquire()
+        return entry[0]
+
+    def unlock(self, key):
+        entry = self._locks[key]
+        entry[0].release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    async def get(self, db, key: str) -> Optional[dict]:
+        cached = self._cache.get((db.name, key))
+        if cached is not None:
+            # Expire with the TTL index, which drops the stored entry in Mongo
+            if cached["created_at"] > datetime.now() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS):
+                self._cache.move_to_end((db.name, key))
+                return cached
+            del self._cache[(db.name, key)]
+        entry = await db.idempotency_keys.find_one({"_id": key})
+        if entry and entry.get("state") == COMPLETED:
+            self._remember((db.name, key), entry)
+        return entry
+
+    async def claim(self, db, key: str, fingerprint: str) -> Optional[dict]:
+        """Mark ``key`` as in flight; return the existing entry if already taken."""
+        now = datetime.now()
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": key, "state": PENDING, "fingerprint": fingerprint, "created_at": now,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        # Take over a pending marker left behind by a crashed worker
+        stale = await db.idempotency_keys.find_one_and_update(
+            {
+                "_id": key,
+                "state": PENDING,
+                "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT_SECONDS)},
+            },
+            {"$set": {"fingerprint": fingerprint, "created_at": now}}
+        )
+        if stale:
+            return None
+        return await self.get(db, key)
+
+    async def complete(self, db, key: str, status_code: int, content_type: Optional[bytes], body: bytes):
+        entry = {
+            "state": COMPLETED,
+            "status_code": status_code,
+            "content_type": content_type.decode() if content_type else None,
+            "body": Binary(body),
+        }
+        await db.idempotency_keys.update_one({"_id": key}, {"$set": entry})
+        stored = await db.idempotency_keys.find_one({"_id": key})
+        if stored:
+            self._remember((db.name, key), stored)
+
+    async def release(self, db, key: str):
+        await db.idempotency_keys.delete_one({"_id": key, "state": PENDING})
+
+
+idempotency_store = IdempotencyStore()
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying idempotency keys to configured POST paths."""
+
+    def __init__(self, app, paths=IDEMPOTENCY_PATHS, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.paths = set(paths)
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        header = dict(scope["headers"]).get(HEADER)
+        if not header:
+            return await self.app(scope, receive, send)
+
+        body = await self._read_body(receive)
+        key = f"{scope['path']}:{header.decode('latin-1')}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+        db = get_database()
+
+        claimed = False
+        await self.store.lock((db.name, key))
+        try:
+            existing = await self.store.get(db, key)
+            if existing is None:
+                existing = await self.store.claim(db, key, fingerprint)
+            if existing is not None:
+                return await self._respond_existing(existing, fingerprint, send)
+
+            claimed = True
+            status_code, content_type, chunks = await self._run(scope, body, receive, send)
+            if status_code < 500:
+                await self.store.complete(db, key, status_code, content_type, b"".join(chunks))
+            else:
+                await self.store.release(db, key)
+        except BaseException:
+            # Only drop our own marker; another worker's must stay in place
+            if claimed:
+                await self.store.release(db, key)
+            raise
+        finally:
+            self.store.unlock((db.name, key))
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def _run(self, scope, body: bytes, receive, send):
+        """Run the handler with the buffered body, capturing its response."""
+        sent = False
+        captured = {"status": 500, "content_type": None, "chunks": []}
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["content_type"] = dict(message.get("headers", [])).get(b"content-type")
+            elif message["type"] == "http.response.body":
+                captured["chunks"].append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+        return captured["status"], captured["content_type"], captured["chunks"]
+
+    async def _respond_existing(self, entry: dict, fingerprint: str, send):
+        if entry.get("fingerprint") != fingerprint:
+            return await self._send(send, 422, {"detail": "幂等键已用于不同的请求"})
+        if entry.get("state") != COMPLETED:
+            return await self._send(send, 409, {"detail": "相同幂等键的请求正在处理中"},
+                                    extra_headers=[(b"retry-after", b"1")])
+        content_type = (entry.get("content_type") or "application/json").encode()
+        body = bytes(entry.get("body") or b"")
+        await send({
+            "type": "http.response.start",
+            "status": entry["status_code"],
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+                (b"idempotent-replayed", b"true"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send(send, status_code: int, payload: dict, extra_headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ] + list(extra_headers),
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,151 @@
+"""Referential integrity of the string ID references between collections.
+
+Inventory rows, ledger records and orders refer to products, partners and
+inventory rows by string ID. The scanner checks every reference field
+without loading a collection: a ``$group`` aggregation streams the distinct
+IDs each field uses, and they are looked up in their parent collection in
+``$in`` chunks. Dangling references are reported, and the ``delete`` repair
+removes the inventory rows and ledger records that point at a missing
+product or inventory row. Orders are only reported: they carry their own
+copies of product and partner names, so they still read correctly, and
+deleting them would drop sales and purchase history.
+
+Deletes of products and partners check for references first, through the
+indexes on the reference fields, so new orphans are not created.
+"""
+import time
+from datetime import datetime
+from typing import List
+
+from bson import ObjectId
+
+from ..config import INTEGRITY_SAMPLE_SIZE
+from ..models.integrity import IntegrityRepair
+from .stock_version import bump_stock_version
+
+CHUNK_SIZE = 1000
+
+# (referencing collection, reference field, parent collection)
+REFERENCES = (
+    ("inventory", "product_id", "products"),
+    ("inventory_records", "product_id", "products"),
+    ("inventory_records", "inventory_id", "inventory"),
+    ("sales_orders", "items.product_id", "products"),
+    ("purchase_orders", "items.product_id", "products"),
+    ("sales_orders", "customer_id", "partners"),
+    ("purchase_orders", "supplier_id", "partners"),
+)
+
+# Collections the ``delete`` repair may remove orphaned documents from
+DELETABLE = ("inventory", "inventory_records")
+
+REFERENCE_LABELS = {
+    "inventory": "库存",
+    "inventory_records": "库存流水",
+    "sales_orders": "销售订单",
+    "purchase_orders": "采购订单",
+}
+
+
+async def find_references(db, parent: str, parent_id: str) -> List[str]:
+    """Return labels of the collections that still reference a document.
+
+    Each check is an indexed ``find_one`` that stops at the first match.
+    """
+    found = []
+    for collection, field, target in REFERENCES:
+        if target != parent:
+            continue
+        if await db[collection].find_one({field: parent_id}, {"_id": 1}):
+            label = REFERENCE_LABELS[collection]
+            if label not in found:
+                found.append(label)
+    return found
+
+
+async def _missing_parents(db, parent: str, ids: List[str]) -> List[str]:
+    """Return the IDs in ``ids`` that have no document in ``parent``."""
+    valid = [ObjectId(value) for value in ids if ObjectId.is_valid(value)]
+    existing = set()
+    if valid:
+        async for document in db[parent].find({"_id": {"$in": valid}}, {"_id": 1}):
+            existing.add(str(document["_id"]))
+    return [value for value in ids if value not in existing]
+
+
+async def scan_reference(db, collection: str, field: str, parent: str) -> dict:
+    """Find the dangling values of one reference field."""
+    pipeline = []
+    if "." in field:
+        pipeline.append({"$unwind": "$" + field.split(".")[0]})
+    pipeline += [
+        {"$match": {field: {"$ne": None}}},
+        {"$group": {"_id": "$" + field, "count": {"$sum": 1}}},
+    ]
+
+    distinct_ids = 0
+    orphans = []
+    orphan_references = 0
+    chunk = {}
+
+    async def flush():
+        nonlocal orphan_references
+        for value in await _missing_parents(db, parent, list(chunk)):
+            orphans.append(value)
+            orphan_references += chunk[value]
+        chunk.clear()
+
+    cursor = db[collection].aggregate(pipeline, allowDiskUse=True, batchSize=CHUNK_SIZE)
+    async for group in cursor:
+        distinct_ids += 1
+        chunk[str(group["_id"])] = group["count"]
+        if len(chunk) >= CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+
+    return {
+        "collection": collection,
+        "field": field,
+        "parent": parent,
+        "distinct_ids": distinct_ids,
+        "orphan_ids": orphans,
+        "orphan_references": orphan_references,
+    }
+
+
+async def _repair(db, check: dict, repair: IntegrityRepair) -> int:
+    """Apply ``repair`` to one check's orphans and return the documents changed."""
+    if repair != IntegrityRepair.DELETE or check["collection"] not in DELETABLE:
+        return 0
+    orphans = check["orphan_ids"]
+    changed = 0
+    for i in range(0, len(orphans), CHUNK_SIZE):
+        result = await db[check["collection"]].delete_many({check["field"]: {"$in": orphans[i:i + CHUNK_SIZE]}})
+        changed += result.deleted_count
+    if changed and check["collection"] == "inventory":
+        await bump_stock_version(db)
+    return changed
+
+
+async def run_integrity_scan(db, repair: IntegrityRepair = IntegrityRepair.NONE) -> dict:
+    """Check every reference field, optionally repair, and store the report."""
+    started = time.perf_counter()
+    now = datetime.now()
+    checks = []
+    for collection, field, parent in REFERENCES:
+        check = await scan_reference(db, collection, field, parent)
+        check["repaired"] = await _repair(db, check, repair) if check["orphan_ids"] else 0
+        check["orphan_count"] = len(check["orphan_ids"])
+        check["orphan_ids"] = check["orphan_ids"][:INTEGRITY_SAMPLE_SIZE]
+        checks.append(check)
+
+    report = {
+        "started_at": now,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "repair": repair.value,
+        "orphan_count": sum(check["orphan_count"] for check in checks),
+        "checks": checks,
+    }
+    await db.integrity_reports.insert_one(dict(report))
+    return report
@@ -0,0 +1,80 @@
+"""Background jobs run by the application scheduler."""
+from ..config import (
+    ARCHIVE_CRON,
+    INTEGRITY_SCAN_CRON,
+    PROPAGATION_INTERVAL_SECONDS,
+    REPLENISHMENT_CRON,
+    ROLLUP_REBUILD_CRON,
+    SCHEDULER_LEASE_TTL_SECONDS,
+    SCHEDULER_MAX_CONCURRENCY,
+    VALUATION_WARM_INTERVAL_SECONDS,
+)
+from ..database import get_database
+from .archive import archive_ledger
+from .integrity import run_integrity_scan
+from .propagation import name_propagator
+from .replenishment import run_replenishment
+from .rollups import rebuild_all_rollups
+from .scheduler import JobScheduler
+from .tenancy import per_tenant
+from .valuation import compute_valuation
+
+scheduler = JobScheduler(
+    max_concurrency=SCHEDULER_MAX_CONCURRENCY,
+    lease_ttl=SCHEDULER_LEASE_TTL_SECONDS
+)
+
+
+async def rebuild_rollups_job():
+    await rebuild_all_rollups(get_database())
+
+
+async def replenishment_job():
+    await run_replenishment(get_database())
+
+
+async def warm_valuation_job():
+    # Valuations are cached per process, so every worker warms its own
+    await compute_valuation(get_database())
+
+
+async def warm_caches():
+    """Warm this process's caches at startup.
+
+    A failure is logged rather than raised: it only costs a cold first request.
+    """
+    try:
+        await per_tenant(warm_valuation_job)()
+    except Exception as e:
+        print(f"Cache warm-up failed: {e}")
+
+
+async def ledger_archive_job():
+    await archive_ledger(get_database())
+
+
+async def integrity_scan_job():
+    # Scheduled runs only report; repairs are requested explicitly
+    await run_integrity_scan(get_database())
+
+
+async def name_propagation_job():
+    # Picks up renames whose background propagation failed or was interrupted
+    await name_propagator.drain(get_database())
+
+
+def register_jobs():
+    """Register the application's periodic jobs; each runs for every tenant."""
+    scheduler.add_job("rollup_rebuild", per_tenant(rebuild_rollups_job), cron=ROLLUP_REBUILD_CRON, jitter=60)
+    scheduler.add_job("replenishment", per_tenant(replenishment_job), cron=REPLENISHMENT_CRON, jitter=60)
+    scheduler.add_job("ledger_archive", per_tenant(ledger_archive_job), cron=ARCHIVE_CRON, jitter=60)
+    scheduler.add_job("integrity_scan", per_tenant(integrity_scan_job), cron=INTEGRITY_SCAN_CRON, jitter=60)
+    scheduler.add_job(
+        "name_propagation", per_tenant(name_propagation_job),
+        interval=PROPAGATION_INTERVAL_SECONDS, jitter=10
+    )
+    scheduler.add_job(
+        "valuation_warm", per_tenant(warm_valuation_job),
+        interval=VALUATION_WARM_INTERVAL_SECONDS, jitter=30,
+        leader_only=False
+    )
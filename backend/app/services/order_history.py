@@ -0,0 +1,90 @@
+"""Order history of a product or partner over a date range.
+
+Both lookups are served by compound indexes led by the looked-up field and
+then ``order_date`` descending and ``_id``, so an equality match, a date range
+and the newest-first sort are all resolved in the index and only one page of
+orders is read:
+
+* Partner history projects only fields of the
+  ``(partner, order_date, _id, order_number, partner_name, status, total_amount)``
+  index, which makes it a covered query that never loads the orders.
+* Product history runs on the multikey ``(items.product_id, order_date, _id)``
+  index. MongoDB cannot cover a query on an array field, so each order of the
+  page is fetched, and its items are narrowed to the product's lines on the
+  server before they are returned.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from ..models.report import RollupKind
+from .rollups import ROLLUP_SPECS
+
+HISTORY_SORT = [("order_date", -1), ("_id", -1)]
+
+
+async def ensure_history_indexes(database):
+    """Create the order-history indexes; their prefixes also serve reference checks."""
+    for spec in ROLLUP_SPECS.values():
+        orders = database[spec["orders"]]
+        await orders.create_index([
+            (spec["partner_id"], 1), ("order_date", -1), ("_id", -1),
+            ("order_number", 1), (spec["partner_name"], 1), ("status", 1), ("total_amount", 1),
+        ])
+        await orders.create_index([("items.product_id", 1), ("order_date", -1), ("_id", -1)])
+
+
+def history_fields(kind: RollupKind) -> dict:
+    spec = ROLLUP_SPECS[kind]
+    fields = ("order_number", spec["partner_id"], spec["partner_name"], "order_date", "status", "total_amount")
+    return {field: 1 for field in fields}
+
+
+def history_query(field: str, value: str, start: Optional[date], end: Optional[date],
+                  status: Optional[str] = None) -> dict:
+    """Match ``field == value`` and order dates from ``start`` through ``end``."""
+    query = {field: value}
+    order_date = {}
+    if start:
+        order_date["$gte"] = datetime.combine(start, datetime.min.time())
+    if end:
+        order_date["$lt"] = datetime.combine(end, datetime.min.time()) + timedelta(days=1)
+    if order_date:
+        query["order_date"] = order_date
+    if status:
+        query["status"] = status
+    return query
+
+
+def partner_history_cursor(db, kind: RollupKind, query: dict, skip: int, limit: int, session=None):
+    """Covered, newest-first page of a partner's orders."""
+    return db[ROLLUP_SPECS[kind]["orders"]].find(
+        query, {"_id": 1, **history_fields(kind)}, session=session
+    ).sort(HISTORY_SORT).skip(skip).limit(limit)
+
+
+def product_history_cursor(db, kind: RollupKind, product_id: str, query: dict,
+                           skip: int, limit: int, session=None):
+    """Newest-first page of the orders with a line for ``product_id``."""
+    return db[ROLLUP_SPECS[kind]["orders"]].aggregate([
+        {"$match": query},
+        {"$sort": dict(HISTORY_SORT)},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {
+            **history_fields(kind),
+            "items": {"$filter": {
+                "input": {"$ifNull": ["$items", []]},
+                "as": "line",
+                "cond": {"$eq": ["$$line.product_id", product_id]},
+            }},
+        }},
+    ], session=session)
+
+
+def product_totals(order: dict) -> dict:
+    """Quantity and amount of the product's lines on a product-history order."""
+    lines = order.get("items") or []
+    return {
+        "quantity": sum(line.get("quantity", 0) for line in lines),
+        "amount": round(sum(line.get("quantity", 0) * line.get("unit_price", 0.0) for line in lines), 2),
+    }
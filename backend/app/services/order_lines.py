@@ -0,0 +1,213 @@
+"""Single-line edits on sales and purchase orders.
+
+Every order line carries a ``line_id``. Lines are added with ``$push``,
+changed through the positional ``items.$`` operator and removed with
+``$pull``, while ``total_amount`` moves by the line's amount difference via
+``$inc``. The rest of the ``items`` array is neither read nor rewritten, so
+the cost of an edit does not grow with the size of the order.
+
+Updates and removals only apply while the line still holds the values they
+were computed from; a concurrent change to the same line is reported as a
+version conflict. Edits to different lines of one order do not conflict.
+"""
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from ..models.report import RollupKind
+from ..utils.concurrency import version_conflict, version_filter
+from .rollups import ROLLUP_SPECS, apply_line_change
+
+# Order fields returned by line edits; the items array stays on the server
+HEADER_PROJECTION = {"items": 0}
+
+# Line fields a stored line must still match for an edit to apply
+GUARD_FIELDS = ("product_id", "quantity", "unit_price")
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def order_collection(db, kind: RollupKind):
+    return db[ROLLUP_SPECS[kind]["orders"]]
+
+
+def new_line_id() -> str:
+    return str(ObjectId())
+
+
+def assign_line_ids(items: list) -> list:
+    """Give every line without a ``line_id`` a new one."""
+    for item in items:
+        if not item.get("line_id"):
+            item["line_id"] = new_line_id()
+    return items
+
+
+def line_amount(line: Optional[dict]) -> float:
+    if not line:
+        return 0.0
+    return (line.get("quantity") or 0) * (line.get("unit_price") or 0.0)
+
+
+async def backfill_line_ids(db) -> int:
+    """Assign line IDs to orders created before lines had them.
+
+    Only orders with an unnumbered line are touched, so running this on
+    every startup is cheap once the back-fill has completed.
+    """
+    updated = 0
+    for kind in RollupKind:
+        collection = order_collection(db, kind)
+        operations = []
+        cursor = collection.find(
+            {"items": {"$elemMatch": {"line_id": {"$exists": False}}}},
+            {"items": 1}
+        )
+        async for order in cursor:
+            operations.append(UpdateOne(
+                {"_id": order["_id"]},
+                {"$set": {"items": assign_line_ids(order["items"])}}
+            ))
+            if len(operations) >= BACKFILL_CHUNK_SIZE:
+                updated += (await collection.bulk_write(operations, ordered=False)).modified_count
+                operations = []
+        if operations:
+            updated += (await collection.bulk_write(operations, ordered=False)).modified_count
+    return updated
+
+
+async def _with_product_name(db, line: dict) -> dict:
+    if ObjectId.is_valid(line.get("product_id") or ""):
+        product = await db.products.find_one({"_id": ObjectId(line["product_id"])}, {"name": 1})
+        if product:
+            line["product_name"] = product.get("name")
+    return line
+
+
+async def _find_line(collection, order_id: ObjectId, line_id: str) -> Optional[dict]:
+    """Read one line without loading the rest of the items array."""
+    order = await collection.find_one(
+        {"_id": order_id, "items.line_id": line_id},
+        {"items": {"$elemMatch": {"line_id": line_id}}}
+    )
+    return order["items"][0] if order else None
+
+
+def _line_guard(line: dict) -> dict:
+    return {"$elemMatch": {"line_id": line["line_id"], **{f: line.get(f) for f in GUARD_FIELDS}}}
+
+
+async def _shared_products(collection, kind: RollupKind, order: dict, line_id: str, product_ids) -> set:
+    """Products that also appear on other lines of the order."""
+    if order.get("status") in ROLLUP_SPECS[kind]["excluded"]:
+        return set()
+    shared = set()
+    for product_id in {p for p in product_ids if p}:
+        if await collection.count_documents({
+            "_id": order["_id"],
+            "items": {"$elemMatch": {"product_id": product_id, "line_id": {"$ne": line_id}}},
+        }, limit=1):
+            shared.add(product_id)
+    return shared
+
+
+async def get_lines(db, kind: RollupKind, order_id: ObjectId, skip: int, limit: int) -> Optional[dict]:
+    """Return one page of an order's lines and the total line count."""
+    items = {"$ifNull": ["$items", []]}
+    pages = await order_collection(db, kind).aggregate([
+        {"$match": {"_id": order_id}},
+        {"$project": {
+            "_id": 0,
+            "total": {"$size": items},
+            "items": {"$slice": [items, max(skip, 0), max(limit, 1)]},
+        }},
+    ]).to_list(length=1)
+    return pages[0] if pages else None
+
+
+async def add_line(db, kind: RollupKind, order_id: ObjectId, line: dict, expected: Optional[int] = None):
+    """Append a line; return ``(order, line)`` or ``None`` if the order is missing."""
+    collection = order_collection(db, kind)
+    line = await _with_product_name(db, {**line, "line_id": new_line_id()})
+
+    order = await collection.find_one_and_update(
+        {"_id": order_id, **version_filter(expected)},
+        {
+            "$push": {"items": line},
+            "$inc": {"total_amount": line_amount(line), "version": 1},
+            "$set": {"updated_at": datetime.now()},
+        },
+        projection=HEADER_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if not order:
+        if expected is not None and await collection.count_documents({"_id": order_id}, limit=1):
+            raise version_conflict()
+        return None
+
+    shared = await _shared_products(collection, kind, order, line["line_id"], [line["product_id"]])
+    await apply_line_change(db, kind, order, None, line, shared)
+    return order, line
+
+
+async def update_line(
+    db,
+    kind: RollupKind,
+    order_id: ObjectId,
+    line_id: str,
+    changes: dict,
+    expected: Optional[int] = None
+):
+    """Change fields of one line; return ``(order, line)`` or ``None`` if it is missing."""
+    collection = order_collection(db, kind)
+    before = await _find_line(collection, order_id, line_id)
+    if not before:
+        return None
+    if "product_id" in changes:
+        changes = await _with_product_name(db, dict(changes))
+    after = {**before, **changes}
+
+    update = {"$set": {f"items.$.{field}": value for field, value in changes.items()}}
+    update["$set"]["updated_at"] = datetime.now()
+    update["$inc"] = {"total_amount": line_amount(after) - line_amount(before), "version": 1}
+    order = await collection.find_one_and_update(
+        {"_id": order_id, "items": _line_guard(before), **version_filter(expected)},
+        update,
+        projection=HEADER_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if not order:
+        raise version_conflict()
+
+    shared = await _shared_products(
+        collection, kind, order, line_id, [before.get("product_id"), after.get("product_id")]
+    )
+    await apply_line_change(db, kind, order, before, after, shared)
+    return order, after
+
+
+async def remove_line(db, kind: RollupKind, order_id: ObjectId, line_id: str, expected: Optional[int] = None):
+    """Remove one line; return the order header or ``None`` if the line is missing."""
+    collection = order_collection(db, kind)
+    before = await _find_line(collection, order_id, line_id)
+    if not before:
+        return None
+
+    order = await collection.find_one_and_update(
+        {"_id": order_id, "items": _line_guard(before), **version_filter(expected)},
+        {
+            "$pull": {"items": {"line_id": line_id}},
+            "$inc": {"total_amount": -line_amount(before), "version": 1},
+            "$set": {"updated_at": datetime.now()},
+        },
+        projection=HEADER_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if not order:
+        raise version_conflict()
+
+    shared = await _shared_products(collection, kind, order, line_id, [before.get("product_id")])
+    await apply_line_change(db, kind, order, before, None, shared)
+    return order
@@ -0,0 +1,174 @@
+"""Propagation of renamed products and partners into orders.
+
+Orders keep copies of ``product_name`` on their lines and of
+``customer_name``/``supplier_name`` on the header, so order reads never
+join. A rename records a pending task in ``name_propagations`` (keyed by
+the renamed document, so repeated renames collapse into the latest name)
+and returns; a background task then rewrites the stale copies in chunks
+of ``PROPAGATION_CHUNK_SIZE`` orders, lines through ``arrayFilters``, and
+relabels the matching rollup entries.
+
+Only documents whose copy differs from the new name are touched, so a task
+can safely be run twice. Rewritten orders get a new ``version``, so a client
+editing an order it loaded before the rename gets a version conflict instead
+of writing the old name back, and an order event is published for each of
+them so that open views reload. Tasks left behind by a failure or a restart are
+picked up by the ``name_propagation`` job.
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from ..config import PROPAGATION_CHUNK_SIZE
+from ..models.report import RollupDimension
+from .events import event_bus, order_event
+from .rollups import ROLLUP_SPECS, rollup_collection, rollup_id
+
+PRODUCT = "product"
+PARTNER = "partner"
+
+EVENT_PROJECTION = {"order_number": 1, "status": 1, "total_amount": 1, "updated_at": 1}
+
+
+async def update_in_chunks(collection, query: dict, update: dict, array_filters: Optional[list] = None,
+                           topic: Optional[str] = None) -> int:
+    """Apply ``update`` to the documents matching ``query``, a chunk at a time.
+
+    ``query`` must stop matching a document once it is updated. With
+    ``topic``, an order event is published for every document of a chunk.
+    """
+    modified = 0
+    while True:
+        ids = [
+            document["_id"]
+            async for document in collection.find(query, {"_id": 1}).limit(PROPAGATION_CHUNK_SIZE)
+        ]
+        if not ids:
+            break
+        result = await collection.update_many(
+            {"_id": {"$in": ids}, **query}, update, array_filters=array_filters
+        )
+        modified += result.modified_count
+        if topic:
+            async for order in collection.find({"_id": {"$in": ids}}, EVENT_PROJECTION):
+                event_bus.publish(topic, order_event(order))
+        if len(ids) < PROPAGATION_CHUNK_SIZE or result.modified_count == 0:
+            break
+        # Let request handlers in between chunks
+        await asyncio.sleep(0)
+    return modified
+
+
+async def propagate_product_name(db, product_id: str, name: str) -> int:
+    """Rewrite ``product_name`` on every order line of the product."""
+    modified = 0
+    for kind, spec in ROLLUP_SPECS.items():
+        modified += await update_in_chunks(
+            db[spec["orders"]],
+            {"items": {"$elemMatch": {"product_id": product_id, "product_name": {"$ne": name}}}},
+            {"$set": {"items.$[line].product_name": name}, "$inc": {"version": 1}},
+            array_filters=[{"line.product_id": product_id}],
+            topic=kind.value,
+        )
+        await rollup_collection(db, kind).update_one(
+            {"_id": rollup_id(RollupDimension.PRODUCT, product_id)}, {"$set": {"label": name}}
+        )
+    return modified
+
+
+async def propagate_partner_name(db, partner_id: str, name: str) -> int:
+    """Rewrite the customer/supplier name on every order of the partner."""
+    modified = 0
+    for kind, spec in ROLLUP_SPECS.items():
+        modified += await update_in_chunks(
+            db[spec["orders"]],
+            {spec["partner_id"]: partner_id, spec["partner_name"]: {"$ne": name}},
+            {"$set": {spec["partner_name"]: name}, "$inc": {"version": 1}},
+            topic=kind.value,
+        )
+        await rollup_collection(db, kind).update_one(
+            {"_id": rollup_id(RollupDimension.PARTNER, partner_id)}, {"$set": {"label": name}}
+        )
+    return modified
+
+
+PROPAGATORS = {
+    PRODUCT: propagate_product_name,
+    PARTNER: propagate_partner_name,
+}
+
+
+class NamePropagator:
+    """Runs pending propagation tasks in the background of this process."""
+
+    def __init__(self):
+        # One background task per database, so tenants drain independently
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._requested: Set[str] = set()
+
+    async def request(self, db, kind: str, entity_id: str, name: str):
+        """Record a rename and start propagating it after the response."""
+        await db.name_propagations.update_one(
+            {"_id": f"{kind}:{entity_id}"},
+            {"$set": {
+                "kind": kind,
+                "entity_id": entity_id,
+                "name": name,
+                "requested_at": datetime.now(),
+            }},
+            upsert=True
+        )
+        self._requested.add(db.name)
+        task = self._tasks.get(db.name)
+        if task is None or task.done():
+            self._tasks[db.name] = asyncio.create_task(self._drain_in_background(db))
+
+    async def _drain_in_background(self, db):
+        # Go round again if a rename was recorded after the last drain looked
+        while db.name in self._requested:
+            self._requested.discard(db.name)
+            try:
+                await self.drain(db)
+            except Exception:
+                # Failed tasks stay pending; the name_propagation job retries them
+                pass
+
+    async def drain(self, db) -> int:
+        """Run pending tasks until none are left; return the orders updated.
+
+        A failing task stays pending and does not hold up the others.
+        """
+        modified = 0
+        failed = []
+        while True:
+            task = await db.name_propagations.find_one(
+                {"_id": {"$nin": failed}}, sort=[("requested_at", 1)]
+            )
+            if task is None:
+                break
+            try:
+                modified += await PROPAGATORS[task["kind"]](db, task["entity_id"], task["name"])
+            except Exception as e:
+                print(f"Name propagation {task['_id']} failed: {e}")
+                failed.append(task["_id"])
+                continue
+            # A rename that arrived meanwhile bumped requested_at and stays queued
+            await db.name_propagations.delete_one(
+                {"_id": task["_id"], "requested_at": task["requested_at"]}
+            )
+        if failed:
+            raise RuntimeError(f"{len(failed)} name propagation task(s) failed")
+        return modified
+
+    async def stop(self):
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._tasks.clear()
+
+
+name_propagator = NamePropagator()
@@ -0,0 +1,246 @@
+"""Development-mode query tracing: N+1 detection and per-route query budgets.
+
+With ``QUERY_TRACE_ENABLED`` the middleware opens a trace for every request
+and keeps it in a context variable. Motor runs driver calls with a copy of
+the caller's context, so the MongoDB command listener can attribute every
+command to the request that issued it.
+
+Commands are grouped by shape: the command, the collection and the filter
+with its values blanked out, so ``find_one`` on ``products`` for one ID after
+another is a single shape seen many times. After the request:
+
+* shapes seen ``QUERY_REPEAT_THRESHOLD`` times or more are logged as
+  suspected N+1 queries;
+* requests slower than ``SLOW_REQUEST_MS`` log a span breakdown of where
+  their database time went;
+* the response carries ``X-Query-Count``, and a route that issues more
+  queries than its ``QUERY_BUDGETS`` entry is logged, or with
+  ``QUERY_BUDGET_ENFORCE`` (meant for test runs) answered with ``500``.
+
+Cursor continuations (``getMore``) are timed but not counted as queries.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+
+from ..config import (
+    QUERY_BUDGET_ENFORCE,
+    QUERY_BUDGETS,
+    QUERY_REPEAT_THRESHOLD,
+    SLOW_REQUEST_MS,
+)
+
+# Driver chatter that is not a query of the application
+IGNORED_COMMANDS = {
+    "hello", "isMaster", "ismaster", "ping", "buildInfo", "endSessions",
+    "killCursors", "saslStart", "saslContinue",
+}
+CONTINUATION_COMMANDS = {"getMore"}
+
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+
+current_trace: ContextVar[Optional["QueryTrace"]] = ContextVar("current_trace", default=None)
+
+
+def blank_values(value):
+    """Replace the values in a filter with ``?``, keeping fields and operators."""
+    if isinstance(value, dict):
+        return {key: blank_values(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [blank_values(item) for item in value]
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> str:
+    """Shape of a command: name, collection and blanked filter."""
+    collection = command.get(command_name)
+    target = collection if isinstance(collection, str) else "-"
+    if command_name in FILTER_FIELDS:
+        criteria = command.get(FILTER_FIELDS[command_name])
+    elif command_name in ("update", "delete"):
+        # Bulk writes share one shape per batch: the first statement's filter
+        statements = command.get(f"{command_name}s") or [{}]
+        criteria = statements[0].get("q")
+    else:
+        criteria = None
+    if criteria is None:
+        return f"{command_name} {target}"
+    return f"{command_name} {target} {json.dumps(blank_values(criteria), sort_keys=True)}"
+
+
+class QueryTrace:
+    """The MongoDB commands of one request.
+
+    Driver threads record into it concurrently, hence the lock.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.spans = []
+        self.counts = {}
+
+    @property
+    def query_count(self) -> int:
+        with self._lock:
+            return sum(self.counts.values())
+
+    def command_started(self, request_id: int, command_name: str, command: dict):
+        shape = command_shape(command_name, command)
+        offset_ms = (time.perf_counter() - self.started) * 1000
+        with self._lock:
+            self._pending[request_id] = (shape, offset_ms)
+            if command_name not in CONTINUATION_COMMANDS:
+                self.counts[shape] = self.counts.get(shape, 0) + 1
+
+    def command_finished(self, request_id: int, duration_micros: int, failed: bool = False):
+        with self._lock:
+            pending = self._pending.pop(request_id, None)
+            if pending:
+                shape, offset_ms = pending
+                self.spans.append({
+                    "shape": shape,
+                    "offset_ms": round(offset_ms, 1),
+                    "duration_ms": round(duration_micros / 1000, 1),
+                    "failed": failed,
+                })
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> dict:
+        """Shapes issued at least ``threshold`` times: likely N+1 loops."""
+        with self._lock:
+            return {shape: count for shape, count in self.counts.items() if count >= threshold}
+
+    def breakdown(self) -> list:
+        """Database time per shape, slowest first."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                entry = totals.setdefault(span["shape"], {"shape": span["shape"], "calls": 0, "total_ms": 0.0})
+                entry["calls"] += 1
+                entry["total_ms"] += span["duration_ms"]
+        return sorted(totals.values(), key=lambda entry: entry["total_ms"], reverse=True)
+
+
+class QueryTracer(monitoring.CommandListener):
+    """Command listener feeding the trace of the request in context."""
+
+    def started(self, event):
+        trace = current_trace.get()
+        if trace is not None and event.command_name not in IGNORED_COMMANDS:
+            trace.command_started(event.request_id, event.command_name, event.command)
+
+    def succeeded(self, event):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.command_finished(event.request_id, event.duration_micros)
+
+    def failed(self, event):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.command_finished(event.request_id, event.duration_micros, failed=True)
+
+
+query_tracer = QueryTracer()
+
+
+@contextmanager
+def untraced():
+    """Leave the enclosed work out of the current request's trace."""
+    token = current_trace.set(None)
+    try:
+        yield
+    finally:
+        current_trace.reset(token)
+
+
+def route_key(scope) -> str:
+    """``METHOD /path/template`` of the matched route, or the raw path."""
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+class QueryTraceMiddleware:
+    """ASGI middleware opening a query trace for every HTTP request."""
+
+    def __init__(self, app, budgets=QUERY_BUDGETS, enforce: bool = QUERY_BUDGET_ENFORCE,
+                 slow_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.budgets = dict(budgets)
+        self.enforce = enforce
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace = QueryTrace()
+        replaced = False
+
+        async def traced_send(message):
+            nonlocal replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                count = trace.query_count
+                budget = self.budgets.get(route_key(scope))
+                if self.enforce and budget is not None and count > budget:
+                    replaced = True
+                    return await self._over_budget(send, scope, trace, count, budget)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-query-count", str(count).encode())
+                ]
+            await send(message)
+
+        token = current_trace.set(trace)
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            current_trace.reset(token)
+            self._report(scope, trace)
+
+    def _report(self, scope, trace: QueryTrace):
+        route = route_key(scope)
+        elapsed_ms = (time.perf_counter() - trace.started) * 1000
+        for shape, count in trace.repeated().items():
+            print(f"N+1 suspected on {route}: {count}x {shape}")
+        budget = self.budgets.get(route)
+        if budget is not None and trace.query_count > budget:
+            print(f"Query budget exceeded on {route}: {trace.query_count} > {budget}")
+        if elapsed_ms >= self.slow_ms:
+            db_ms = sum(span["duration_ms"] for span in trace.spans)
+            lines = [f"Slow request {route}: {elapsed_ms:.0f} ms, {db_ms:.0f} ms in {len(trace.spans)} commands"]
+            for entry in trace.breakdown():
+                lines.append(f"  {entry['total_ms']:8.1f} ms  {entry['calls']:4d}x  {entry['shape']}")
+            print("\n".join(lines))
+
+    @staticmethod
+    async def _over_budget(send, scope, trace: QueryTrace, count: int, budget: int):
+        body = json.dumps({
+            "detail": "查询次数超出预算",
+            "route": route_key(scope),
+            "query_count": count,
+            "budget": budget,
+            "repeated": trace.repeated(threshold=2),
+        }, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 500,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-query-count", str(count).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
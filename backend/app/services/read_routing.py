@@ -0,0 +1,107 @@
+"""Read-your-writes for reads routed to secondaries.
+
+Listings and reports read through :func:`~app.database.get_read_database`,
+which prefers a secondary, so a client could miss its own write for as long
+as a secondary lags. To avoid that, every successful write response on a
+replica set carries a consistency token in ``CONSISTENCY_TOKEN_HEADER``. The
+token holds the primary's operation time, taken after the write, and the
+signed cluster time. A client that sends the token back with a read gets a
+causally consistent session advanced to that point. Secondary reads in that
+session wait until the secondary has applied the write. Reads without a
+token are not held up.
+
+Taking the token costs one extra round trip to the primary per write.
+Single-node deployments have no secondaries and no tokens.
+"""
+import base64
+import json
+
+import bson
+from bson.errors import BSONError
+
+from ..config import CONSISTENCY_TOKEN_HEADER
+from ..database import current_read_session, db, transactions_enabled
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def encode_token(operation_time, cluster_time) -> str:
+    document = {"operation_time": operation_time, "cluster_time": cluster_time}
+    return base64.urlsafe_b64encode(bson.encode(document)).decode()
+
+
+def decode_token(token: str) -> dict:
+    return bson.decode(base64.urlsafe_b64decode(token.encode()))
+
+
+async def write_token() -> str:
+    """Token for everything the primary has applied so far."""
+    async with await db.client.start_session(causal_consistency=True) as session:
+        await db.client.admin.command("ping", session=session)
+        if session.operation_time is None:
+            return ""
+        return encode_token(session.operation_time, session.cluster_time)
+
+
+class ReadConsistencyMiddleware:
+    """ASGI middleware issuing consistency tokens and honouring them on reads."""
+
+    def __init__(self, app, header: str = CONSISTENCY_TOKEN_HEADER):
+        self.app = app
+        self.header = header.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not transactions_enabled():
+            return await self.app(scope, receive, send)
+        if scope["method"] in READ_METHODS:
+            return await self._read(scope, receive, send)
+        return await self._write(scope, receive, send)
+
+    async def _read(self, scope, receive, send):
+        token = dict(scope["headers"]).get(self.header)
+        if not token:
+            return await self.app(scope, receive, send)
+        try:
+            point = decode_token(token.decode("latin-1"))
+            operation_time = point["operation_time"]
+        except (BSONError, KeyError, TypeError, ValueError):
+            return await self._send(send, 400, {"detail": "无效的一致性令牌"})
+
+        async with await db.client.start_session(causal_consistency=True) as session:
+            if point.get("cluster_time"):
+                session.advance_cluster_time(point["cluster_time"])
+            session.advance_operation_time(operation_time)
+            reset = current_read_session.set(session)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                current_read_session.reset(reset)
+
+    async def _write(self, scope, receive, send):
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                try:
+                    token = await write_token()
+                except Exception as e:
+                    print(f"Consistency token unavailable: {e}")
+                    token = ""
+                if token:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (self.header, token.encode())
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_token)
+
+    @staticmethod
+    async def _send(send, status_code: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,264 @@
+"""Incrementally maintained sales and purchase analytics rollups.
+
+Every order contributes to four rollup dimensions: the day and month of its
+order date, its partner (customer or supplier) and each product on its lines.
+Write paths call :func:`apply_order_change` with the order document before
+and after the change; only the difference is applied, as ``$inc`` upserts,
+so the cost of keeping the rollups current does not depend on order history.
+:func:`rebuild_rollups` recomputes everything from the order collections.
+"""
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from ..models.report import RollupDimension, RollupKind
+from ..models.purchase import PurchaseOrderStatus
+from ..models.sales import SalesOrderStatus
+from .aging import bump_aging_versions
+from .supplier_performance import record_order_change
+
+ROLLUP_SPECS = {
+    RollupKind.SALES: {
+        "orders": "sales_orders",
+        "rollups": "sales_rollups",
+        "partner_id": "customer_id",
+        "partner_name": "customer_name",
+        "excluded": [SalesOrderStatus.DRAFT.value, SalesOrderStatus.CANCELLED.value],
+    },
+    RollupKind.PURCHASES: {
+        "orders": "purchase_orders",
+        "rollups": "purchase_rollups",
+        "partner_id": "supplier_id",
+        "partner_name": "supplier_name",
+        "excluded": [PurchaseOrderStatus.DRAFT.value, PurchaseOrderStatus.CANCELLED.value],
+    },
+}
+
+DATE_FORMATS = {
+    RollupDimension.DAY: "%Y-%m-%d",
+    RollupDimension.MONTH: "%Y-%m",
+}
+
+METRICS = ("amount", "quantity", "order_count")
+
+
+def rollup_collection(db, kind: RollupKind):
+    """Return the rollup collection for ``kind``."""
+    return db[ROLLUP_SPECS[kind]["rollups"]]
+
+
+async def ensure_rollup_indexes(collection):
+    """Create the indexes the report queries rely on."""
+    await collection.create_index([("dimension", 1), ("key", 1)])
+    await collection.create_index([("dimension", 1), ("amount", -1)])
+
+
+def rollup_id(dimension: RollupDimension, key: str) -> str:
+    """Build the rollup document ID for a dimension key."""
+    return f"{dimension.value}:{key}"
+
+
+def order_contributions(kind: RollupKind, order: Optional[dict]) -> dict:
+    """Return what ``order`` adds to each rollup entry.
+
+    Drafts, cancelled orders and missing documents contribute nothing.
+    """
+    spec = ROLLUP_SPECS[kind]
+    if not order or order.get("status") in spec["excluded"]:
+        return {}
+
+    contributions = {}
+
+    def add(dimension, key, label, amount, quantity):
+        entry = contributions.setdefault((dimension, key), {
+            "label": label, "amount": 0.0, "quantity": 0, "order_count": 1,
+        })
+        entry["amount"] += amount
+        entry["quantity"] += quantity
+
+    items = order.get("items") or []
+    amount = order.get("total_amount") or 0.0
+    quantity = sum(item.get("quantity", 0) for item in items)
+
+    order_date = order.get("order_date") or order.get("created_at")
+    if order_date:
+        for dimension, fmt in DATE_FORMATS.items():
+            key = order_date.strftime(fmt)
+            add(dimension, key, key, amount, quantity)
+
+    partner_id = order.get(spec["partner_id"])
+    if partner_id:
+        add(RollupDimension.PARTNER, partner_id, order.get(spec["partner_name"]), amount, quantity)
+
+    for item in items:
+        if item.get("product_id"):
+            line_quantity = item.get("quantity", 0)
+            add(
+                RollupDimension.PRODUCT,
+                item["product_id"],
+                item.get("product_name"),
+                line_quantity * item.get("unit_price", 0.0),
+                line_quantity,
+            )
+    return contributions
+
+
+async def apply_order_change(db, kind: RollupKind, before: Optional[dict], after: Optional[dict]):
+    """Apply the rollup delta between two versions of an order.
+
+    Pass ``before=None`` for a newly created order and ``after=None`` for a
+    deleted one. Cached receivables/payables aging of the order's partner is
+    invalidated along the way, and purchase receipts feed the supplier
+    performance stats.
+    """
+    old = order_contributions(kind, before)
+    new = order_contributions(kind, after)
+
+    operations = []
+    for dimension, key in old.keys() | new.keys():
+        previous = old.get((dimension, key), {})
+        current = new.get((dimension, key), {})
+        delta = {m: current.get(m, 0) - previous.get(m, 0) for m in METRICS}
+        label = current.get("label")
+        if not any(delta.values()) and (label is None or label == previous.get("label")):
+            continue
+
+        update = {
+            "$inc": delta,
+            "$setOnInsert": {"dimension": dimension.value, "key": key},
+        }
+        if label is not None:
+            update["$set"] = {"label": label}
+        operations.append(UpdateOne({"_id": rollup_id(dimension, key)}, update, upsert=True))
+
+    if operations:
+        await rollup_collection(db, kind).bulk_write(operations, ordered=False)
+    await bump_aging_versions(db, kind, before, after)
+    if kind == RollupKind.PURCHASES:
+        await record_order_change(db, before, after)
+
+
+async def apply_line_change(
+    db,
+    kind: RollupKind,
+    order: dict,
+    before_line: Optional[dict],
+    after_line: Optional[dict],
+    shared_products=()
+):
+    """Apply the rollup delta of adding, changing or removing one order line.
+
+    ``order`` is the order after the change, without its items. Products in
+    ``shared_products`` also appear on other lines of the order, so the
+    change leaves their order count alone.
+    """
+    def amount(line):
+        return line.get("quantity", 0) * line.get("unit_price", 0.0) if line else 0.0
+
+    # Zero-quantity placeholders keep shared products counted on both sides
+    placeholders = [{"product_id": p, "quantity": 0, "unit_price": 0.0} for p in shared_products]
+    total = order.get("total_amount") or 0.0
+    before = {
+        **order,
+        "total_amount": total - amount(after_line) + amount(before_line),
+        "items": ([before_line] if before_line else []) + placeholders,
+    }
+    after = {**order, "items": ([after_line] if after_line else []) + placeholders}
+    await apply_order_change(db, kind, before, after)
+
+
+def _rebuild_pipelines(kind: RollupKind) -> list:
+    """Aggregation pipelines recomputing every rollup dimension of ``kind``."""
+    spec = ROLLUP_SPECS[kind]
+    match = {"$match": {"status": {"$nin": spec["excluded"]}}}
+    order_date = {"$ifNull": ["$order_date", "$created_at"]}
+
+    def header_pipeline(dimension, key_expr, label_expr):
+        return [
+            match,
+            # $sum over an array only adds its elements outside of $group
+            {"$addFields": {"_quantity": {"$sum": "$items.quantity"}}},
+            {"$group": {
+                "_id": key_expr,
+                "label": {"$last": label_expr},
+                "amount": {"$sum": "$total_amount"},
+                "quantity": {"$sum": "$_quantity"},
+                "order_count": {"$sum": 1},
+            }},
+            {"$match": {"_id": {"$ne": None}}},
+            {"$project": {
+                "_id": {"$concat": [f"{dimension.value}:", "$_id"]},
+                "dimension": dimension.value,
+                "key": "$_id",
+                "label": 1, "amount": 1, "quantity": 1, "order_count": 1,
+            }},
+        ]
+
+    pipelines = []
+    for dimension, fmt in DATE_FORMATS.items():
+        key_expr = {"$dateToString": {"format": fmt, "date": order_date}}
+        pipelines.append(header_pipeline(dimension, key_expr, key_expr))
+    pipelines.append(header_pipeline(
+        RollupDimension.PARTNER, f"${spec['partner_id']}", f"${spec['partner_name']}"
+    ))
+    pipelines.append([
+        match,
+        {"$unwind": "$items"},
+        # Collapse repeated lines of one product within an order first, so
+        # order_count counts orders rather than lines
+        {"$group": {
+            "_id": {"order": "$_id", "product": "$items.product_id"},
+            "label": {"$last": "$items.product_name"},
+            "amount": {"$sum": {"$multiply": ["$items.quantity", "$items.unit_price"]}},
+            "quantity": {"$sum": "$items.quantity"},
+        }},
+        {"$group": {
+            "_id": "$_id.product",
+            "label": {"$last": "$label"},
+            "amount": {"$sum": "$amount"},
+            "quantity": {"$sum": "$quantity"},
+            "order_count": {"$sum": 1},
+        }},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$project": {
+            "_id": {"$concat": [f"{RollupDimension.PRODUCT.value}:", "$_id"]},
+            "dimension": RollupDimension.PRODUCT.value,
+            "key": "$_id",
+            "label": 1, "amount": 1, "quantity": 1, "order_count": 1,
+        }},
+    ])
+    return pipelines
+
+
+async def rebuild_rollups(db, kind: RollupKind) -> int:
+    """Recompute all rollups of ``kind`` from the order collection.
+
+    The results are merged server-side into a staging collection, which then
+    atomically replaces the live one, so readers never see a partial rebuild.
+    Incremental updates landing while the rebuild runs are overwritten; the
+    next incremental change or rebuild corrects them.
+    """
+    spec = ROLLUP_SPECS[kind]
+    staging_name = f"{spec['rollups']}_rebuild"
+    staging = db[staging_name]
+    await staging.drop()
+
+    orders = db[spec["orders"]]
+    for pipeline in _rebuild_pipelines(kind):
+        pipeline = pipeline + [{"$merge": {"into": staging_name, "whenMatched": "replace"}}]
+        async for _ in orders.aggregate(pipeline):
+            pass
+
+    entries = await staging.count_documents({})
+    if entries == 0:
+        await rollup_collection(db, kind).delete_many({})
+        return 0
+
+    await ensure_rollup_indexes(staging)
+    await staging.rename(spec["rollups"], dropTarget=True)
+    return entries
+
+
+async def rebuild_all_rollups(db) -> dict:
+    """Rebuild the rollups of every kind."""
+    return {kind: await rebuild_rollups(db, kind) for kind in RollupKind}
@@ -0,0 +1,342 @@
+"""In-process asyncio job scheduler.
+
+Jobs run on interval or cron-like schedules inside the API process, bounded
+by a concurrency limit so periodic work never starves request handling.
+When several workers share a database, a lease document in Mongo elects one
+leader; jobs marked ``leader_only`` (the default) run on the leader only, so
+each runs once per deployment. Per-process jobs such as cache warming set
+``leader_only=False``.
+"""
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+LEASE_ID = "scheduler"
+
+CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 6),
+)
+
+
+class IntervalSchedule:
+    """Run every ``seconds`` seconds."""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        self.seconds = seconds
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f"every {self.seconds}s"
+
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day month weekday.
+
+    Fields accept ``*``, numbers, ranges (``1-5``), lists (``1,15``) and
+    steps (``*/10``, ``0-30/5``). Weekday 0 and 7 are Sunday. As in cron, a
+    restricted day and weekday match when either one does.
+    """
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != len(CRON_FIELDS):
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.fields = {}
+        for part, (name, low, high) in zip(parts, CRON_FIELDS):
+            if name == "weekday":
+                values = {v % 7 for v in self._parse_field(part, low, 7)}
+            else:
+                values = self._parse_field(part, low, high)
+            self.fields[name] = values
+        self.day_restricted = parts[2] != "*"
+        self.weekday_restricted = parts[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        values = set()
+        for chunk in field.split(","):
+            step = 1
+            if "/" in chunk:
+                chunk, step_text = chunk.split("/", 1)
+                step = int(step_text)
+            if chunk == "*":
+                start, end = low, high
+            elif "-" in chunk:
+                start, end = (int(v) for v in chunk.split("-", 1))
+            else:
+                start = int(chunk)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"invalid cron field: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.fields["day"]
+        weekday_ok = (moment.weekday() + 1) % 7 in self.fields["weekday"]
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.fields["month"]:
+                year = candidate.year + (candidate.month == 12)
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.fields["hour"]:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.fields["minute"]:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"cron expression never fires: {self.expression!r}")
+
+    def __str__(self):
+        return f"cron {self.expression}"
+
+
+class Job:
+    """A scheduled coroutine and its run-time metrics."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        schedule,
+        jitter: float = 0.0,
+        leader_only: bool = True,
+        timeout: Optional[float] = None
+    ):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.jitter = jitter
+        self.leader_only = leader_only
+        self.timeout = timeout
+        self.next_run: Optional[datetime] = None
+        self.running = False
+        self.forced = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.total_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def plan_next(self, moment: datetime):
+        """Compute the next run time, spread by the configured jitter."""
+        delay = random.uniform(0, self.jitter) if self.jitter else 0.0
+        self.next_run = self.schedule.next_after(moment) + timedelta(seconds=delay)
+
+    def snapshot(self) -> dict:
+        """Return the job's schedule and metrics."""
+        return {
+            "name": self.name,
+            "schedule": str(self.schedule),
+            "leader_only": self.leader_only,
+            "running": self.running,
+            "next_run": self.next_run,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_started_at": self.last_started_at,
+            "last_duration_ms": self.last_duration_ms,
+            "avg_duration_ms": round(self.total_duration_ms / self.runs, 1) if self.runs else None,
+            "max_duration_ms": self.max_duration_ms if self.runs else None,
+            "last_error": self.last_error,
+        }
+
+
+class JobScheduler:
+    """Runs registered jobs from the application lifespan."""
+
+    def __init__(self, max_concurrency: int = 2, lease_ttl: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.lease_ttl = lease_ttl
+        self.worker_id = self._new_worker_id()
+        self.jobs: dict = {}
+        self.is_leader = False
+        self._db = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: set = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._lease_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @staticmethod
+    def _new_worker_id() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        *,
+        interval: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0.0,
+        leader_only: bool = True,
+        timeout: Optional[float] = None,
+        run_at_start: bool = False
+    ) -> Job:
+        """Register a job on an interval (seconds) or cron schedule."""
+        if (interval is None) == (cron is None):
+            raise ValueError("exactly one of interval or cron is required")
+        schedule = IntervalSchedule(interval) if interval is not None else CronSchedule(cron)
+        job = Job(name, func, schedule, jitter, leader_only, timeout)
+        if run_at_start:
+            job.next_run = datetime.now() + timedelta(seconds=random.uniform(0, jitter) if jitter else 0)
+        else:
+            job.plan_next(datetime.now())
+        self.jobs[name] = job
+        if self._wakeup:
+            self._wakeup.set()
+        return job
+
+    async def start(self, db):
+        """Start the scheduling and leader-election loops."""
+        # Worker processes may be forked after import; identify this process
+        self.worker_id = self._new_worker_id()
+        self._db = db
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._wakeup = asyncio.Event()
+        await self._renew_lease()
+        self._lease_task = asyncio.create_task(self._lease_loop())
+        self._loop_task = asyncio.create_task(self._run_loop())
+        print(f"Scheduler started: {len(self.jobs)} jobs, worker {self.worker_id}")
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop scheduling, wait for running jobs, then release the lease."""
+        for task in (self._loop_task, self._lease_task):
+            if task:
+                task.cancel()
+        if self._tasks:
+            done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        if self.is_leader and self._db is not None:
+            await self._db.scheduler_leases.delete_one(
+                {"_id": LEASE_ID, "holder": self.worker_id}
+            )
+            self.is_leader = False
+        print("Scheduler stopped")
+
+    def trigger(self, name: str):
+        """Run a job as soon as possible on this worker, leader or not."""
+        job = self.jobs[name]
+        job.forced = True
+        job.next_run = datetime.now()
+        if self._wakeup:
+            self._wakeup.set()
+
+    def status(self) -> list:
+        """Return every job's schedule and metrics."""
+        return [job.snapshot() for job in self.jobs.values()]
+
+    async def _renew_lease(self):
+        """Acquire or extend the leader lease."""
+        now = datetime.now()
+        try:
+            lease = await self._db.scheduler_leases.find_one_and_update(
+                {"_id": LEASE_ID, "$or": [
+                    {"holder": self.worker_id},
+                    {"expires_at": {"$lt": now}},
+                ]},
+                {"$set": {
+                    "holder": self.worker_id,
+                    "expires_at": now + timedelta(seconds=self.lease_ttl),
+                }},
+                upsert=True
+            )
+            acquired = True
+            if lease is None or lease.get("holder") != self.worker_id:
+                print(f"Scheduler lease acquired by {self.worker_id}")
+        except DuplicateKeyError:
+            # The lease exists and is held by another live worker
+            acquired = False
+        except Exception as e:
+            print(f"Scheduler lease renewal failed: {e}")
+            acquired = False
+        self.is_leader = acquired
+
+    async def _lease_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            await self._renew_lease()
+
+    async def _run_loop(self):
+        while True:
+            now = datetime.now()
+            for job in self.jobs.values():
+                if job.next_run is None or job.next_run > now:
+                    continue
+                if job.running or (job.leader_only and not self.is_leader and not job.forced):
+                    job.skipped += 1
+                    job.plan_next(now)
+                    continue
+                job.running = True
+                job.forced = False
+                task = asyncio.create_task(self._run_job(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            upcoming = [job.next_run for job in self.jobs.values() if job.next_run and not job.running]
+            delay = min((t - datetime.now()).total_seconds() for t in upcoming) if upcoming else 60.0
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, min(delay, 60.0)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job: Job):
+        async with self._semaphore:
+            job.last_started_at = datetime.now()
+            started = time.perf_counter()
+            try:
+                if job.timeout:
+                    await asyncio.wait_for(job.func(), timeout=job.timeout)
+                else:
+                    await job.func()
+                job.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.failures += 1
+                job.last_error = f"{type(e).__name__}: {e}"
+                print(f"Job {job.name} failed: {job.last_error}")
+            finally:
+                elapsed = round((time.perf_counter() - started) * 1000, 1)
+                job.runs += 1
+                job.last_duration_ms = elapsed
+                job.total_duration_ms += elapsed
+                job.max_duration_ms = max(job.max_duration_ms, elapsed)
+                job.running = False
+                job.plan_next(datetime.now())
+                if self._wakeup:
+                    self._wakeup.set()
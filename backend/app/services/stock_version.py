@@ -0,0 +1,26 @@
+"""Stock-change version counter.
+
+Every write that changes stock quantities or costs bumps a single counter
+document. Derived results such as valuations are cached against the version
+they were computed at, and stay valid for as long as it does not move.
+"""
+from pymongo import ReturnDocument
+
+STOCK_VERSION_ID = "stock_version"
+
+
+async def get_stock_version(db) -> int:
+    """Return the current stock-change version."""
+    counter = await db.counters.find_one({"_id": STOCK_VERSION_ID})
+    return counter.get("value", 0) if counter else 0
+
+
+async def bump_stock_version(db) -> int:
+    """Advance the stock-change version and return the new value."""
+    counter = await db.counters.find_one_and_update(
+        {"_id": STOCK_VERSION_ID},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["value"]
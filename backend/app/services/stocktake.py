@@ -0,0 +1,304 @@
+"""Stocktake (cycle count) sessions.
+
+Opening a session freezes the inventory rows in its scope: each row is
+tagged with the session ID and stock movements on tagged rows are refused
+until the session is posted or cancelled. The system quantities are then
+snapshotted into ``stocktake_lines``, so counts uploaded over hours are
+compared with one consistent picture of the stock.
+
+Counts arrive in bulk and are stored on the snapshot lines. Differences are
+computed for the whole snapshot at once with NumPy, and posting writes every
+variance as a signed ADJUST ledger record with one bulk write per
+collection, inside a transaction when the deployment supports one.
+"""
+import csv
+import io
+import re
+import uuid
+from datetime import datetime
+from typing import List
+
+import numpy as np
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+
+from ..database import transactions_enabled
+from ..models.inventory import InventoryOperationType
+from ..models.stocktake import StocktakeCreate, StocktakeStatus
+from ..utils.concurrency import version_conflict
+
+LINE_FIELDS = ("inventory_id", "product_id", "warehouse", "batch_number", "location")
+
+
+def generate_stocktake_number() -> str:
+    """Generate unique stocktake number."""
+    return f"ST{datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:4].upper()}"
+
+
+# Movement filters carry this so that a row claimed after it was read is not written
+NOT_FROZEN = {"stocktake_id": {"$exists": False}}
+
+
+def frozen_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="库存盘点中，暂停出入库"
+    )
+
+
+def ensure_not_frozen(inventory: dict):
+    """Refuse stock movements on rows that are being counted."""
+    if inventory.get("stocktake_id"):
+        raise frozen_conflict()
+
+
+def _scope_query(request: StocktakeCreate) -> dict:
+    query = {}
+    if request.warehouse:
+        query["warehouse"] = request.warehouse
+    if request.location:
+        query["location"] = {"$regex": f"^{re.escape(request.location)}"}
+    if request.product_id:
+        query["product_id"] = request.product_id
+    return query
+
+
+async def open_stocktake(db, request: StocktakeCreate) -> dict:
+    """Freeze the rows in scope and snapshot their quantities."""
+    scope = _scope_query(request)
+    if await db.inventory.count_documents({**scope, "stocktake_id": {"$exists": True}}, limit=1):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="部分库存已在其他盘点中"
+        )
+
+    now = datetime.now()
+    session = {
+        "_id": ObjectId(),
+        "stocktake_number": generate_stocktake_number(),
+        "warehouse": request.warehouse,
+        "location": request.location,
+        "product_id": request.product_id,
+        "status": StocktakeStatus.OPEN.value,
+        "line_count": 0,
+        "counted_count": 0,
+        "operator": request.operator,
+        "remark": request.remark,
+        "created_at": now,
+        "posted_at": None,
+    }
+    stocktake_id = str(session["_id"])
+
+    # Claim first, then snapshot: claimed rows no longer move, so the
+    # snapshot cannot race with a movement
+    claimed = await db.inventory.update_many(
+        {**scope, "stocktake_id": {"$exists": False}},
+        {"$set": {"stocktake_id": stocktake_id}}
+    )
+    if claimed.modified_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="没有可盘点的库存"
+        )
+
+    lines = []
+    async for row in db.inventory.find({"stocktake_id": stocktake_id}):
+        lines.append({
+            "stocktake_id": stocktake_id,
+            "inventory_id": str(row["_id"]),
+            "product_id": row.get("product_id"),
+            "warehouse": row.get("warehouse"),
+            "batch_number": row.get("batch_number"),
+            "location": row.get("location"),
+            "system_quantity": row.get("quantity", 0),
+            "counted_quantity": None,
+            "counted_at": None,
+        })
+    await db.stocktake_lines.insert_many(lines)
+    session["line_count"] = len(lines)
+    await db.stocktakes.insert_one(session)
+    return session
+
+
+async def get_open_stocktake(db, stocktake_id: str) -> dict:
+    """Return an open session or raise the matching HTTP error."""
+    if not ObjectId.is_valid(stocktake_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的盘点ID"
+        )
+    session = await db.stocktakes.find_one({"_id": ObjectId(stocktake_id)})
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="盘点不存在"
+        )
+    if session.get("status") != StocktakeStatus.OPEN.value:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"盘点已结束，当前状态: {session.get('status')}"
+        )
+    return session
+
+
+def parse_counts_csv(content: bytes) -> List[dict]:
+    """Read ``inventory_id,counted_quantity`` rows from an uploaded CSV."""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CSV 文件需使用 UTF-8 编码"
+        )
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {"inventory_id", "counted_quantity"} <= set(reader.fieldnames):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CSV 文件需包含 inventory_id 和 counted_quantity 列"
+        )
+    counts = []
+    for line_number, row in enumerate(reader, start=2):
+        try:
+            quantity = int(row["counted_quantity"])
+        except (TypeError, ValueError):
+            quantity = -1
+        if quantity < 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"第 {line_number} 行盘点数量无效"
+            )
+        counts.append({"inventory_id": (row["inventory_id"] or "").strip(), "counted_quantity": quantity})
+    return counts
+
+
+async def record_counts(db, session: dict, counts: List[dict]) -> dict:
+    """Store counted quantities on the snapshot lines; later uploads overwrite."""
+    stocktake_id = str(session["_id"])
+    known = set(await db.stocktake_lines.distinct("inventory_id", {"stocktake_id": stocktake_id}))
+    now = datetime.now()
+    # The last count for a row wins
+    latest = {count["inventory_id"]: count["counted_quantity"] for count in counts}
+    unknown = [inventory_id for inventory_id in latest if inventory_id not in known]
+    operations = [
+        UpdateOne(
+            {"stocktake_id": stocktake_id, "inventory_id": inventory_id},
+            {"$set": {"counted_quantity": quantity, "counted_at": now}}
+        )
+        for inventory_id, quantity in latest.items() if inventory_id in known
+    ]
+    if operations:
+        await db.stocktake_lines.bulk_write(operations, ordered=False)
+    counted = await db.stocktake_lines.count_documents(
+        {"stocktake_id": stocktake_id, "counted_quantity": {"$ne": None}}
+    )
+    await db.stocktakes.update_one({"_id": session["_id"]}, {"$set": {"counted_count": counted}})
+    return {"accepted": len(operations), "unknown_inventory_ids": unknown}
+
+
+async def load_lines(db, stocktake_id: str) -> List[dict]:
+    projection = {field: 1 for field in LINE_FIELDS + ("system_quantity", "counted_quantity")}
+    return await db.stocktake_lines.find(
+        {"stocktake_id": stocktake_id}, {**projection, "_id": 0}
+    ).sort("inventory_id", 1).to_list(length=None)
+
+
+def compute_variances(lines: List[dict]) -> dict:
+    """Diff counted against frozen system quantities for the whole snapshot.
+
+    Uncounted lines are reported but produce no variance.
+    """
+    system = np.fromiter((line.get("system_quantity") or 0 for line in lines), dtype=np.int64, count=len(lines))
+    counted_raw = np.fromiter(
+        (np.nan if line.get("counted_quantity") is None else line["counted_quantity"] for line in lines),
+        dtype=np.float64, count=len(lines)
+    )
+    counted_mask = ~np.isnan(counted_raw)
+    counted = np.where(counted_mask, counted_raw, system).astype(np.int64)
+    variance = counted - system
+    changed = np.flatnonzero(variance)
+
+    return {
+        "line_count": len(lines),
+        "counted_count": int(counted_mask.sum()),
+        "uncounted_count": int((~counted_mask).sum()),
+        "variance_count": int(len(changed)),
+        "total_gain": int(variance[variance > 0].sum()),
+        "total_loss": int(-variance[variance < 0].sum()),
+        "variances": [
+            {
+                **{field: lines[i].get(field) for field in LINE_FIELDS},
+                "system_quantity": int(system[i]),
+                "counted_quantity": int(counted[i]),
+                "variance": int(variance[i]),
+            }
+            for i in changed
+        ],
+    }
+
+
+async def _release_rows(db, stocktake_id: str, session=None):
+    await db.inventory.update_many(
+        {"stocktake_id": stocktake_id}, {"$unset": {"stocktake_id": ""}}, session=session
+    )
+
+
+async def post_stocktake(db, session: dict) -> dict:
+    """Post every variance as an ADJUST record and unfreeze the rows."""
+    stocktake_id = str(session["_id"])
+    report = compute_variances(await load_lines(db, stocktake_id))
+    now = datetime.now()
+    remark = f"盘点 {session['stocktake_number']}"
+
+    async def apply(transaction=None):
+        # Status guard: a concurrent post or cancel of the same session loses
+        claimed = await db.stocktakes.update_one(
+            {"_id": session["_id"], "status": StocktakeStatus.OPEN.value},
+            {"$set": {"status": StocktakeStatus.POSTED.value, "posted_at": now}},
+            session=transaction
+        )
+        if claimed.modified_count == 0:
+            raise version_conflict()
+        if report["variances"]:
+            await db.inventory.bulk_write([
+                UpdateOne(
+                    {"_id": ObjectId(line["inventory_id"]), "stocktake_id": stocktake_id},
+                    {"$inc": {"quantity": line["variance"]}, "$set": {"updated_at": now}}
+                )
+                for line in report["variances"]
+            ], ordered=False, session=transaction)
+            await db.inventory_records.insert_many([
+                {
+                    "product_id": line["product_id"],
+                    "inventory_id": line["inventory_id"],
+                    "operation_type": InventoryOperationType.ADJUST.value,
+                    "quantity": line["variance"],
+                    "batch_number": line["batch_number"],
+                    "stocktake_id": stocktake_id,
+                    "operator": session.get("operator"),
+                    "remark": remark,
+                    "created_at": now,
+                }
+                for line in report["variances"]
+            ], session=transaction)
+        await _release_rows(db, stocktake_id, transaction)
+
+    if transactions_enabled():
+        async with await db.client.start_session() as transaction:
+            await transaction.with_transaction(apply)
+    else:
+        await apply()
+    return report
+
+
+async def cancel_stocktake(db, session: dict) -> dict:
+    """Discard the counts and unfreeze the rows."""
+    stocktake_id = str(session["_id"])
+    result = await db.stocktakes.update_one(
+        {"_id": session["_id"], "status": StocktakeStatus.OPEN.value},
+        {"$set": {"status": StocktakeStatus.CANCELLED.value}}
+    )
+    if result.modified_count == 0:
+        raise version_conflict()
+    await _release_rows(db, stocktake_id)
+    return await db.stocktakes.find_one({"_id": session["_id"]})
@@ -0,0 +1,230 @@
+"""Supplier lead-time, on-time and fill-rate metrics.
+
+A receipt is a rise in a purchase line's ``received_quantity``, whether it
+comes through a line edit or a whole-order update. Write paths already report
+every order change to :func:`~app.services.rollups.apply_order_change`, which
+passes purchase orders on to :func:`record_order_change`. That function
+diffs the lines, logs each receipt with its timestamp in ``purchase_receipts``
+and applies running totals to one stats document per supplier and one per
+supplier and product:
+
+* lead time in days from order date to receipt: count, sum, sum of squares,
+  min, max and a histogram of whole days (capped at ``LEAD_TIME_MAX_DAYS``)
+  from which the percentiles are read;
+* receipts due by an expected date, and how many arrived on or before it;
+* fill rate of completed orders: ordered against received quantity, and
+  lines received in full. Like the rollups, this part is applied as the
+  difference between the order's contribution before and after the change,
+  so reopening or editing a completed order corrects it.
+
+Everything is ``$inc``/``$min``/``$max`` upserts, so a lookup is a single
+document read by ID whatever the purchase history.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import InsertOne, UpdateOne
+
+from ..config import LEAD_TIME_MAX_DAYS
+from ..models.purchase import PurchaseOrderStatus
+
+STATS = "supplier_performance"
+RECEIPTS = "purchase_receipts"
+
+FILL_METRICS = ("ordered_quantity", "filled_quantity", "closed_lines", "filled_lines")
+PERCENTILES = (50, 90, 95)
+
+
+def stats_id(supplier_id: str, product_id: Optional[str] = None) -> str:
+    if product_id:
+        return f"supplier:{supplier_id}:product:{product_id}"
+    return f"supplier:{supplier_id}"
+
+
+def _lines_by_id(order: Optional[dict]) -> dict:
+    return {
+        line.get("line_id") or line.get("product_id"): line
+        for line in (order or {}).get("items") or []
+        if line.get("product_id")
+    }
+
+
+def fill_contributions(order: Optional[dict]) -> dict:
+    """What a completed order adds to each fill-rate total.
+
+    Keyed by ``(supplier_id, product_id)``, with ``None`` for the supplier's
+    overall totals.
+    """
+    if not order or order.get("status") != PurchaseOrderStatus.COMPLETED.value or not order.get("supplier_id"):
+        return {}
+    supplier_id = order["supplier_id"]
+    contributions = {}
+    for line in _lines_by_id(order).values():
+        ordered = line.get("quantity") or 0
+        filled = min(line.get("received_quantity") or 0, ordered)
+        for key in ((supplier_id, None), (supplier_id, line["product_id"])):
+            entry = contributions.setdefault(key, dict.fromkeys(FILL_METRICS, 0))
+            entry["ordered_quantity"] += ordered
+            entry["filled_quantity"] += filled
+            entry["closed_lines"] += 1
+            entry["filled_lines"] += 1 if filled >= ordered else 0
+    return contributions
+
+
+def receipts(before: Optional[dict], after: Optional[dict]) -> list:
+    """Lines of ``after`` whose received quantity went up, with the increase."""
+    if not after:
+        return []
+    previous = _lines_by_id(before)
+    received = []
+    for key, line in _lines_by_id(after).items():
+        old = (previous.get(key) or {}).get("received_quantity") or 0
+        increase = (line.get("received_quantity") or 0) - old
+        if increase > 0:
+            received.append((line, increase))
+    return received
+
+
+def lead_time_days(order: dict, received_at: datetime) -> Optional[float]:
+    ordered_at = order.get("order_date") or order.get("created_at")
+    if not ordered_at:
+        return None
+    return max((received_at - ordered_at).total_seconds() / 86400, 0.0)
+
+
+def on_time(order: dict, received_at: datetime) -> Optional[bool]:
+    """Whether a receipt met the expected date (any time that day), if one was set."""
+    expected = order.get("expected_date")
+    if not expected:
+        return None
+    due = datetime.combine(expected.date(), datetime.min.time()) + timedelta(days=1)
+    return received_at < due
+
+
+def _receipt_update(supplier_id: str, product: Optional[dict], quantity: int,
+                    lead_days: Optional[float], met: Optional[bool], received_at: datetime) -> dict:
+    inc = {"receipts": 1, "received_quantity": quantity}
+    update = {
+        "$inc": inc,
+        "$max": {"last_received_at": received_at},
+        "$setOnInsert": {
+            "supplier_id": supplier_id,
+            "product_id": product["product_id"] if product else None,
+        },
+    }
+    if product and product.get("product_name"):
+        update["$set"] = {"product_name": product["product_name"]}
+    if met is not None:
+        inc["due_receipts"] = 1
+        inc["on_time_receipts"] = 1 if met else 0
+    if lead_days is not None:
+        inc.update({
+            "lead_days_count": 1,
+            "lead_days_sum": lead_days,
+            "lead_days_sq_sum": lead_days * lead_days,
+            f"lead_days_hist.{min(int(lead_days), LEAD_TIME_MAX_DAYS)}": 1,
+        })
+        update["$min"] = {"lead_days_min": lead_days}
+        update["$max"]["lead_days_max"] = lead_days
+    return update
+
+
+async def record_order_change(db, before: Optional[dict], after: Optional[dict]):
+    """Log the receipts of a purchase order change and update supplier stats."""
+    supplier_id = (after or {}).get("supplier_id")
+    received_at = datetime.now()
+    operations = []
+    log = []
+
+    if supplier_id:
+        for line, quantity in receipts(before, after):
+            lead_days = lead_time_days(after, received_at)
+            met = on_time(after, received_at)
+            log.append(InsertOne({
+                "order_id": after["_id"],
+                "line_id": line.get("line_id"),
+                "supplier_id": supplier_id,
+                "product_id": line["product_id"],
+                "quantity": quantity,
+                "received_at": received_at,
+                "lead_time_days": lead_days,
+                "on_time": met,
+            }))
+            for product in (None, line):
+                operations.append(UpdateOne(
+                    {"_id": stats_id(supplier_id, product and product["product_id"])},
+                    _receipt_update(supplier_id, product, quantity, lead_days, met, received_at),
+                    upsert=True
+                ))
+
+    old, new = fill_contributions(before), fill_contributions(after)
+    for key in old.keys() | new.keys():
+        delta = {m: new.get(key, {}).get(m, 0) - old.get(key, {}).get(m, 0) for m in FILL_METRICS}
+        if any(delta.values()):
+            operations.append(UpdateOne(
+                {"_id": stats_id(*key)},
+                {"$inc": delta, "$setOnInsert": {"supplier_id": key[0], "product_id": key[1]}},
+                upsert=True
+            ))
+
+    if log:
+        await db[RECEIPTS].bulk_write(log, ordered=False)
+    if operations:
+        await db[STATS].bulk_write(operations, ordered=False)
+
+
+def histogram_percentile(histogram: dict, count: int, percentile: int) -> Optional[int]:
+    """Smallest whole-day lead time covering ``percentile`` percent of receipts."""
+    if not count:
+        return None
+    target = count * percentile / 100
+    seen = 0
+    for day in sorted(int(d) for d in histogram):
+        seen += histogram[str(day)]
+        if seen >= target:
+            return day
+    return None
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def performance_helper(stats: Optional[dict], supplier_id: str, supplier_name: Optional[str] = None,
+                       product_id: Optional[str] = None) -> dict:
+    """Convert a stats document (or its absence) to response format."""
+    stats = stats or {}
+    count = stats.get("lead_days_count", 0)
+    mean = stats.get("lead_days_sum", 0.0) / count if count else None
+    stddev = None
+    if count:
+        stddev = max(stats.get("lead_days_sq_sum", 0.0) / count - mean * mean, 0.0) ** 0.5
+    histogram = stats.get("lead_days_hist", {})
+    return {
+        "supplier_id": supplier_id,
+        "supplier_name": supplier_name,
+        "product_id": product_id,
+        "product_name": stats.get("product_name"),
+        "receipts": stats.get("receipts", 0),
+        "received_quantity": stats.get("received_quantity", 0),
+        "last_received_at": stats.get("last_received_at"),
+        "lead_time": {
+            "count": count,
+            "mean_days": round(mean, 2) if mean is not None else None,
+            "stddev_days": round(stddev, 2) if stddev is not None else None,
+            "min_days": round(stats["lead_days_min"], 2) if "lead_days_min" in stats else None,
+            "max_days": round(stats["lead_days_max"], 2) if "lead_days_max" in stats else None,
+            **{f"p{p}_days": histogram_percentile(histogram, count, p) for p in PERCENTILES},
+        },
+        "on_time_rate": _ratio(stats.get("on_time_receipts", 0), stats.get("due_receipts", 0)),
+        "fill_rate": _ratio(stats.get("filled_quantity", 0), stats.get("ordered_quantity", 0)),
+        "line_fill_rate": _ratio(stats.get("filled_lines", 0), stats.get("closed_lines", 0)),
+        "closed_lines": stats.get("closed_lines", 0),
+    }
+
+
+async def get_supplier_performance(db, supplier: dict, product_id: Optional[str] = None, session=None) -> dict:
+    """Stats of one supplier, overall or for one product: a single read by ID."""
+    supplier_id = str(supplier["_id"])
+    stats = await db[STATS].find_one({"_id": stats_id(supplier_id, product_id)}, session=session)
+    return performance_helper(stats, supplier_id, supplier.get("name"), product_id)
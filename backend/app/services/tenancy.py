@@ -0,0 +1,168 @@
+"""Multi-tenant request routing.
+
+One deployment serves every tenant in ``TENANTS``, each in its own MongoDB
+database on the process's single client, so all tenants share one
+connection pool. A request names its tenant in the ``TENANT_HEADER`` header
+or, failing that, through a ``<tenant><TENANT_HOST_SUFFIX>`` Host name; the
+middleware keeps it in a context variable for the rest of the request and
+``get_database()`` returns that tenant's (cached) database handle, so routes
+and services are unchanged.
+
+When ``TENANT_HOST_SUFFIX`` is set and the Host name resolves to a tenant,
+a header naming a different tenant is refused, so a client of one tenant's
+host cannot reach another tenant's data by adding the header.
+
+Every configured tenant's indexes and backfills run at startup, before the
+worker takes traffic. A tenant whose bootstrap failed there is retried on
+first use, under a lock of its own so the other tenants are not held up.
+With ``TENANTS`` empty the deployment is single-tenant and everything runs
+against ``DATABASE_NAME`` as before.
+"""
+import asyncio
+import json
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from ..config import (
+    TENANTS,
+    TENANT_DEFAULT,
+    TENANT_EXEMPT_PATHS,
+    TENANT_HEADER,
+    TENANT_HOST_SUFFIX,
+)
+from ..database import create_indexes, current_tenant, get_database
+from .expiry import backfill_expiry_dates
+from .order_lines import backfill_line_ids
+from .query_trace import untraced
+
+_prepared: set = set()
+_prepare_locks: Dict[str, asyncio.Lock] = {}
+
+
+class TenantMismatch(ValueError):
+    """The tenant header and the Host name name different tenants."""
+
+
+@contextmanager
+def use_tenant(tenant: Optional[str]):
+    """Run the enclosed code against ``tenant``'s database."""
+    token = current_tenant.set(tenant)
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+async def prepare_tenant(tenant: str):
+    """Create the tenant's indexes and run its backfills, once per process."""
+    if tenant in _prepared:
+        return
+    async with _prepare_locks.setdefault(tenant, asyncio.Lock()):
+        if tenant in _prepared:
+            return
+        # Bootstrap queries are not charged to the request that triggers them
+        with use_tenant(tenant), untraced():
+            database = get_database()
+            await create_indexes(database)
+            await backfill_expiry_dates(database)
+            await backfill_line_ids(database)
+        _prepared.add(tenant)
+        print(f"Tenant {tenant} ready: {database.name}")
+
+
+async def prepare_tenants(tenants=TENANTS):
+    """Bootstrap every configured tenant at startup.
+
+    A failure is logged and left to be retried on the tenant's first use.
+    """
+    for tenant in tenants:
+        try:
+            await prepare_tenant(tenant)
+        except Exception as e:
+            print(f"Tenant {tenant} bootstrap failed, retrying on first use: {e}")
+
+
+def resolve_tenant(scope) -> Optional[str]:
+    """Return the tenant a request names by Host or header, if any.
+
+    Raises :class:`TenantMismatch` if the header disagrees with the Host.
+    """
+    headers = dict(scope["headers"])
+    header = headers.get(TENANT_HEADER.lower().encode())
+    header = header.decode("latin-1").strip() if header else None
+    if TENANT_HOST_SUFFIX:
+        host = headers.get(b"host", b"").decode("latin-1").split(":", 1)[0].lower()
+        if host.endswith(TENANT_HOST_SUFFIX) and len(host) > len(TENANT_HOST_SUFFIX):
+            tenant = host[:-len(TENANT_HOST_SUFFIX)]
+            if header and header != tenant:
+                raise TenantMismatch(header)
+            return tenant
+    return header or TENANT_DEFAULT or None
+
+
+def per_tenant(job):
+    """Wrap a job so that it runs once in every tenant's database.
+
+    One tenant failing does not stop the others; the failure is raised after
+    all have run. In a single-tenant deployment the job runs once as is.
+    """
+    if not TENANTS:
+        return job
+
+    async def run():
+        failed = []
+        for tenant in TENANTS:
+            try:
+                await prepare_tenant(tenant)
+                with use_tenant(tenant):
+                    await job()
+            except Exception as e:
+                print(f"Job {job.__name__} failed for tenant {tenant}: {e}")
+                failed.append(tenant)
+        if failed:
+            raise RuntimeError(f"failed for tenant(s): {', '.join(failed)}")
+
+    run.__name__ = job.__name__
+    return run
+
+
+class TenantMiddleware:
+    """ASGI middleware binding each API request to its tenant's database."""
+
+    def __init__(self, app, tenants=TENANTS, exempt_paths=TENANT_EXEMPT_PATHS):
+        self.app = app
+        self.tenants = set(tenants)
+        self.exempt_paths = tuple(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if not self.tenants or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        if not path.startswith("/api/") or path.startswith(self.exempt_paths):
+            return await self.app(scope, receive, send)
+
+        try:
+            tenant = resolve_tenant(scope)
+        except TenantMismatch:
+            return await self._send(send, 403, {"detail": "租户标识与访问域名不一致"})
+        if not tenant:
+            return await self._send(send, 400, {"detail": "缺少租户标识"})
+        if tenant not in self.tenants:
+            return await self._send(send, 404, {"detail": "租户不存在"})
+
+        await prepare_tenant(tenant)
+        with use_tenant(tenant):
+            await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _send(send, status_code: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,244 @@
+"""Inter-warehouse stock transfers.
+
+A transfer moves stock from inventory rows to the rows holding the same
+product and batch in another warehouse, creating those rows when they do not
+exist yet. The guarded decrements, the increments and the ledger records are
+written in one transaction, so the stock is never missing from both
+warehouses and a failed transfer leaves nothing behind. Each line produces a
+TRANSFER_OUT record on the source row and a TRANSFER_IN record on the
+destination row, linked by the transfer ID.
+
+Transactions need a replica set. On a standalone server the same writes run
+without one: a failed guard puts back the decrements already applied.
+
+Destination rows found at planning time may be claimed by a stocktake
+before the increments land, so the increments are guarded too.
+"""
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+
+from ..database import transactions_enabled
+from ..models.inventory import InventoryOperationType, InventoryTransferCreate
+from ..utils.concurrency import version_conflict
+from .stocktake import NOT_FROZEN, ensure_not_frozen, frozen_conflict
+
+
+def generate_transfer_id() -> str:
+    """Generate unique transfer number."""
+    return f"TR{datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:4].upper()}"
+
+
+def _destination_key(source: dict) -> tuple:
+    return source.get("product_id"), source.get("batch_number")
+
+
+async def _load_sources(db, transfer: InventoryTransferCreate) -> dict:
+    """Read and validate the source rows of every transfer line."""
+    requested = {}
+    for item in transfer.items:
+        if not ObjectId.is_valid(item.inventory_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的库存ID"
+            )
+        source_id = ObjectId(item.inventory_id)
+        requested[source_id] = requested.get(source_id, 0) + item.quantity
+
+    sources = {
+        row["_id"]: row
+        async for row in db.inventory.find({"_id": {"$in": list(requested)}})
+    }
+    for source_id, quantity in requested.items():
+        source = sources.get(source_id)
+        if source is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="库存记录不存在"
+            )
+        ensure_not_frozen(source)
+        if source.get("warehouse") == transfer.to_warehouse:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="调出仓库与调入仓库相同"
+            )
+        current_quantity = source.get("quantity", 0)
+        if current_quantity < quantity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"库存不足，当前库存: {current_quantity}"
+            )
+    return sources
+
+
+async def _plan_destinations(db, transfer: InventoryTransferCreate, sources: dict, now: datetime):
+    """Find the destination row for every line; build the ones that are missing."""
+    keys = {}
+    for item in transfer.items:
+        source = sources[ObjectId(item.inventory_id)]
+        keys.setdefault(_destination_key(source), (source, item))
+
+    destinations = {}
+    cursor = db.inventory.find({
+        "warehouse": transfer.to_warehouse,
+        "$or": [{"product_id": product_id, "batch_number": batch} for product_id, batch in keys],
+    }).sort("_id", 1)
+    async for row in cursor:
+        destinations.setdefault(_destination_key(row), row)
+    for row in destinations.values():
+        ensure_not_frozen(row)
+
+    new_rows = []
+    for key, (source, item) in keys.items():
+        if key in destinations:
+            continue
+        row = {
+            "_id": ObjectId(),
+            "product_id": source.get("product_id"),
+            "warehouse": transfer.to_warehouse,
+            "batch_number": source.get("batch_number"),
+            "quantity": 0,
+            "unit_price": source.get("unit_price", 0.0),
+            "location": item.location,
+            # Same batch, so the received and expiry dates travel with it
+            "received_at": source.get("received_at"),
+            "expires_at": source.get("expires_at"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        destinations[key] = row
+        new_rows.append(row)
+    return destinations, new_rows
+
+
+async def _take_from_sources(db, moves: dict, now: datetime, session) -> bool:
+    """Apply the guarded decrements; False if any row no longer has the stock."""
+    guards = [
+        (
+            {"_id": source_id, "quantity": {"$gte": quantity}, **NOT_FROZEN},
+            {"$inc": {"quantity": -quantity}, "$set": {"updated_at": now}},
+        )
+        for source_id, quantity in moves.items()
+    ]
+    if session is not None:
+        result = await db.inventory.bulk_write(
+            [UpdateOne(query, update) for query, update in guards], ordered=True, session=session
+        )
+        return result.modified_count == len(guards)
+
+    taken = []
+    for (query, update), (source_id, quantity) in zip(guards, moves.items()):
+        result = await db.inventory.update_one(query, update)
+        if result.modified_count == 0:
+            # No transaction to abort: put back what was already taken
+            if taken:
+                await db.inventory.bulk_write([
+                    UpdateOne({"_id": taken_id}, {"$inc": {"quantity": taken_quantity}})
+                    for taken_id, taken_quantity in taken
+                ])
+            return False
+        taken.append((source_id, quantity))
+    return True
+
+
+async def _give_to_destinations(db, arrivals: dict, now: datetime, session) -> bool:
+    """Apply the increments; False if a destination row was frozen meanwhile."""
+    guards = [
+        (
+            {"_id": destination_id, **NOT_FROZEN},
+            {"$inc": {"quantity": quantity}, "$set": {"updated_at": now}},
+        )
+        for destination_id, quantity in arrivals.items()
+    ]
+    if session is not None:
+        result = await db.inventory.bulk_write(
+            [UpdateOne(query, update) for query, update in guards], ordered=True, session=session
+        )
+        return result.matched_count == len(guards)
+
+    given = []
+    for (query, update), (destination_id, quantity) in zip(guards, arrivals.items()):
+        result = await db.inventory.update_one(query, update)
+        if result.matched_count == 0:
+            if given:
+                await db.inventory.bulk_write([
+                    UpdateOne({"_id": given_id}, {"$inc": {"quantity": -given_quantity}})
+                    for given_id, given_quantity in given
+                ])
+            return False
+        given.append((destination_id, quantity))
+    return True
+
+
+async def transfer_stock(db, transfer: InventoryTransferCreate) -> dict:
+    """Move stock between warehouses and return the transfer summary."""
+    now = datetime.now()
+    transfer_id = generate_transfer_id()
+    sources = await _load_sources(db, transfer)
+    destinations, new_rows = await _plan_destinations(db, transfer, sources, now)
+
+    moves = {}
+    arrivals = {}
+    lines = []
+    records = []
+    for item in transfer.items:
+        source = sources[ObjectId(item.inventory_id)]
+        destination = destinations[_destination_key(source)]
+        moves[source["_id"]] = moves.get(source["_id"], 0) + item.quantity
+        arrivals[destination["_id"]] = arrivals.get(destination["_id"], 0) + item.quantity
+        lines.append({
+            "product_id": source.get("product_id"),
+            "batch_number": source.get("batch_number"),
+            "quantity": item.quantity,
+            "from_inventory_id": str(source["_id"]),
+            "from_warehouse": source.get("warehouse"),
+            "to_inventory_id": str(destination["_id"]),
+        })
+        for row, operation_type in (
+            (source, InventoryOperationType.TRANSFER_OUT),
+            (destination, InventoryOperationType.TRANSFER_IN),
+        ):
+            records.append({
+                "product_id": source.get("product_id"),
+                "inventory_id": str(row["_id"]),
+                "operation_type": operation_type.value,
+                "quantity": item.quantity,
+                "batch_number": source.get("batch_number"),
+                "transfer_id": transfer_id,
+                "operator": transfer.operator,
+                "remark": transfer.remark,
+                "created_at": now,
+            })
+
+    async def apply(session=None):
+        if not await _take_from_sources(db, moves, now, session):
+            raise version_conflict()
+        if new_rows:
+            await db.inventory.insert_many(new_rows, session=session)
+        if not await _give_to_destinations(db, arrivals, now, session):
+            if session is None:
+                # No transaction to abort: undo the decrements and the new rows
+                await db.inventory.bulk_write([
+                    UpdateOne({"_id": source_id}, {"$inc": {"quantity": quantity}})
+                    for source_id, quantity in moves.items()
+                ])
+                if new_rows:
+                    await db.inventory.delete_many({"_id": {"$in": [row["_id"] for row in new_rows]}})
+            raise frozen_conflict()
+        await db.inventory_records.insert_many(records, session=session)
+
+    if transactions_enabled():
+        async with await db.client.start_session() as session:
+            await session.with_transaction(apply)
+    else:
+        await apply()
+
+    return {
+        "transfer_id": transfer_id,
+        "to_warehouse": transfer.to_warehouse,
+        "items": lines,
+        "created_at": now,
+    }
@@ -0,0 +1,170 @@
+"""Inventory valuation with weighted-average cost.
+
+The whole report is produced by one aggregation over ``inventory``: rows are
+joined to their product metadata, valued at quantity × unit cost and then
+summarised per warehouse, product type, category and product in a single
+``$facet``. Reports are cached in-process against the stock-change version,
+so repeated requests between stock movements never touch the collection.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from ..models.inventory import OUTBOUND_OPERATION_TYPES
+from .stock_version import get_stock_version
+
+CACHE_SIZE = 32
+
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+
+
+def signed_quantity_expr(quantity: str = "$quantity", operation_type: str = "$operation_type") -> dict:
+    """Aggregation expression for the stock effect of a ledger record.
+
+    Outbound records (sales and transfers out) reduce stock; ADJUST records
+    carry a signed delta.
+    """
+    return {
+        "$cond": [
+            {"$in": [operation_type, list(OUTBOUND_OPERATION_TYPES)]},
+            {"$multiply": [quantity, -1]},
+            quantity,
+        ]
+    }
+
+
+def _group_stage(key: str) -> list:
+    return [
+        {"$group": {"_id": key, "quantity": {"$sum": "$quantity"}, "value": {"$sum": "$value"}}},
+        {"$sort": {"value": -1}},
+    ]
+
+
+def valuation_pipeline(
+    warehouse: Optional[str] = None,
+    as_of: Optional[datetime] = None,
+    product_limit: int = 100
+) -> list:
+    """Build the valuation aggregation pipeline."""
+    match = {}
+    if warehouse:
+        match["warehouse"] = warehouse
+    if as_of:
+        match["created_at"] = {"$lte": as_of}
+
+    pipeline = [{"$match": match}] if match else []
+
+    if as_of:
+        # Roll each row back by the movements posted after the as-of time
+        pipeline += [
+            {"$lookup": {
+                "from": "inventory_records",
+                "let": {"inventory_id": {"$toString": "$_id"}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        {"$eq": ["$inventory_id", "$$inventory_id"]},
+                        {"$gt": ["$created_at", as_of]},
+                    ]}}},
+                    {"$group": {"_id": None, "delta": {"$sum": signed_quantity_expr()}}},
+                ],
+                "as": "later_movements",
+            }},
+            {"$set": {"quantity": {"$subtract": [
+                "$quantity",
+                {"$ifNull": [{"$first": "$later_movements.delta"}, 0]},
+            ]}}},
+        ]
+
+    pipeline += [
+        {"$match": {"quantity": {"$gt": 0}}},
+        {"$lookup": {
+            "from": "products",
+            "let": {"product_id": {"$convert": {
+                "input": "$product_id", "to": "objectId", "onError": None, "onNull": None,
+            }}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$product_id"]}}},
+                {"$project": {"name": 1, "product_code": 1, "product_type": 1, "category": 1}},
+            ],
+            "as": "product",
+        }},
+        {"$set": {
+            "product": {"$first": "$product"},
+            "value": {"$multiply": ["$quantity", {"$ifNull": ["$unit_price", 0]}]},
+        }},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None, "quantity": {"$sum": "$quantity"}, "value": {"$sum": "$value"},
+            }}],
+            "by_warehouse": _group_stage("$warehouse"),
+            "by_product_type": _group_stage("$product.product_type"),
+            "by_category": _group_stage("$product.category"),
+            "by_product": [
+                {"$group": {
+                    "_id": "$product_id",
+                    "product_name": {"$first": "$product.name"},
+                    "product_code": {"$first": "$product.product_code"},
+                    "quantity": {"$sum": "$quantity"},
+                    "value": {"$sum": "$value"},
+                }},
+                {"$sort": {"value": -1}},
+                {"$limit": product_limit},
+            ],
+        }},
+    ]
+    return pipeline
+
+
+def _group_helper(group) -> dict:
+    return {
+        "key": group["_id"],
+        "quantity": group["quantity"],
+        "value": round(group["value"], 2),
+    }
+
+
+def _product_helper(group) -> dict:
+    quantity = group["quantity"]
+    return {
+        "product_id": group["_id"],
+        "product_name": group.get("product_name"),
+        "product_code": group.get("product_code"),
+        "quantity": quantity,
+        "value": round(group["value"], 2),
+        "weighted_average_cost": round(group["value"] / quantity, 4) if quantity else 0.0,
+    }
+
+
+async def compute_valuation(
+    db,
+    warehouse: Optional[str] = None,
+    as_of: Optional[datetime] = None,
+    product_limit: int = 100
+) -> dict:
+    """Return the valuation report, served from cache while stock is unchanged."""
+    version = await get_stock_version(db)
+    key = (db.name, version, warehouse, as_of, product_limit)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    result = None
+    async for result in db.inventory.aggregate(valuation_pipeline(warehouse, as_of, product_limit)):
+        pass
+
+    totals = result["totals"][0] if result and result["totals"] else {"quantity": 0, "value": 0.0}
+    report = {
+        "as_of": as_of,
+        "stock_version": version,
+        "total_quantity": totals["quantity"],
+        "total_value": round(totals["value"], 2),
+        "by_warehouse": [_group_helper(g) for g in result["by_warehouse"]] if result else [],
+        "by_product_type": [_group_helper(g) for g in result["by_product_type"]] if result else [],
+        "by_category": [_group_helper(g) for g in result["by_category"]] if result else [],
+        "by_product": [_product_helper(g) for g in result["by_product"]] if result else [],
+    }
+
+    _cache[key] = report
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return report
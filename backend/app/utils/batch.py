@@ -0,0 +1,44 @@
+"""Fetch many documents by ID in one query.
+
+Batch endpoints resolve a list of IDs with a single ``$in`` query and answer
+in request order. An ID that is invalid or matches nothing gets an entry
+with ``found: false`` and the detail the single-item endpoint would have
+returned, instead of failing the whole batch.
+"""
+from typing import Callable, List
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from ..config import BATCH_MAX_IDS
+
+
+async def fetch_by_ids(
+    collection,
+    ids: List[str],
+    helper: Callable[[dict], dict],
+    invalid_detail: str,
+    missing_detail: str,
+) -> List[dict]:
+    """Return one batch entry per requested ID, in request order."""
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一次最多查询 {BATCH_MAX_IDS} 个ID"
+        )
+    object_ids = {id_: ObjectId(id_) for id_ in set(ids) if ObjectId.is_valid(id_)}
+    documents = {}
+    if object_ids:
+        cursor = collection.find({"_id": {"$in": list(set(object_ids.values()))}})
+        async for document in cursor:
+            documents[document["_id"]] = helper(document)
+
+    results = []
+    for id_ in ids:
+        if id_ not in object_ids:
+            results.append({"id": id_, "found": False, "data": None, "detail": invalid_detail})
+        elif object_ids[id_] not in documents:
+            results.append({"id": id_, "found": False, "data": None, "detail": missing_detail})
+        else:
+            results.append({"id": id_, "found": True, "data": documents[object_ids[id_]], "detail": None})
+    return results
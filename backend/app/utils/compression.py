@@ -0,0 +1,101 @@
+"""Compressed delivery of static assets and API responses.
+
+``PrecompressedStaticFiles`` serves the ``.br``/``.gz`` variants written by
+``python -m app.assets`` when the client accepts them, so assets are never
+compressed per request. ``CompressionMiddleware`` gzips other responses
+above a size threshold, except event streams, which must reach the client
+event by event.
+"""
+import mimetypes
+import stat
+from typing import Iterable
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Preferred first
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(scope: Scope) -> set:
+    """Content codings the client accepts (``q=0`` entries excluded)."""
+    accepted = set()
+    for part in Headers(scope=scope).get("accept-encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        name, _, value = params.strip().partition("=")
+        try:
+            quality = float(value) if name.strip() == "q" else 1.0
+        except ValueError:
+            quality = 1.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that prefers precompressed variants.
+
+    With ``max_age`` set, responses are marked ``immutable``: use it only for
+    directories whose file names change with their content.
+    """
+
+    def __init__(self, *args, max_age: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await self._precompressed_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if self.max_age and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = f"public, max-age={self.max_age}, immutable"
+        return response
+
+    async def _precompressed_response(self, path: str, scope: Scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            return None
+        accepted = accepted_encodings(scope)
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if not (stat_result and stat.S_ISREG(stat_result.st_mode)):
+                continue
+            response = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                method=scope["method"],
+                media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+            )
+            if self.is_not_modified(response.headers, Headers(scope=scope)):
+                return NotModifiedResponse(response.headers)
+            return response
+        return None
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves streaming endpoints alone.
+
+    The gzip stream buffers output until enough has accumulated, which would
+    hold back server-sent events; responses that already carry a
+    ``Content-Encoding`` (precompressed assets) pass through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6,
+                 excluded_paths: Iterable[str] = ()):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and (
+            scope["path"].startswith(self.excluded_paths)
+            or "text/event-stream" in Headers(scope=scope).get("accept", "")
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,44 @@
+"""Optimistic concurrency helpers.
+
+Documents carry a ``version`` that every write increments. Clients send the
+version they last read, in an ``If-Match`` header or a ``version`` field,
+and the update filter only matches while it is unchanged, so the check and
+the write happen in one round trip.
+"""
+from fastapi import HTTPException, status
+from typing import Optional
+
+
+def expected_version(if_match: Optional[str], body_version: Optional[int] = None) -> Optional[int]:
+    """Return the version the client expects, if it sent one."""
+    if if_match is None or if_match.strip() == "*":
+        return body_version
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的 If-Match 版本号"
+        )
+
+
+def version_filter(expected: Optional[int]) -> dict:
+    """Filter matching documents still at the expected version.
+
+    Documents written before versioning have no field and count as version 0.
+    """
+    if expected is None:
+        return {}
+    if expected == 0:
+        return {"version": {"$in": [None, 0]}}
+    return {"version": expected}
+
+
+def version_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="数据已被其他用户修改，请刷新后重试"
+    )
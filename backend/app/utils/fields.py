@@ -0,0 +1,69 @@
+"""Sparse fieldsets for list endpoints.
+
+``fields=order_number,status`` limits a listing to the named response
+fields. The matching projection is pushed into ``find()`` so MongoDB only
+sends those fields, and rows are validated against the response model
+trimmed to the same fields. ``id`` is always included.
+"""
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import create_model
+
+
+def parse_fields(fields: Optional[str], model) -> Optional[tuple]:
+    """Validate a comma-separated field list against a response model."""
+    if not fields:
+        return None
+    names = ["id"]
+    for name in fields.split(","):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"未知字段: {', '.join(unknown)}"
+        )
+    return tuple(names)
+
+
+def projection(fields: Optional[tuple], sources: Optional[dict] = None) -> Optional[dict]:
+    """Build the Mongo projection for the requested response fields.
+
+    ``sources`` maps response fields that are derived from other document
+    fields, e.g. ``product_name`` is looked up through ``product_id``.
+    """
+    if fields is None:
+        return None
+    sources = sources or {}
+    spec = {"_id": 1}
+    for name in fields:
+        if name == "id":
+            continue
+        for source in sources.get(name, (name,)):
+            spec[source] = 1
+    return spec
+
+
+@lru_cache(maxsize=128)
+def partial_model(model, fields: tuple):
+    """Return ``model`` trimmed to ``fields``."""
+    definitions = {
+        name: (model.model_fields[name].annotation, model.model_fields[name])
+        for name in fields
+    }
+    return create_model(f"{model.__name__}Fields", **definitions)
+
+
+def sparse_response(model, fields: tuple, rows: Iterable[dict], headers: Optional[dict] = None) -> JSONResponse:
+    """Serialise helper rows through the trimmed response model."""
+    trimmed = partial_model(model, fields)
+    return JSONResponse(content=jsonable_encoder([
+        trimmed(**{name: row[name] for name in fields if name in row})
+        for row in rows
+    ]), headers=headers)
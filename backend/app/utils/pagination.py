@@ -0,0 +1,20 @@
+"""Total counts for paginated list endpoints.
+
+With ``with_total=true`` a listing reports how many documents match its
+filter in the ``X-Total-Count`` header, so clients can page through the
+whole result with ``skip``/``limit`` without fetching it.
+"""
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+async def total_count_headers(collection, query: dict, with_total: bool, session=None) -> dict:
+    """Return the total-count header for ``query``, if requested."""
+    if not with_total:
+        return {}
+    if query or session:
+        # Metadata counts cannot run in a session, so causal reads count exactly
+        total = await collection.count_documents(query, session=session)
+    else:
+        # Unfiltered: read the count from collection metadata instead of scanning
+        total = await collection.estimated_document_count()
+    return {TOTAL_COUNT_HEADER: str(total)}
@@ -0,0 +1,124 @@
+"""Shared test setup.
+
+Settings are read when ``app.config`` is imported, so the environment of the
+test run is fixed here, before any test imports the application.
+"""
+import os
+
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+os.environ.setdefault("DATABASE_NAME", "biotech_inventory_test")
+# Route query budgets are checked by the tests, so over-budget routes fail
+os.environ.setdefault("QUERY_TRACE_ENABLED", "true")
+os.environ.setdefault("QUERY_BUDGET_ENFORCE", "true")
+
+import itertools  # noqa: E402
+import time  # noqa: E402
+from contextvars import ContextVar  # noqa: E402
+from functools import wraps  # noqa: E402
+from types import SimpleNamespace  # noqa: E402
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+# e.g. mongodb://localhost:27017/?replicaSet=rs0&directConnection=true
+REPLICA_SET_URL = os.getenv("TEST_REPLICA_SET_URL")
+
+
+@pytest.fixture
+def replica_set_client(monkeypatch):
+    """API client on a real (single-host) replica set; skipped without one."""
+    if not REPLICA_SET_URL:
+        pytest.skip("TEST_REPLICA_SET_URL is not set")
+    from app import database
+    from app.main import app
+
+    monkeypatch.setattr(database, "MONGODB_URL", REPLICA_SET_URL)
+    with TestClient(app) as client:
+        yield client
+        client.portal.call(database.db.client.drop_database, database.DATABASE_NAME)
+
+
+# mongomock collection methods and the command each stands for: (command, filter
+# argument, its position). Used to feed the query tracer, which in-memory Motor
+# would otherwise bypass since it sends no commands.
+MOCK_COMMANDS = {
+    "find": ("find", "filter", 0),
+    "find_one": ("find", "filter", 0),
+    "aggregate": ("aggregate", "pipeline", 0),
+    "count_documents": ("count", "filter", 0),
+    "estimated_document_count": ("count", None, None),
+    "distinct": ("distinct", "filter", 1),
+    "insert_one": ("insert", None, None),
+    "insert_many": ("insert", None, None),
+    "update_one": ("update", "filter", 0),
+    "update_many": ("update", "filter", 0),
+    "replace_one": ("update", "filter", 0),
+    "delete_one": ("delete", "filter", 0),
+    "delete_many": ("delete", "filter", 0),
+    "find_one_and_update": ("findAndModify", "filter", 0),
+    "find_one_and_replace": ("findAndModify", "filter", 0),
+    "find_one_and_delete": ("findAndModify", "filter", 0),
+    "bulk_write": ("update", None, None),
+}
+
+_in_command: ContextVar[bool] = ContextVar("_in_command", default=False)
+_request_ids = itertools.count(1)
+
+
+def _mock_command(command_name: str, collection: str, criteria) -> dict:
+    if command_name in ("update", "delete"):
+        return {command_name: collection, f"{command_name}s": [{"q": criteria or {}}]}
+    field = {"find": "filter", "aggregate": "pipeline"}.get(command_name, "query")
+    command = {command_name: collection}
+    if criteria is not None:
+        command[field] = criteria
+    return command
+
+
+def _traced(method, command_name: str, argument: str, position):
+    from app.services.query_trace import query_tracer
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # mongomock calls its own methods internally; only the outer call is a command
+        if _in_command.get():
+            return method(self, *args, **kwargs)
+        criteria = None
+        if argument:
+            criteria = kwargs.get(argument, args[position] if len(args) > position else None)
+        request_id = next(_request_ids)
+        query_tracer.started(SimpleNamespace(
+            command_name=command_name,
+            command=_mock_command(command_name, self.name, criteria),
+            request_id=request_id,
+        ))
+        token = _in_command.set(True)
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _in_command.reset(token)
+            query_tracer.succeeded(SimpleNamespace(
+                request_id=request_id,
+                duration_micros=int((time.perf_counter() - started) * 1_000_000),
+            ))
+
+    return wrapper
+
+
+@pytest.fixture(scope="module")
+def in_memory_client():
+    """API client on in-memory Motor (mongomock), with queries traced."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from mongomock.collection import Collection
+    from app import database
+    from app.main import app
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(database, "AsyncIOMotorClient", mongomock_motor.AsyncMongoMockClient)
+        # Read routing asks for secondary reads, which a single in-memory node ignores
+        patch.setattr(mongomock_motor.AsyncMongoMockDatabase, "with_options", lambda self, **kwargs: self, raising=False)
+        for name, (command_name, argument, position) in MOCK_COMMANDS.items():
+            patch.setattr(Collection, name, _traced(getattr(Collection, name), command_name, argument, position))
+        with TestClient(app) as client:
+            yield client
@@ -0,0 +1,79 @@
+"""Per-route query budgets, enforced on the list routes."""
+from datetime import datetime
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import QUERY_BUDGETS
+from app.database import db
+from app.services.query_trace import QueryTraceMiddleware
+
+PRODUCTS = 4
+
+
+@pytest.fixture(scope="module")
+def seeded_client(in_memory_client):
+    """Enough rows on every list that a per-row lookup would show up."""
+    client = in_memory_client
+    products = [
+        client.post("/api/products/", json={
+            "name": f"抗体{i}", "product_code": f"AB-{i}", "product_type": "抗体", "unit": "支", "shelf_life": 30,
+        }).json()
+        for i in range(PRODUCTS)
+    ]
+    supplier = client.post("/api/partners/", json={
+        "name": "供应商", "partner_code": "S-1", "partner_type": "供应商",
+    }).json()
+    customer = client.post("/api/partners/", json={
+        "name": "客户", "partner_code": "C-1", "partner_type": "客户",
+    }).json()
+
+    for product in products:
+        row = client.post("/api/inventory/", json={
+            "product_id": product["id"], "quantity": 10, "warehouse": "主仓库", "batch_number": "B1",
+        }).json()
+        for operation in ("in", "out"):
+            assert client.post(f"/api/inventory/{operation}", json={
+                "product_id": product["id"], "inventory_id": row["id"],
+                "operation_type": "入库" if operation == "in" else "出库", "quantity": 1,
+            }).status_code == 200
+        line = {"product_id": product["id"], "quantity": 2, "unit_price": 10.0}
+        assert client.post("/api/purchases/", json={"supplier_id": supplier["id"], "items": [line]}).status_code == 201
+        assert client.post("/api/sales/", json={"customer_id": customer["id"], "items": [line]}).status_code == 201
+
+    client.portal.call(db.db.replenishment_suggestions.insert_many, [
+        {
+            "_id": product["id"], "product_id": product["id"], "on_hand": 10, "suggested_quantity": 5,
+            "days_of_cover": 3.0, "cover_rank": 3.0, "lead_time_days": 7, "computed_at": datetime.now(),
+        }
+        for product in products
+    ])
+    return client
+
+
+@pytest.mark.parametrize("route", sorted(QUERY_BUDGETS))
+def test_list_route_within_budget(seeded_client, route):
+    method, path = route.split(" ", 1)
+    response = seeded_client.request(method, path)
+    assert response.status_code == 200, response.text
+    assert 0 < int(response.headers["X-Query-Count"]) <= QUERY_BUDGETS[route]
+
+
+def test_over_budget_route_is_refused(seeded_client):
+    app = FastAPI()
+
+    @app.get("/api/looped")
+    async def looped():
+        # One lookup per product: the N+1 shape budgets exist to catch
+        async for product in db.db.products.find({}, {"_id": 1}):
+            await db.db.products.find_one({"_id": product["_id"]})
+        return {}
+
+    app.add_middleware(QueryTraceMiddleware, budgets={"GET /api/looped": 2}, enforce=True)
+    response = TestClient(app).get("/api/looped")
+    assert response.status_code == 500
+    body = response.json()
+    assert body["query_count"] == PRODUCTS + 1
+    assert any(count == PRODUCTS for count in body["repeated"].values())
@@ -0,0 +1,40 @@
+"""Read-your-writes through consistency tokens."""
+from bson.timestamp import Timestamp
+
+from app.config import CONSISTENCY_TOKEN_HEADER
+from app.services.read_routing import decode_token, encode_token
+
+
+def test_token_round_trip():
+    cluster_time = {"clusterTime": Timestamp(1700000000, 3), "signature": {"keyId": 0}}
+    token = encode_token(Timestamp(1700000000, 2), cluster_time)
+    point = decode_token(token)
+    assert point["operation_time"] == Timestamp(1700000000, 2)
+    assert point["cluster_time"]["clusterTime"] == Timestamp(1700000000, 3)
+
+
+def test_write_then_read_with_token(replica_set_client):
+    created = replica_set_client.post("/api/partners/", json={
+        "name": "一致性测试供应商", "partner_code": "RYW-1", "partner_type": "供应商",
+    })
+    assert created.status_code == 201
+    token = created.headers.get(CONSISTENCY_TOKEN_HEADER)
+    assert token
+
+    listed = replica_set_client.get(
+        "/api/partners/", params={"search": "RYW-1"}, headers={CONSISTENCY_TOKEN_HEADER: token}
+    )
+    assert listed.status_code == 200
+    assert [partner["id"] for partner in listed.json()] == [created.json()["id"]]
+
+
+def test_reads_do_not_issue_tokens(replica_set_client):
+    response = replica_set_client.get("/api/partners/")
+    assert response.status_code == 200
+    assert CONSISTENCY_TOKEN_HEADER not in response.headers
+
+
+def test_invalid_token_is_rejected(replica_set_client):
+    response = replica_set_client.get("/api/partners/", headers={CONSISTENCY_TOKEN_HEADER: "not-a-token"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "无效的一致性令牌"
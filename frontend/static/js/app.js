@@ -3,8 +3,11 @@
  */
 
 const API_BASE_URL = '/api';
+const CONSISTENCY_TOKEN_HEADER = 'X-Consistency-Token';
 let currentPage = 'dashboard';
 let currentEditId = null;
+// Token from the last write; sent with reads so lists include our own changes
+let consistencyToken = null;
 
 // Page titles mapping
 const pageTitles = {
@@ -36,6 +39,9 @@ const partnerTypes = [
 // Initialize application
 document.addEventListener('DOMContentLoaded', () => {
     initNavigation();
+    initTables();
+    initSearch();
+    initLiveUpdates();
     loadDashboard();
 });
 
@@ -75,9 +81,12 @@ function switchPage(page) {
     // Update title
     document.getElementById('page-title').textContent = pageTitles[page];
     
-    // Show/hide add button
+    // Show/hide add button and search box
     const addBtn = document.getElementById('add-btn');
     addBtn.style.display = page === 'dashboard' ? 'none' : 'block';
+    const searchInput = document.getElementById('search-input');
+    searchInput.style.display = page === 'dashboard' ? 'none' : 'block';
+    searchInput.value = tables[page] ? tables[page].search : '';
     
     currentPage = page;
     
@@ -110,11 +119,24 @@ function loadPageData(page) {
 }
 
 // API request helper
+// Headers for a read: carries the token of our last write, if any
+function readHeaders() {
+    return consistencyToken ? { [CONSISTENCY_TOKEN_HEADER]: consistencyToken } : {};
+}
+
+function rememberConsistencyToken(response) {
+    const token = response.headers.get(CONSISTENCY_TOKEN_HEADER);
+    if (token) {
+        consistencyToken = token;
+    }
+}
+
 async function apiRequest(endpoint, method = 'GET', data = null) {
     const options = {
         method,
         headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            ...(method === 'GET' ? readHeaders() : {})
         }
     };
     
@@ -124,6 +146,7 @@ async function apiRequest(endpoint, method = 'GET', data = null) {
     
     try {
         const response = await fetch(`${API_BASE_URL}${endpoint}`, options);
+        rememberConsistencyToken(response);
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.detail || 'Request failed');
@@ -138,40 +161,186 @@ async function apiRequest(endpoint, method = 'GET', data = null) {
     }
 }
 
+// Fetch one page of a listing together with its total count
+async function apiPage(endpoint) {
+    const response = await fetch(`${API_BASE_URL}${endpoint}`, { headers: readHeaders() });
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Request failed');
+    }
+    return {
+        data: await response.json(),
+        total: parseInt(response.headers.get('X-Total-Count') || '0', 10)
+    };
+}
+
 // Load dashboard data
 async function loadDashboard() {
+    const count = endpoint => apiPage(`${endpoint}?fields=id&limit=1&with_total=true`)
+        .then(page => page.total)
+        .catch(() => 0);
     try {
         const [products, inventory, purchases, sales] = await Promise.all([
-            apiRequest('/products/').catch(() => []),
-            apiRequest('/inventory/').catch(() => []),
-            apiRequest('/purchases/').catch(() => []),
-            apiRequest('/sales/').catch(() => [])
+            count('/products/'),
+            count('/inventory/'),
+            count('/purchases/'),
+            count('/sales/')
         ]);
         
-        document.getElementById('stat-products').textContent = products.length;
-        document.getElementById('stat-inventory').textContent = inventory.length;
-        document.getElementById('stat-purchases').textContent = purchases.length;
-        document.getElementById('stat-sales').textContent = sales.length;
+        document.getElementById('stat-products').textContent = products;
+        document.getElementById('stat-inventory').textContent = inventory;
+        document.getElementById('stat-purchases').textContent = purchases;
+        document.getElementById('stat-sales').textContent = sales;
     } catch (error) {
         console.error('Failed to load dashboard:', error);
     }
 }
 
-// Load products
-async function loadProducts() {
-    const tbody = document.getElementById('products-table-body');
-    tbody.innerHTML = '<tr><td colspan="7" class="loading">加载中...</td></tr>';
-    
-    try {
-        const products = await apiRequest('/products/');
-        
-        if (products.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="7" class="empty">暂无数据</td></tr>';
+// Server-paged, virtualized tables
+const PAGE_SIZE = 100;
+const OVERSCAN_ROWS = 10;
+const DEFAULT_ROW_HEIGHT = 52;
+const SEARCH_DEBOUNCE_MS = 300;
+
+// Rows are fetched a page at a time as they scroll into view, and only the
+// visible rows are in the DOM; spacer rows stand in for the rest.
+class VirtualTable {
+    constructor(page, endpoint, columns, renderRow) {
+        this.endpoint = endpoint;
+        this.columns = columns;
+        this.renderRow = renderRow;
+        this.tbody = document.getElementById(`${page}-table-body`);
+        this.container = this.tbody.closest('.table-container');
+        this.footer = document.getElementById(`${page}-table-footer`);
+        this.rowHeight = DEFAULT_ROW_HEIGHT;
+        this.search = '';
+        this.rows = [];
+        this.total = 0;
+        this.requested = new Set();
+        this.generation = 0;
+        this.frame = null;
+        this.container.addEventListener('scroll', () => this.scheduleRender());
+    }
+
+    setSearch(search) {
+        if (search === this.search) return;
+        this.search = search;
+        this.reload();
+    }
+
+    async reload() {
+        this.generation += 1;
+        this.rows = [];
+        this.total = 0;
+        this.requested.clear();
+        this.container.scrollTop = 0;
+        this.tbody.innerHTML = `<tr><td colspan="${this.columns}" class="loading">加载中...</td></tr>`;
+        try {
+            await this.loadPage(0);
+        } catch (error) {
+            this.tbody.innerHTML = `<tr><td colspan="${this.columns}" class="empty">加载失败</td></tr>`;
+            return;
+        }
+        this.render();
+    }
+
+    // Re-fetch pages as they are shown, keeping the scroll position
+    refresh() {
+        this.generation += 1;
+        this.requested.clear();
+        this.render();
+    }
+
+    pageUrl(index) {
+        const separator = this.endpoint.includes('?') ? '&' : '?';
+        let url = `${this.endpoint}${separator}skip=${index * PAGE_SIZE}&limit=${PAGE_SIZE}&with_total=true`;
+        if (this.search) {
+            url += `&search=${encodeURIComponent(this.search)}`;
+        }
+        return url;
+    }
+
+    async loadPage(index) {
+        const generation = this.generation;
+        this.requested.add(index);
+        try {
+            const page = await apiPage(this.pageUrl(index));
+            if (generation !== this.generation) return;
+            this.total = page.total;
+            page.data.forEach((row, i) => {
+                this.rows[index * PAGE_SIZE + i] = row;
+            });
+        } catch (error) {
+            if (generation === this.generation) this.requested.delete(index);
+            throw error;
+        }
+    }
+
+    scheduleRender() {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => this.render());
+    }
+
+    render() {
+        this.frame = null;
+        this.footer.textContent = `共 ${this.total} 条`;
+        if (this.total === 0) {
+            this.tbody.innerHTML = `<tr><td colspan="${this.columns}" class="empty">暂无数据</td></tr>`;
             return;
         }
         
-        tbody.innerHTML = products.map(product => `
-            <tr>
+        const viewport = this.container.clientHeight || this.rowHeight * 20;
+        const scrollTop = this.container.scrollTop;
+        const first = Math.max(0, Math.floor(scrollTop / this.rowHeight) - OVERSCAN_ROWS);
+        const last = Math.min(this.total, Math.ceil((scrollTop + viewport) / this.rowHeight) + OVERSCAN_ROWS);
+        
+        // Fetch the pages the visible window needs
+        for (let index = Math.floor(first / PAGE_SIZE); index <= Math.floor((last - 1) / PAGE_SIZE); index++) {
+            if (!this.requested.has(index)) {
+                this.loadPage(index).then(() => this.scheduleRender()).catch(() => {});
+            }
+        }
+        
+        const html = [];
+        if (first > 0) html.push(this.spacer(first));
+        for (let i = first; i < last; i++) {
+            html.push(this.rows[i]
+                ? this.renderRow(this.rows[i])
+                : `<tr><td colspan="${this.columns}" class="loading">加载中...</td></tr>`);
+        }
+        if (last < this.total) html.push(this.spacer(this.total - last));
+        this.tbody.innerHTML = html.join('');
+        
+        const sample = this.tbody.querySelector('tr[data-id]');
+        if (sample && sample.offsetHeight && sample.offsetHeight !== this.rowHeight) {
+            this.rowHeight = sample.offsetHeight;
+            this.scheduleRender();
+        }
+    }
+
+    spacer(rows) {
+        return `<tr class="spacer-row" style="height: ${rows * this.rowHeight}px"><td colspan="${this.columns}"></td></tr>`;
+    }
+
+    // Patch a loaded row in place; returns false when it is not loaded
+    updateRow(id, changes) {
+        const row = this.rows.find(r => r && r.id === id);
+        if (!row) return false;
+        Object.assign(row, changes);
+        this.scheduleRender();
+        return true;
+    }
+}
+
+const tables = {};
+
+function initTables() {
+    tables.products = new VirtualTable(
+        'products',
+        '/products/?fields=product_code,name,product_type,specification,unit,storage_conditions',
+        7,
+        product => `
+            <tr data-id="${product.id}">
                 <td>${escapeHtml(product.product_code)}</td>
                 <td>${escapeHtml(product.name)}</td>
                 <td>${escapeHtml(product.product_type)}</td>
@@ -183,32 +352,19 @@ async function loadProducts() {
                     <button class="btn btn-sm btn-danger" onclick="deleteProduct('${product.id}')">删除</button>
                 </td>
             </tr>
-        `).join('');
-    } catch (error) {
-        tbody.innerHTML = '<tr><td colspan="7" class="empty">加载失败</td></tr>';
-    }
-}
-
-// Load inventory
-async function loadInventory() {
-    const tbody = document.getElementById('inventory-table-body');
-    tbody.innerHTML = '<tr><td colspan="8" class="loading">加载中...</td></tr>';
-    
-    try {
-        const inventory = await apiRequest('/inventory/');
-        
-        if (inventory.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="8" class="empty">暂无数据</td></tr>';
-            return;
-        }
-        
-        tbody.innerHTML = inventory.map(item => `
-            <tr>
+        `
+    );
+    tables.inventory = new VirtualTable(
+        'inventory',
+        '/inventory/?fields=product_code,product_name,warehouse,batch_number,quantity,unit_price,location',
+        8,
+        item => `
+            <tr data-id="${item.id}">
                 <td>${escapeHtml(item.product_code || '-')}</td>
                 <td>${escapeHtml(item.product_name || '-')}</td>
                 <td>${escapeHtml(item.warehouse)}</td>
                 <td>${escapeHtml(item.batch_number || '-')}</td>
-                <td>${item.quantity}</td>
+                <td data-field="quantity">${item.quantity}</td>
                 <td>¥${item.unit_price.toFixed(2)}</td>
                 <td>${escapeHtml(item.location || '-')}</td>
                 <td class="action-btns">
@@ -216,31 +372,18 @@ async function loadInventory() {
                     <button class="btn btn-sm btn-secondary" onclick="inventoryOut('${item.id}')">出库</button>
                 </td>
             </tr>
-        `).join('');
-    } catch (error) {
-        tbody.innerHTML = '<tr><td colspan="8" class="empty">加载失败</td></tr>';
-    }
-}
-
-// Load purchases
-async function loadPurchases() {
-    const tbody = document.getElementById('purchases-table-body');
-    tbody.innerHTML = '<tr><td colspan="7" class="loading">加载中...</td></tr>';
-    
-    try {
-        const purchases = await apiRequest('/purchases/');
-        
-        if (purchases.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="7" class="empty">暂无数据</td></tr>';
-            return;
-        }
-        
-        tbody.innerHTML = purchases.map(order => `
-            <tr>
+        `
+    );
+    tables.purchases = new VirtualTable(
+        'purchases',
+        '/purchases/?summary=true',
+        7,
+        order => `
+            <tr data-id="${order.id}">
                 <td>${escapeHtml(order.order_number)}</td>
                 <td>${escapeHtml(order.supplier_name || '-')}</td>
                 <td>¥${order.total_amount.toFixed(2)}</td>
-                <td><span class="status-badge ${getStatusClass(order.status)}">${escapeHtml(order.status)}</span></td>
+                <td data-field="status"><span class="status-badge ${getStatusClass(order.status)}">${escapeHtml(order.status)}</span></td>
                 <td>${formatDate(order.order_date)}</td>
                 <td>${formatDate(order.expected_date)}</td>
                 <td class="action-btns">
@@ -248,31 +391,18 @@ async function loadPurchases() {
                     <button class="btn btn-sm btn-danger" onclick="deletePurchase('${order.id}')">删除</button>
                 </td>
             </tr>
-        `).join('');
-    } catch (error) {
-        tbody.innerHTML = '<tr><td colspan="7" class="empty">加载失败</td></tr>';
-    }
-}
-
-// Load sales
-async function loadSales() {
-    const tbody = document.getElementById('sales-table-body');
-    tbody.innerHTML = '<tr><td colspan="7" class="loading">加载中...</td></tr>';
-    
-    try {
-        const sales = await apiRequest('/sales/');
-        
-        if (sales.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="7" class="empty">暂无数据</td></tr>';
-            return;
-        }
-        
-        tbody.innerHTML = sales.map(order => `
-            <tr>
+        `
+    );
+    tables.sales = new VirtualTable(
+        'sales',
+        '/sales/?summary=true',
+        7,
+        order => `
+            <tr data-id="${order.id}">
                 <td>${escapeHtml(order.order_number)}</td>
                 <td>${escapeHtml(order.customer_name || '-')}</td>
                 <td>¥${order.total_amount.toFixed(2)}</td>
-                <td><span class="status-badge ${getStatusClass(order.status)}">${escapeHtml(order.status)}</span></td>
+                <td data-field="status"><span class="status-badge ${getStatusClass(order.status)}">${escapeHtml(order.status)}</span></td>
                 <td>${formatDate(order.order_date)}</td>
                 <td>${formatDate(order.expected_date)}</td>
                 <td class="action-btns">
@@ -280,27 +410,14 @@ async function loadSales() {
                     <button class="btn btn-sm btn-danger" onclick="deleteSale('${order.id}')">删除</button>
                 </td>
             </tr>
-        `).join('');
-    } catch (error) {
-        tbody.innerHTML = '<tr><td colspan="7" class="empty">加载失败</td></tr>';
-    }
-}
-
-// Load partners
-async function loadPartners() {
-    const tbody = document.getElementById('partners-table-body');
-    tbody.innerHTML = '<tr><td colspan="8" class="loading">加载中...</td></tr>';
-    
-    try {
-        const partners = await apiRequest('/partners/');
-        
-        if (partners.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="8" class="empty">暂无数据</td></tr>';
-            return;
-        }
-        
-        tbody.innerHTML = partners.map(partner => `
-            <tr>
+        `
+    );
+    tables.partners = new VirtualTable(
+        'partners',
+        '/partners/?fields=partner_code,name,partner_type,contact_person,phone,email,is_active',
+        8,
+        partner => `
+            <tr data-id="${partner.id}">
                 <td>${escapeHtml(partner.partner_code)}</td>
                 <td>${escapeHtml(partner.name)}</td>
                 <td>${escapeHtml(partner.partner_type)}</td>
@@ -313,12 +430,87 @@ async function loadPartners() {
                     <button class="btn btn-sm btn-danger" onclick="deletePartner('${partner.id}')">删除</button>
                 </td>
             </tr>
-        `).join('');
-    } catch (error) {
-        tbody.innerHTML = '<tr><td colspan="8" class="empty">加载失败</td></tr>';
+        `
+    );
+}
+
+// Debounced search box for the current table
+function initSearch() {
+    const input = document.getElementById('search-input');
+    let timer = null;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            const table = tables[currentPage];
+            if (table) table.setSearch(input.value.trim());
+        }, SEARCH_DEBOUNCE_MS);
+    });
+}
+
+// Load products
+function loadProducts() {
+    return tables.products.reload();
+}
+
+// Load inventory
+function loadInventory() {
+    return tables.inventory.reload();
+}
+
+// Load purchases
+function loadPurchases() {
+    return tables.purchases.reload();
+}
+
+// Load sales
+function loadSales() {
+    return tables.sales.reload();
+}
+
+// Load partners
+function loadPartners() {
+    return tables.partners.reload();
+}
+
+// Live updates pushed by the server (Server-Sent Events)
+let liveReloadTimer = null;
+
+function initLiveUpdates() {
+    if (!window.EventSource) return;
+    const source = new EventSource(`${API_BASE_URL}/events`);
+    ['inventory', 'sales', 'purchases'].forEach(topic => {
+        source.addEventListener(topic, event => applyLiveUpdate(topic, JSON.parse(event.data)));
+    });
+    source.addEventListener('resync', () => scheduleLiveReload());
+}
+
+// Patch the loaded row in place; reload only when the row is not loaded
+function applyLiveUpdate(topic, data) {
+    if (currentPage === 'dashboard') {
+        scheduleLiveReload();
+        return;
+    }
+    if (currentPage !== topic) return;
+    
+    const changes = topic === 'inventory'
+        ? { quantity: data.quantity }
+        : { status: data.status, total_amount: data.total_amount };
+    if (data.deleted || !tables[topic].updateRow(data.id, changes)) {
+        scheduleLiveReload();
     }
 }
 
+function scheduleLiveReload() {
+    clearTimeout(liveReloadTimer);
+    liveReloadTimer = setTimeout(() => {
+        if (tables[currentPage]) {
+            tables[currentPage].refresh();
+        } else {
+            loadPageData(currentPage);
+        }
+    }, 1000);
+}
+
 // Open add modal
 function openAddModal() {
     currentEditId = null;